@@ -0,0 +1,10 @@
+import pytest
+from django.conf import settings
+from django.test.utils import override_settings
+
+
+@pytest.fixture(autouse=True, scope='session')
+def test_caches():
+    """Кеш в памяти вместо общего файла кеша, как в core.test_runner"""
+    with override_settings(CACHES=settings.TEST_CACHES):
+        yield
@@ -0,0 +1,13 @@
+import pytest
+from django.core.cache import cache
+from posts.tests.query_budgets import query_budget as _query_budget
+
+
+@pytest.fixture
+def query_budget():
+    """Бюджет запросов страницы из posts.urls при холодном кеше:
+    with query_budget('posts:index'): client.get('/')"""
+    def budget(view_name, authenticated=False):
+        cache.clear()
+        return _query_budget(view_name, authenticated)
+    return budget
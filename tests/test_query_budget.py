@@ -0,0 +1,56 @@
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from posts.models import Post
+
+pytestmark = [pytest.mark.django_db]
+
+
+class TestQueryBudget:
+
+    @pytest.mark.parametrize('view_name, url', [
+        ('posts:index', '/'),
+        ('posts:group_list', '/group/test-link/'),
+        ('posts:profile', '/profile/TestUser/'),
+        ('posts:search', '/search/?q=Тестовый'),
+    ])
+    def test_list_pages_fit_budget(self, client, query_budget, post_with_group, view_name, url):
+        with query_budget(view_name):
+            response = client.get(url)
+        assert response.status_code == 200, f'Страница `{url}` работает неправильно'
+
+    def test_post_pages_fit_budget(self, user_client, query_budget, post_with_group):
+        post_id = post_with_group.pk
+        with query_budget('posts:post_detail', authenticated=True):
+            user_client.get(f'/posts/{post_id}/')
+        with query_budget('posts:post_edit'):
+            user_client.get(f'/posts/{post_id}/edit/')
+        with query_budget('posts:add_comment'):
+            user_client.post(f'/posts/{post_id}/comment/', data={'text': 'Комментарий'})
+        with query_budget('posts:comments', authenticated=True):
+            user_client.get(f'/posts/{post_id}/comments/')
+
+    def test_follow_pages_fit_budget(self, user_client, query_budget, another_user):
+        with query_budget('posts:profile_follow'):
+            user_client.get(f'/profile/{another_user.username}/follow/')
+        with query_budget('posts:follow_index'):
+            user_client.get('/follow/')
+        with query_budget('posts:profile_unfollow'):
+            user_client.get(f'/profile/{another_user.username}/unfollow/')
+
+    @pytest.mark.parametrize('url', ['/', '/group/test-link/', '/profile/TestUser/', '/search/?q=Пост'])
+    def test_query_count_does_not_grow_with_page(self, client, user, group, url):
+        def count_queries():
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                client.get(url)
+            return len(queries)
+
+        Post.objects.create(text='Пост 0', author=user, group=group)
+        small = count_queries()
+        for i in range(1, 10):
+            Post.objects.create(text=f'Пост {i}', author=user, group=group)
+        assert count_queries() == small, (
+            f'Число запросов страницы `{url}` растёт с числом постов на ней'
+        )
@@ -0,0 +1,266 @@
+import contextlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL, '
+    'accessed REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+)
+NOT_EXPIRED = '(expires IS NULL OR expires > ?)'
+# Ограничение SQLite на число параметров запроса - с запасом
+KEYS_PER_QUERY = 500
+INT64 = range(-2 ** 63, 2 ** 63)
+
+
+def _encode(value):
+    """Целые числа хранятся как INTEGER, чтобы incr шёл одним UPDATE;
+    остальное - pickle"""
+    if type(value) is int and value in INT64:
+        return value
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+def _decode(value):
+    return pickle.loads(value) if isinstance(value, bytes) else value
+
+
+class SQLiteCache(BaseCache):
+    """Кеш в файле SQLite в режиме WAL, общий для всех процессов машины.
+
+    Подходит, когда воркеров несколько, а отдельного сервера кеша нет:
+    читатели в WAL не ждут писателя, запись - короткая транзакция.
+    incr и add атомарны между процессами и обходятся без UPSERT
+    и RETURNING, которых нет в SQLite до 3.24 и 3.35. При переполнении
+    MAX_ENTRIES сначала удаляются просроченные записи, затем давно
+    не читавшиеся: время чтения обновляется не чаще раза
+    в ACCESS_RESOLUTION секунд, чтобы чтение не превращалось в запись.
+    Заполненность проверяется раз в CULL_EVERY записей процесса.
+
+    CACHES = {'default': {
+        'BACKEND': 'core.cache_backends.SQLiteCache',
+        'LOCATION': '/path/to/cache.sqlite3',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }}"""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        options = params.get('OPTIONS', {})
+        self._access_resolution = options.get('ACCESS_RESOLUTION', 60)
+        self._cull_every = options.get('CULL_EVERY', 100)
+        self._busy_timeout = options.get('BUSY_TIMEOUT', 5)
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self):
+        """Соединение потока; после fork открывается новое"""
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path, timeout=self._busy_timeout,
+                isolation_level=None, check_same_thread=False,
+            )
+            connection.execute('PRAGMA journal_mode = WAL')
+            # Кеш можно потерять при сбое питания, fsync на запись не нужен
+            connection.execute('PRAGMA synchronous = NORMAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            local.connection, local.pid = connection, os.getpid()
+        return local.connection
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _execute_write(self, sql, params):
+        cursor = self._connection().execute(sql, params)
+        self._written()
+        return cursor.rowcount
+
+    def _written(self):
+        self._writes += 1
+        if self._writes % self._cull_every == 0:
+            self._cull()
+
+    def _cull(self):
+        with self._transaction() as connection:
+            connection.execute(
+                'DELETE FROM cache WHERE expires <= ?', (time.time(),)
+            )
+            count, = connection.execute(
+                'SELECT COUNT(*) FROM cache'
+            ).fetchone()
+            if count <= self._max_entries:
+                return
+            if self._cull_frequency == 0:
+                connection.execute('DELETE FROM cache')
+                return
+            # Как в остальных бэкендах Django: ниже предела с запасом,
+            # чтобы не чистить на каждой записи
+            excess = (count - self._max_entries
+                      + self._max_entries // self._cull_frequency)
+            connection.execute(
+                'DELETE FROM cache WHERE key IN '
+                '(SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                (excess,),
+            )
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _touch_accessed(self, connection, keys, now):
+        if keys:
+            connection.executemany(
+                'UPDATE cache SET accessed = ? WHERE key = ?',
+                [(now, key) for key in keys],
+            )
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        connection = self._connection()
+        row = connection.execute(
+            f'SELECT value, accessed FROM cache '
+            f'WHERE key = ? AND {NOT_EXPIRED}',
+            (key, now),
+        ).fetchone()
+        if row is None:
+            return default
+        value, accessed = row
+        if accessed < now - self._access_resolution:
+            self._touch_accessed(connection, [key], now)
+        return _decode(value)
+
+    def get_many(self, keys, version=None):
+        originals = {self._key(key, version): key for key in keys}
+        keys = list(originals)
+        now = time.time()
+        connection = self._connection()
+        found, stale = {}, []
+        for start in range(0, len(keys), KEYS_PER_QUERY):
+            batch = keys[start:start + KEYS_PER_QUERY]
+            rows = connection.execute(
+                f'SELECT key, value, accessed FROM cache '
+                f'WHERE key IN ({", ".join("?" * len(batch))}) '
+                f'AND {NOT_EXPIRED}',
+                (*batch, now),
+            ).fetchall()
+            for key, value, accessed in rows:
+                found[originals[key]] = _decode(value)
+                if accessed < now - self._access_resolution:
+                    stale.append(key)
+        self._touch_accessed(connection, stale, now)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        self._execute_write(
+            'INSERT OR REPLACE INTO cache (key, value, expires, accessed) '
+            'VALUES (?, ?, ?, ?)',
+            (key, _encode(value), self.get_backend_timeout(timeout),
+             time.time()),
+        )
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        rows = [
+            (self._key(key, version), _encode(value), expires, now)
+            for key, value in data.items()
+        ]
+        with self._transaction() as connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO cache (key, value, expires, accessed) '
+                'VALUES (?, ?, ?, ?)',
+                rows,
+            )
+        self._written()
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        # Просроченную запись add заменяет, живую - нет
+        with self._transaction() as connection:
+            if connection.execute(
+                f'SELECT 1 FROM cache WHERE key = ? AND {NOT_EXPIRED}',
+                (key, now),
+            ).fetchone() is not None:
+                return False
+            connection.execute(
+                'INSERT OR REPLACE INTO cache (key, value, expires, accessed) '
+                'VALUES (?, ?, ?, ?)',
+                (key, _encode(value), self.get_backend_timeout(timeout), now),
+            )
+        self._written()
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        return bool(self._execute_write(
+            f'UPDATE cache SET expires = ? WHERE key = ? AND {NOT_EXPIRED}',
+            (self.get_backend_timeout(timeout), key, time.time()),
+        ))
+
+    def incr(self, key, delta=1, version=None):
+        """Атомарно для целых значений: UPDATE и чтение результата в одной
+        транзакции BEGIN IMMEDIATE"""
+        cache_key = self._key(key, version)
+        with self._transaction() as connection:
+            updated = connection.execute(
+                f'UPDATE cache SET value = value + ? '
+                f"WHERE key = ? AND typeof(value) = 'integer' "
+                f'AND {NOT_EXPIRED}',
+                (delta, cache_key, time.time()),
+            ).rowcount
+            if updated:
+                value, = connection.execute(
+                    'SELECT value FROM cache WHERE key = ?', (cache_key,)
+                ).fetchone()
+        if updated:
+            self._written()
+            return value
+        # Ключа нет или значение не целое: как в BaseCache
+        return super().incr(key, delta, version)
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return self._connection().execute(
+            f'SELECT 1 FROM cache WHERE key = ? AND {NOT_EXPIRED}',
+            (key, time.time()),
+        ).fetchone() is not None
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        return bool(self._execute_write(
+            'DELETE FROM cache WHERE key = ?', (key,)
+        ))
+
+    def delete_many(self, keys, version=None):
+        keys = [(self._key(key, version),) for key in keys]
+        with self._transaction() as connection:
+            connection.executemany('DELETE FROM cache WHERE key = ?', keys)
+        self._written()
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
@@ -0,0 +1,63 @@
+import hashlib
+
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.cache import get_conditional_response
+
+from .generations import get_generations
+
+
+def make_etag(*parts):
+    """Слабый ETag из значений, от которых зависит страница: HTML
+    совпадает не побайтно (CSRF-токен маскируется заново)"""
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+
+def check_hook(view, base, attribute, method):
+    """Проверяет, что view задаёт attribute или переопределяет method
+    класса base, реализация которого по умолчанию читает attribute"""
+    if (getattr(view, attribute) is None
+            and getattr(type(view), method) is getattr(base, method)):
+        raise ImproperlyConfigured(
+            f'{type(view).__name__}: задайте {attribute} '
+            f'или переопределите {method}()'
+        )
+
+
+class ConditionalGetMixin:
+    """Отвечает 304 на GET, если ETag страницы совпал с If-None-Match.
+
+    ETag собирается из поколений областей etag_scopes (core.generations)
+    или из того, что вернёт переопределённый get_etag_parts(): он
+    выполняется до выборки списка и рендеринга, поэтому должен
+    обходиться поколениями кеша и запросами по индексам. Объекты,
+    прочитанные там, view может сохранить и не читать повторно.
+    Зритель (get_viewer()) добавляется сам: от него зависят шапка
+    и формы страницы."""
+
+    etag_scopes = None
+
+    def dispatch(self, request, *args, **kwargs):
+        check_hook(self, ConditionalGetMixin, 'etag_scopes', 'get_etag_parts')
+        return super().dispatch(request, *args, **kwargs)
+
+    def get_etag_parts(self):
+        return get_generations(*self.etag_scopes)
+
+    def get_viewer(self):
+        """Вошедший пользователь и его CSRF-cookie"""
+        user = self.request.user
+        if not user.is_authenticated:
+            return None
+        return user.pk, self.request.META.get('CSRF_COOKIE')
+
+    def get_etag(self):
+        return make_etag(self.get_viewer(), *self.get_etag_parts())
+
+    def get(self, request, *args, **kwargs):
+        etag = self.get_etag()
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        response['ETag'] = etag
+        return response
@@ -1,8 +1,106 @@
 import functools
 import re
 import time
+from collections import Counter
+from contextlib import ContextDecorator, ExitStack
 
-from django.db import connection, reset_queries
+from django.db import connections
+
+# Литералы, которые Django подставляет прямо в SQL (LIMIT 21), и списки
+# параметров IN разной длины: запросы, отличающиеся только ими, - один
+# и тот же запрос, повторённый в цикле
+SQL_NUMBER_RE = re.compile(r'\b\d+\b')
+SQL_PARAMS_LIST_RE = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+
+
+def fingerprint(sql):
+    """SQL без литералов и длины списков параметров"""
+    return SQL_PARAMS_LIST_RE.sub('(...)', SQL_NUMBER_RE.sub('?', sql))
+
+
+class QueryProfile:
+    """Запросы к БД, выполненные внутри with profile: число, суммарное
+    время, повторы одного и того же SQL и самый медленный запрос.
+
+    Собирается через connection.execute_wrapper, поэтому работает и без
+    DEBUG и не трогает connection.queries."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        self.slowest_duration = 0.0
+        self.slowest_sql = ''
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            self.fingerprints[fingerprint(sql)] += 1
+            if duration >= self.slowest_duration:
+                self.slowest_duration = duration
+                self.slowest_sql = sql
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for alias in connections:
+            self._stack.enter_context(
+                connections[alias].execute_wrapper(self)
+            )
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._stack.__exit__(*exc_info)
+
+    def duplicates(self, threshold=2):
+        """Запросы, выполненные не меньше threshold раз (признак N+1),
+        от самых частых"""
+        return [
+            (sql, count) for sql, count in self.fingerprints.most_common()
+            if count >= threshold
+        ]
+
+
+class QueryBudget(ContextDecorator):
+    """Контекстный менеджер и декоратор: код внутри должен выполнить не
+    больше max_queries запросов к БД, иначе AssertionError со списком
+    отпечатков SQL - по нему видно, какой запрос повторяется.
+
+    Запросы, в которых встречается строка из exclude, не считаются."""
+
+    def __init__(self, max_queries, label='Код', exclude=()):
+        self.max_queries = max_queries
+        self.label = label
+        self.exclude = tuple(exclude)
+        self.profile = None
+
+    def __enter__(self):
+        self.profile = QueryProfile().__enter__()
+        return self.profile
+
+    def counted(self):
+        return [
+            (sql, count)
+            for sql, count in self.profile.fingerprints.most_common()
+            if not any(part in sql for part in self.exclude)
+        ]
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profile.__exit__(exc_type, exc_value, traceback)
+        counted = self.counted()
+        total = sum(count for _, count in counted)
+        if exc_type is None and total > self.max_queries:
+            lines = [
+                f'{self.label}: {total} запросов к БД '
+                f'при бюджете {self.max_queries}'
+            ] + [f'  x{count} {sql}' for sql, count in counted]
+            raise AssertionError('\n'.join(lines))
+        return False
 
 
 def query_debugger(func):
@@ -11,18 +109,13 @@ def query_debugger(func):
 
     @functools.wraps(func)
     def inner_func(*args, **kwargs):
-        reset_queries()
-
-        start_queries = len(connection.queries)
-
         start = time.perf_counter()
-        result = func(*args, **kwargs)
+        with QueryProfile() as profile:
+            result = func(*args, **kwargs)
         end = time.perf_counter()
 
-        end_queries = len(connection.queries)
-
         print(f"Function : {func.__name__}")
-        print(f"Number of Queries : {end_queries - start_queries}")
+        print(f"Number of Queries : {profile.count}")
         print(f"Finished in : {(end - start):.3f}s")
         return result
 
@@ -141,6 +234,37 @@ RU_ALPHABET = [x[0] for x in TRANSTABLE]
 EN_ALPHABET = [x[1] for x in TRANSTABLE]
 ALPHABET = RU_ALPHABET + EN_ALPHABET
 
+# Таблицы для str.translate: строка просматривается один раз, а не по
+# разу на каждую пару TRANSTABLE. Все ключи - одиночные символы, а
+# результаты повторно не заменяются, поэтому для повторяющегося ключа
+# побеждает первая пара, как и при последовательных replace
+_translit = {}
+for _symb_in, _symb_out in TRANSTABLE:
+    _translit.setdefault(ord(_symb_in), _symb_out)
+# Список по коду символа выбирается быстрее словаря; символы дальше
+# конца списка translate оставляет как есть
+TRANSLIT_TABLE = [
+    _translit.get(code, chr(code)) for code in range(max(_translit) + 1)
+]
+
+NON_ASCII_RE = re.compile('[^\x00-\x80]')
+AMPERSAND_RE = re.compile(r'\&amp\;|\&')
+HYPHENS_RE = re.compile(r'[-\s]+')
+NON_WORD_RE = re.compile(r'[^\w\s-]')
+# Символы алфавита для slug; многосимвольные строки из EN_ALPHABET
+# ни с одним символом не совпадают и в фильтр не попадали
+SLUG_SYMBOLS = frozenset(symb for symb in ALPHABET if len(symb) == 1)
+# Разделитель строк для slugify_many: его нет в алфавите и в \s
+SLUG_SEPARATOR = '\x00'
+NOT_SLUG_SYMBOL_RE = re.compile('[^{}{}]'.format(
+    re.escape(''.join(sorted(SLUG_SYMBOLS))), SLUG_SEPARATOR
+))
+# Транслит символа сразу без знаков, которые slugify всё равно удалит
+SLUG_TABLE = {
+    ord(symb): NON_WORD_RE.sub('', symb.translate(TRANSLIT_TABLE))
+    for symb in SLUG_SYMBOLS
+}
+
 
 def translify(in_string, strict=True):
     """
@@ -159,17 +283,24 @@ def translify(in_string, strict=True):
     @raise ValueError: when string doesn't transliterate completely.
         Raised only if strict=True
     """
-    translit = in_string
-    for symb_in, symb_out in TRANSTABLE:
-        translit = translit.replace(symb_in, symb_out)
+    translit = in_string.translate(TRANSLIT_TABLE)
 
-    if strict and any(ord(symb) > 128 for symb in translit):
+    if strict and NON_ASCII_RE.search(translit):
         raise ValueError("Unicode string doesn't transliterate completely, "
                          "is it russian?")
 
     return translit
 
 
+def _prepare_slug(u_in_string):
+    # convert & to "and"
+    u_in_string = AMPERSAND_RE.sub(' and ', u_in_string.lower())
+    # replace spaces by hyphen
+    u_in_string = HYPHENS_RE.sub('-', u_in_string)
+    # remove symbols that not in alphabet, translify and remove non-alpha
+    return NOT_SLUG_SYMBOL_RE.sub('', u_in_string).translate(SLUG_TABLE)
+
+
 def slugify(in_string):
     """
     Prepare string for slug (i.e. URL or file/dir name)
@@ -183,18 +314,31 @@ def slugify(in_string):
     @raise ValueError: if in_string is C{str}, but it isn't ascii
     """
     try:
-        u_in_string = str(in_string).lower()
+        u_in_string = str(in_string)
     except UnicodeDecodeError:
         raise ValueError("We expects when in_string is str type,"
                          "it is an ascii, but now it isn't. Use unicode "
                          "in this case.")
-    # convert & to "and"
-    u_in_string = re.sub(r'\&amp\;|\&', ' and ', u_in_string)
-    # replace spaces by hyphen
-    u_in_string = re.sub(r'[-\s]+', '-', u_in_string)
-    # remove symbols that not in alphabet
-    u_in_string = ''.join([symb for symb in u_in_string if symb in ALPHABET])
-    # translify it
-    out_string = translify(u_in_string)
-    # remove non-alpha
-    return re.sub(r'[^\w\s-]', '', out_string).strip().lower()
+    return _prepare_slug(u_in_string).replace(SLUG_SEPARATOR, '')
+
+
+def slugify_many(in_strings):
+    """
+    Prepare many strings for slugs at once, e.g. for bulk import
+
+    @param in_strings: input strings
+    @type in_strings: iterable of C{str}
+
+    @return: slug-strings, in the same order as in_strings
+    @rtype: C{list}
+    """
+    u_in_strings = [str(in_string) for in_string in in_strings]
+    joined = SLUG_SEPARATOR.join(u_in_strings)
+    if joined.count(SLUG_SEPARATOR) != len(u_in_strings) - 1:
+        # Разделитель встретился в самих строках
+        return [slugify(u_in_string) for u_in_string in u_in_strings]
+    if not u_in_strings:
+        return []
+    # Одна строка на всю пачку: регулярные выражения и translate
+    # вызываются один раз, а не на каждую строку
+    return _prepare_slug(joined).split(SLUG_SEPARATOR)
@@ -0,0 +1,68 @@
+import time
+
+from django.core.cache import cache
+
+GENERATION_KEY = 'generation:{}'
+STATS_KEY = 'fragment_stats:{}:{}'
+STATS_NAMES_KEY = 'fragment_stats:names'
+
+
+def _initial_generation():
+    """Начальное значение счётчика — текущее время в микросекундах.
+
+    Если ключ вытеснен из кеша, новое значение всё равно больше всех
+    выданных раньше, и старые фрагменты не оживут."""
+    return time.time_ns() // 1000
+
+
+def get_generations(*scopes):
+    """Возвращает текущие поколения для областей scopes"""
+    keys = [GENERATION_KEY.format(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _initial_generation(), timeout=None)
+            found[key] = cache.get(key)
+    return tuple(found[key] for key in keys)
+
+
+def bump(*scopes):
+    """Сдвигает поколения областей: зависящие от них фрагменты
+    перестают находиться в кеше"""
+    for scope in scopes:
+        key = GENERATION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_generation(), timeout=None)
+
+
+def record_lookup(fragment_name, hit, count=1):
+    """Учитывает count попаданий или промахов по фрагменту fragment_name"""
+    if not count:
+        return
+    key = STATS_KEY.format(fragment_name, 'hits' if hit else 'misses')
+    if cache.add(key, count, timeout=None):
+        names = cache.get(STATS_NAMES_KEY, set())
+        if fragment_name not in names:
+            cache.set(STATS_NAMES_KEY, names | {fragment_name}, None)
+        return
+    try:
+        cache.incr(key, count)
+    except ValueError:
+        cache.set(key, count, timeout=None)
+
+
+def fragment_stats():
+    """Попадания и промахи по каждому фрагменту: {имя: {hits, misses}}"""
+    stats = {}
+    for name in sorted(cache.get(STATS_NAMES_KEY, set())):
+        hits = cache.get(STATS_KEY.format(name, 'hits'), 0)
+        misses = cache.get(STATS_KEY.format(name, 'misses'), 0)
+        total = hits + misses
+        stats[name] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 3) if total else None,
+        }
+    return stats
@@ -0,0 +1,132 @@
+import json
+import multiprocessing
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.cache_backends import SQLiteCache
+
+# Типичный фрагмент страницы: HTML из десятка карточек постов
+FRAGMENT = '<article><p>Текст поста</p></article>\n' * 150
+
+
+def make_backends(directory, max_entries):
+    params = {'OPTIONS': {'MAX_ENTRIES': max_entries}}
+    return {
+        'locmem': lambda: LocMemCache('bench', params),
+        'filebased': lambda: FileBasedCache(
+            os.path.join(directory, 'files'), params
+        ),
+        'sqlite': lambda: SQLiteCache(
+            os.path.join(directory, 'cache.sqlite3'), params
+        ),
+    }
+
+
+def increment(make_cache, times):
+    cache = make_cache()
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает SQLiteCache с LocMemCache и FileBasedCache: '
+            'операции в одном процессе и incr из нескольких процессов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ops', type=int, default=1000,
+                            help='Операций в одном замере')
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--max-entries', type=int, default=50_000)
+        parser.add_argument('--output', help='Сохранить результаты в JSON')
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp()
+        try:
+            results = self.run(directory, options)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        for name, result in results.items():
+            self.stdout.write(f'{name}:')
+            for case, value in result.items():
+                if case.endswith('_us'):
+                    self.stdout.write(f'  {case[:-3]}: {value:.1f} мкс')
+                else:
+                    self.stdout.write(f'  {case}: {value}')
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+
+    def run(self, directory, options):
+        ops = options['ops']
+        keys = [f'fragment:{i}' for i in range(ops)]
+        results = {}
+        for name, make_cache in make_backends(
+            directory, options['max_entries']
+        ).items():
+            cache = make_cache()
+            cache.clear()
+            cases = {
+                'set': lambda: [cache.set(key, FRAGMENT) for key in keys],
+                'get_hit': lambda: [cache.get(key) for key in keys],
+                'get_miss': lambda: [cache.get(f'{key}:x') for key in keys],
+                'get_many_10': lambda: [
+                    cache.get_many(keys[i:i + 10])
+                    for i in range(0, ops, 10)
+                ],
+                'incr': lambda: [cache.incr('counter') for _ in keys],
+            }
+            cache.set('counter', 0)
+            result = {}
+            for case, func in cases.items():
+                calls = ops // 10 if case == 'get_many_10' else ops
+                result[f'{case}_us'] = (
+                    self.median(func, options['repeat']) * 1000 / calls
+                )
+            if name != 'locmem':
+                # LocMemCache у каждого процесса свой, общий счётчик
+                # ему недоступен
+                result.update(self.concurrent_incr(
+                    cache, make_cache, options['workers'], ops
+                ))
+            results[name] = result
+        return results
+
+    @staticmethod
+    def concurrent_incr(cache, make_cache, workers, ops):
+        """incr одного ключа из workers процессов: сколько прибавлений
+        дошло и сколько incr в секунду выдержал бэкенд"""
+        cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=increment, args=(make_cache, ops))
+            for _ in range(workers)
+        ]
+        start = time.perf_counter()
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - start
+        return {
+            'concurrent_incr_expected': workers * ops,
+            'concurrent_incr_counted': cache.get('counter'),
+            'concurrent_incr_per_second': round(workers * ops / elapsed),
+        }
+
+    @staticmethod
+    def median(func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,121 @@
+import json
+import random
+import re
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.debugging_tools import (ALPHABET, TRANSTABLE, slugify, slugify_many,
+                                  translify)
+
+# Слова для текстов: кириллица, латиница, знаки препинания и типографика
+WORDS = (
+    'Щука', 'ёжик', 'Съешь', 'ещё', 'этих', 'мягких', 'французских',
+    'булок', 'да', 'выпей', 'же', 'чаю', 'Yatube', 'Django', '2021',
+    '«цитата»', '—', 'и/или', 'Том & Джерри', 'сноска…', '№7',
+)
+
+
+def legacy_translify(in_string, strict=True):
+    """translify до перехода на str.translate: по проходу на пару"""
+    translit = in_string
+    for symb_in, symb_out in TRANSTABLE:
+        translit = translit.replace(symb_in, symb_out)
+    if strict and any(ord(symb) > 128 for symb in translit):
+        raise ValueError("Unicode string doesn't transliterate completely, "
+                         "is it russian?")
+    return translit
+
+
+def legacy_slugify(in_string):
+    """slugify до перехода на таблицы: поиск каждого символа в списке"""
+    u_in_string = str(in_string).lower()
+    u_in_string = re.sub(r'\&amp\;|\&', ' and ', u_in_string)
+    u_in_string = re.sub(r'[-\s]+', '-', u_in_string)
+    u_in_string = ''.join([symb for symb in u_in_string if symb in ALPHABET])
+    out_string = legacy_translify(u_in_string)
+    return re.sub(r'[^\w\s-]', '', out_string).strip().lower()
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает скорость translify и slugify с прежней '
+            'реализацией на длинных текстах и пачке заголовков')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--length', type=int, default=100_000,
+            help='Длина длинного текста в символах',
+        )
+        parser.add_argument(
+            '--titles', type=int, default=10_000,
+            help='Число заголовков групп в пачке',
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--output', help='Сохранить результаты в JSON')
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        text = self.text(rng, options['length'])
+        titles = [
+            self.text(rng, rng.randint(10, 60))
+            for _ in range(options['titles'])
+        ]
+        cases = {
+            'translify': (
+                lambda: legacy_translify(text, strict=False),
+                lambda: translify(text, strict=False),
+            ),
+            'translify_titles': (
+                lambda: [legacy_translify(title) for title in titles],
+                lambda: [translify(title) for title in titles],
+            ),
+            'slugify': (
+                lambda: legacy_slugify(text),
+                lambda: slugify(text),
+            ),
+            'slugify_titles': (
+                lambda: [legacy_slugify(title) for title in titles],
+                lambda: [slugify(title) for title in titles],
+            ),
+            'slugify_many': (
+                lambda: [legacy_slugify(title) for title in titles],
+                lambda: slugify_many(titles),
+            ),
+        }
+        results = {}
+        for name, (legacy, current) in cases.items():
+            if legacy() != current():
+                raise AssertionError(f'{name}: результаты расходятся')
+            legacy_ms = self.median(legacy, options['repeat'])
+            current_ms = self.median(current, options['repeat'])
+            results[name] = {
+                'legacy_ms': legacy_ms,
+                'current_ms': current_ms,
+                'speedup': legacy_ms / current_ms,
+            }
+            self.stdout.write(
+                f'{name}: {legacy_ms:.2f} мс -> {current_ms:.2f} мс '
+                f'(x{legacy_ms / current_ms:.1f})'
+            )
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+
+    @staticmethod
+    def text(rng, length):
+        words = []
+        size = 0
+        while size < length:
+            words.append(rng.choice(WORDS))
+            size += len(words[-1]) + 1
+        return ' '.join(words)[:length]
+
+    @staticmethod
+    def median(func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,74 @@
+import logging
+import random
+import time
+
+from django.conf import settings
+
+from .debugging_tools import QueryProfile
+
+logger = logging.getLogger(__name__)
+
+
+class QueryProfilingMiddleware:
+    """Профиль запросов к БД для доли QUERY_PROFILING_SAMPLE_RATE
+    HTTP-запросов: число запросов, время в БД, повторы одного SQL
+    (N+1) и самый медленный запрос.
+
+    Итог уходит в заголовок Server-Timing и строкой в лог с полями
+    в extra['query_profile']. Текст SQL в заголовок не попадает."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = settings.QUERY_PROFILING_SAMPLE_RATE
+        if rate <= 0 or random.random() >= rate:
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        with QueryProfile() as profile:
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        duplicates = profile.duplicates(settings.QUERY_PROFILING_DUPLICATES)
+        self.add_server_timing(response, profile, duplicates, total)
+        match = request.resolver_match
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'queries': profile.count,
+            'db_ms': round(profile.duration * 1000, 3),
+            'total_ms': round(total * 1000, 3),
+            'slowest_ms': round(profile.slowest_duration * 1000, 3),
+            'slowest_sql': profile.slowest_sql,
+            'duplicates': [
+                {'sql': sql, 'count': count} for sql, count in duplicates
+            ],
+        }
+        logger.info(
+            'db profile %(method)s %(path)s view=%(view)s status=%(status)s '
+            'queries=%(queries)s db_ms=%(db_ms)s total_ms=%(total_ms)s '
+            'duplicated=%(duplicated)s',
+            {**fields, 'duplicated': len(duplicates)},
+            extra={'query_profile': fields},
+        )
+        return response
+
+    @staticmethod
+    def add_server_timing(response, profile, duplicates, total):
+        metrics = [
+            f'db;dur={profile.duration * 1000:.3f};'
+            f'desc="{profile.count} queries"',
+            f'db-slowest;dur={profile.slowest_duration * 1000:.3f}',
+            f'app;dur={total * 1000:.3f}',
+        ]
+        if duplicates:
+            metrics.append(
+                f'db-duplicates;desc="{len(duplicates)} repeated queries, '
+                f'max x{duplicates[0][1]}"'
+            )
+        if response.has_header('Server-Timing'):
+            metrics.insert(0, response['Server-Timing'])
+        response['Server-Timing'] = ', '.join(metrics)
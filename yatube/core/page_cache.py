@@ -0,0 +1,94 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+
+from .conditional import check_hook
+from .generations import bump, get_generations
+
+PAGE_KEY = 'page:{}'
+# Область, от которой зависят все страницы: её сдвигают массовые
+# загрузки через bulk_create, которые не вызывают сигналов
+PAGES_SCOPE = 'pages'
+# Параметры запроса, с которыми страница кешируется; остальные
+# (например, метки рекламных кампаний) плодили бы копии страницы
+CACHED_PARAMS = {'page', 'older', 'newer'}
+
+
+def page_key(request):
+    digest = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return PAGE_KEY.format(digest)
+
+
+def invalidate_pages():
+    """Сбрасывает все закешированные страницы"""
+    bump(PAGES_SCOPE)
+
+
+class AnonymousPageCacheMixin:
+    """Кеширует страницу для гостей целиком, по адресу с параметрами.
+
+    Запись хранит области core.generations, от которых зависит страница
+    (page_scopes или переопределённый get_page_scopes()), и их поколения
+    до выборки данных. Запись верна, пока поколения не сдвинулись: её
+    сбрасывают сигналы записи постов, комментариев, подписок и групп,
+    а не TTL. Попадание обходится двумя чтениями кеша без запросов к БД."""
+
+    page_scopes = None
+
+    def dispatch(self, request, *args, **kwargs):
+        check_hook(self, AnonymousPageCacheMixin, 'page_scopes',
+                   'get_page_scopes')
+        return super().dispatch(request, *args, **kwargs)
+
+    def get_page_scopes(self):
+        return self.page_scopes
+
+    def is_page_cacheable(self):
+        request = self.request
+        return (
+            request.method in ('GET', 'HEAD')
+            and not request.user.is_authenticated
+            and set(request.GET) <= CACHED_PARAMS
+        )
+
+    def get(self, request, *args, **kwargs):
+        if not self.is_page_cacheable():
+            return super().get(request, *args, **kwargs)
+        key = page_key(request)
+        response = self.cached_response(key)
+        if response is not None:
+            return get_conditional_response(
+                request, etag=response.get('ETag'), response=response
+            )
+
+        scopes = (PAGES_SCOPE, *self.get_page_scopes())
+        generations = get_generations(*scopes)
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200 and not response.cookies:
+            if hasattr(response, 'render'):
+                response.render()
+            cache.set(key, {
+                'scopes': scopes,
+                'generations': generations,
+                'content': response.content,
+                'content_type': response['Content-Type'],
+                'etag': response.get('ETag'),
+            }, settings.PAGE_CACHE_TIMEOUT)
+        return response
+
+    @staticmethod
+    def cached_response(key):
+        entry = cache.get(key)
+        if entry is None:
+            return None
+        if get_generations(*entry['scopes']) != entry['generations']:
+            return None
+        response = HttpResponse(
+            entry['content'], content_type=entry['content_type']
+        )
+        if entry['etag']:
+            response['ETag'] = entry['etag']
+        return response
@@ -0,0 +1,57 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+from core.generations import get_generations, record_lookup
+
+register = template.Library()
+
+
+class GenerationCacheNode(template.Node):
+    def __init__(self, nodelist, fragment_name, scopes, vary_on):
+        self.nodelist = nodelist
+        self.fragment_name = fragment_name
+        self.scopes = scopes
+        self.vary_on = vary_on
+
+    def render(self, context):
+        scopes = self.scopes.resolve(context)
+        if isinstance(scopes, str):
+            scopes = (scopes,)
+        vary_on = [
+            *get_generations(*scopes),
+            *(var.resolve(context) for var in self.vary_on),
+        ]
+        key = make_template_fragment_key(self.fragment_name, vary_on)
+        value = cache.get(key)
+        record_lookup(self.fragment_name, hit=value is not None)
+        if value is None:
+            value = self.nodelist.render(context)
+            cache.set(key, value, settings.FRAGMENT_CACHE_TIMEOUT)
+        return value
+
+
+@register.tag('generation_cache')
+def do_generation_cache(parser, token):
+    """Кеширует фрагмент, пока не сменится поколение его данных.
+
+    {% generation_cache fragment_name scopes [var1 var2 ...] %}
+        ...
+    {% endgeneration_cache %}
+
+    scopes — строка или список областей из core.generations; при записи
+    в эти области ключ фрагмента меняется сам, TTL не нужен."""
+    nodelist = parser.parse(('endgeneration_cache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(
+            f"'{tokens[0]}' tag requires at least 2 arguments."
+        )
+    return GenerationCacheNode(
+        nodelist,
+        tokens[1],
+        parser.compile_filter(tokens[2]),
+        [parser.compile_filter(token) for token in tokens[3:]],
+    )
@@ -0,0 +1,129 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase
+
+from core.cache_backends import SQLiteCache
+
+
+def make_cache(path, **options):
+    return SQLiteCache(path, {'OPTIONS': options})
+
+
+def increment(path, times):
+    cache = make_cache(path)
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = make_cache(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_basic_operations(self):
+        """Запись, чтение и удаление значений любых типов."""
+        cache = self.cache
+        values = {'int': 1, 'text': 'текст', 'list': [1, {'a': 2}],
+                  'flag': True, 'big': 2 ** 70}
+        cache.set_many(values)
+        self.assertEqual(cache.get_many([*values, 'missing']), values)
+        self.assertIs(cache.get('flag'), True)
+        self.assertEqual(cache.get('missing', 'default'), 'default')
+
+        self.assertFalse(cache.add('int', 2))
+        self.assertTrue(cache.add('new', 2))
+        self.assertEqual(cache.get('int'), 1)
+
+        self.assertTrue(cache.has_key('new'))
+        cache.delete('new')
+        self.assertFalse(cache.has_key('new'))
+        cache.delete_many(['int', 'text'])
+        self.assertEqual(cache.get_many(['int', 'text']), {})
+        cache.clear()
+        self.assertIsNone(cache.get('list'))
+
+    def test_timeouts(self):
+        """Просроченные записи не читаются, add и touch их учитывают."""
+        cache = self.cache
+        cache.set('expired', 1, timeout=0)
+        self.assertIsNone(cache.get('expired'))
+        self.assertFalse(cache.has_key('expired'))
+        self.assertFalse(cache.touch('expired'))
+        self.assertTrue(cache.add('expired', 2))
+        self.assertEqual(cache.get('expired'), 2)
+
+        cache.set('forever', 1, timeout=None)
+        self.assertTrue(cache.touch('forever', timeout=0))
+        self.assertIsNone(cache.get('forever'))
+
+    def test_incr(self):
+        """incr и decr для целых, ошибка для отсутствующего ключа."""
+        cache = self.cache
+        cache.set('counter', 10)
+        self.assertEqual(cache.incr('counter'), 11)
+        self.assertEqual(cache.decr('counter', 5), 6)
+        self.assertEqual(cache.get('counter'), 6)
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+        cache.set('counter', 1, timeout=0)
+        with self.assertRaises(ValueError):
+            cache.incr('counter')
+
+    def test_incr_atomic_across_processes(self):
+        """Одновременные incr из нескольких процессов не теряются."""
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=increment, args=(self.path, 200))
+            for _ in range(3)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(self.cache.get('counter'), 600)
+
+    def test_no_upsert_or_returning(self):
+        """Запись обходится без ON CONFLICT и RETURNING: их нет
+        в SQLite старше 3.24 и 3.35."""
+        cache = self.cache
+        statements = []
+        cache._connection().set_trace_callback(statements.append)
+        cache.set('counter', 1)
+        cache.incr('counter')
+        cache.add('counter', 5)
+        cache.add('new', 5)
+        self.assertEqual(cache.get_many(['counter', 'new']),
+                         {'counter': 2, 'new': 5})
+        for statement in statements:
+            with self.subTest(statement=statement):
+                self.assertNotIn('ON CONFLICT', statement.upper())
+                self.assertNotIn('RETURNING', statement.upper())
+
+    def test_shared_between_instances(self):
+        """Запись одного экземпляра видна другому (другому процессу)."""
+        self.cache.set('key', 'value')
+        self.assertEqual(make_cache(self.path).get('key'), 'value')
+
+    def test_evicts_least_recently_read(self):
+        """При переполнении удаляются давно не читавшиеся записи."""
+        cache = make_cache(
+            self.path, MAX_ENTRIES=10, CULL_FREQUENCY=5, CULL_EVERY=1,
+            ACCESS_RESOLUTION=0,
+        )
+        for i in range(10):
+            cache.set(f'key{i}', i)
+        cache.get('key0')
+        cache.set('key10', 10)
+        kept = cache.get_many([f'key{i}' for i in range(11)])
+        self.assertLessEqual(len(kept), 10)
+        self.assertIn('key0', kept)
+        self.assertIn('key10', kept)
+        self.assertNotIn('key1', kept)
@@ -0,0 +1,54 @@
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+from django.views.generic import View
+
+from core.conditional import ConditionalGetMixin
+from core.generations import get_generations
+from core.page_cache import AnonymousPageCacheMixin
+
+
+class PageView(View):
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse('ok')
+
+
+class ConditionalPageView(ConditionalGetMixin, PageView):
+    pass
+
+
+class CachedPageView(AnonymousPageCacheMixin, PageView):
+    pass
+
+
+class ViewHooksTest(SimpleTestCase):
+    """Области для ETag и кеша страниц задаются атрибутом или
+    переопределённым методом, иначе view не отвечает"""
+
+    def get(self, view_class, **attrs):
+        request = RequestFactory().get('/', {'utm': 'no-cache'})
+        request.user = AnonymousUser()
+        return view_class.as_view(**attrs)(request)
+
+    def test_missing_hook_is_improperly_configured(self):
+        for view_class in (ConditionalPageView, CachedPageView):
+            with self.subTest(view=view_class.__name__):
+                with self.assertRaisesMessage(
+                    ImproperlyConfigured, view_class.__name__
+                ):
+                    self.get(view_class)
+
+    def test_scopes_attribute(self):
+        response = self.get(ConditionalPageView, etag_scopes=('posts',))
+        self.assertIn('ETag', response)
+        response = self.get(CachedPageView, page_scopes=('posts',))
+        self.assertEqual(response.content, b'ok')
+
+    def test_overridden_method(self):
+        class PartsView(ConditionalPageView):
+            def get_etag_parts(self):
+                return (*get_generations('posts'), 1)
+
+        self.assertIn('ETag', self.get(PartsView))
@@ -0,0 +1,54 @@
+import random
+
+from django.test import SimpleTestCase
+
+from core.debugging_tools import (TRANSTABLE, slugify, slugify_many,
+                                  translify)
+from core.management.commands.bench_slugify import (legacy_slugify,
+                                                    legacy_translify)
+
+
+class TranslifyTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        rng = random.Random(0)
+        symbols = (
+            [symb_in for symb_in, _ in TRANSTABLE]
+            + list('&amp; -\t\n\x00/_.İé漢')
+        )
+        cls.strings = [
+            ''.join(rng.choices(symbols, k=rng.randint(0, 40)))
+            for _ in range(2000)
+        ] + ['Том & Джерри', 'Ёжик &amp; «Щука» — №7…', '  Пост - пост  ']
+
+    def test_translify_matches_sequential_replace(self):
+        """translify в один проход даёт то же, что замены по TRANSTABLE."""
+        for string in self.strings:
+            with self.subTest(string=string):
+                self.assertEqual(
+                    translify(string, strict=False),
+                    legacy_translify(string, strict=False),
+                )
+
+    def test_translify_strict(self):
+        """В строгом режиме непереведённые символы вызывают ValueError."""
+        self.assertEqual(translify('Щука «ёж»'), 'Schuka "yozh"')
+        with self.assertRaises(ValueError):
+            translify('漢字')
+
+    def test_slugify_matches_legacy(self):
+        """slugify на таблицах даёт те же slug, что прежняя реализация."""
+        for string in self.strings:
+            with self.subTest(string=string):
+                self.assertEqual(slugify(string), legacy_slugify(string))
+
+    def test_slugify_many(self):
+        """slugify_many совпадает с slugify для каждой строки пачки."""
+        self.assertEqual(slugify_many([]), [])
+        self.assertEqual(
+            slugify_many(self.strings), [slugify(s) for s in self.strings]
+        )
+        self.assertEqual(
+            slugify_many(['Спорт', 'а\x00б', '']), ['sport', 'ab', '']
+        )
@@ -0,0 +1,59 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from core.debugging_tools import QueryProfile, fingerprint
+from posts.models import Group, Post, User
+
+
+class QueryProfileTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user('author')
+        cls.posts = [
+            Post.objects.create(text=f'Пост {i}', author=cls.user)
+            for i in range(3)
+        ]
+
+    def test_profile_counts_queries_without_debug(self):
+        """Профиль считает запросы и повторы одного SQL без DEBUG."""
+        with QueryProfile() as profile:
+            for post in QueryProfileTest.posts:
+                Post.objects.filter(pk=post.pk).exists()
+            Group.objects.count()
+        self.assertEqual(profile.count, 4)
+        self.assertGreater(profile.duration, 0)
+        self.assertTrue(profile.slowest_sql)
+        [(sql, count)] = profile.duplicates(threshold=2)
+        self.assertEqual(count, 3)
+        self.assertIn('posts_post', sql)
+
+    def test_fingerprint_ignores_literals_and_list_length(self):
+        """Отпечаток не зависит от литералов и длины списка IN."""
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s) LIMIT 21'),
+            fingerprint('SELECT * FROM t WHERE id IN (%s) LIMIT 1'),
+        )
+
+
+class QueryProfilingMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(QUERY_PROFILING_SAMPLE_RATE=1)
+    def test_server_timing_and_log(self):
+        """Профиль запроса уходит в Server-Timing и в лог."""
+        with self.assertLogs('core.middleware', 'INFO') as logs:
+            response = self.client.get('/')
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('app;dur=', response['Server-Timing'])
+        [record] = logs.records
+        self.assertEqual(record.query_profile['view'], 'posts:index')
+        self.assertEqual(record.query_profile['status'], 200)
+        self.assertGreater(record.query_profile['queries'], 0)
+
+    @override_settings(QUERY_PROFILING_SAMPLE_RATE=0)
+    def test_not_sampled(self):
+        """Без выборки заголовок не добавляется."""
+        response = self.client.get('/')
+        self.assertFalse(response.has_header('Server-Timing'))
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from . import search
 from .models import Comment, Group, Post
 
 
@@ -10,6 +11,12 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск через полнотекстовый индекс вместо LIKE по всей таблице
+        if not search_term:
+            return queryset, False
+        return search.filter_matching(queryset, search_term), False
+
     # Хотел ограничить длину текста, но тесты не пускают
     # def short_text(self, obj):
     #     return obj.text[:settings.POST_TEXT_LENGTH]
@@ -0,0 +1,302 @@
+"""JSON для мобильного клиента: ленты и пост с комментариями.
+
+Строки читаются через values() без создания моделей и без шаблонов,
+страницы выбираются по курсору (older/newer, как в HTML-страницах).
+ETag, как и у HTML-страниц, собирается из поколений кеша до выборки
+данных: на If-None-Match с тем же тегом клиент получает пустой ответ
+304 без запросов за постами."""
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage
+from django.core.paginator import InvalidPage
+from django.http import Http404, JsonResponse
+from django.views.generic import View
+
+from core.conditional import ConditionalGetMixin
+from core.generations import get_generations
+from core.page_cache import PAGES_SCOPE
+
+from .feeds import FeedPaginator
+from .models import Comment, Group, Post, User
+from .paginators import CursorPaginator, encode_cursor
+
+POST_FIELDS = (
+    'id', 'text', 'pub_date', 'image', 'comments_count',
+    'author__username', 'group__slug', 'group__title',
+)
+COMMENT_FIELDS = ('id', 'text', 'created', 'author__username')
+
+
+def serialize_post(row):
+    return {
+        'id': row['id'],
+        'text': row['text'],
+        'pub_date': row['pub_date'],
+        'author': row['author__username'],
+        'group': {
+            'slug': row['group__slug'],
+            'title': row['group__title'],
+        } if row['group__slug'] else None,
+        'image': default_storage.url(row['image']) if row['image'] else None,
+        'comments_count': row['comments_count'],
+    }
+
+
+def serialize_comment(row):
+    return {
+        'id': row['id'],
+        'author': row['author__username'],
+        'text': row['text'],
+        'created': row['created'],
+    }
+
+
+class ValuesCursorMixin:
+    """Курсор по строкам values(): словарям вместо моделей"""
+
+    def get_cursor(self, row):
+        return encode_cursor(row[self.date_field], row[self.id_field])
+
+
+class ValuesCursorPaginator(ValuesCursorMixin, CursorPaginator):
+    pass
+
+
+class ValuesFeedPaginator(ValuesCursorMixin, FeedPaginator):
+
+    def load_posts(self, ids):
+        return {
+            row['id']: row
+            for row in Post.objects.filter(pk__in=ids).values(*POST_FIELDS)
+        }
+
+
+def get_page(paginator, params):
+    """Страница по параметрам older=<курсор> или newer=<курсор>"""
+    try:
+        if 'newer' in params:
+            return paginator.cursor_page(params['newer'], newer=True)
+        return paginator.cursor_page(params.get('older'))
+    except InvalidPage as e:
+        raise Http404(f'Неверная страница: {e}')
+
+
+class JsonView(View):
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(
+            self.get_data(), json_dumps_params={'ensure_ascii': False}
+        )
+
+
+class ApiView(ConditionalGetMixin, JsonView):
+    """Ответ JSON из get_data() с ETag из поколений кеша; ошибки тоже
+    отдаются JSON, а не HTML-страницами.
+
+    Области etag_scopes всех ответов начинаются с PAGES_SCOPE: его
+    сдвигают массовые загрузки без сигналов."""
+
+    http_method_names = ['get', 'head', 'options']
+
+    def dispatch(self, request, *args, **kwargs):
+        if not callable(getattr(self, 'get_data', None)):
+            raise ImproperlyConfigured(
+                f'{type(self).__name__}: определите get_data()'
+            )
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except Http404 as e:
+            return self.error(str(e), status=404)
+
+    def get_viewer(self):
+        # Ответы API, кроме ленты подписок, одинаковы для всех
+        return None
+
+    @staticmethod
+    def error(detail, status):
+        return JsonResponse(
+            {'detail': detail}, status=status,
+            json_dumps_params={'ensure_ascii': False},
+        )
+
+
+class PostListApiView(ApiView):
+    """Страница постов: results, next (старее) и previous (новее)"""
+
+    paginator_class = ValuesCursorPaginator
+
+    def get_queryset(self):
+        return Post.objects.all()
+
+    def get_paginator(self, queryset):
+        return self.paginator_class(queryset, settings.PAGE_SIZE)
+
+    def get_data(self):
+        queryset = self.get_queryset().values(*POST_FIELDS)
+        page = get_page(self.get_paginator(queryset), self.request.GET)
+        return {
+            **self.get_extra_data(),
+            'results': [serialize_post(row) for row in page.object_list],
+            'next': page.next_cursor,
+            'previous': page.previous_cursor,
+        }
+
+    def get_extra_data(self):
+        return {}
+
+
+class IndexApiView(PostListApiView):
+    # posts - посты, имена авторов и группы; comments - их счётчики
+    etag_scopes = (PAGES_SCOPE, 'posts', 'comments')
+
+
+class GroupApiView(PostListApiView):
+
+    def get_etag_parts(self):
+        group = self.get_group()
+        return (
+            *get_generations(
+                PAGES_SCOPE, f'group:{group["id"]}', 'users', 'comments'
+            ),
+            group,
+        )
+
+    def get_group(self):
+        if not hasattr(self, 'group'):
+            self.group = Group.objects.filter(
+                slug=self.kwargs['slug']
+            ).values('id', 'slug', 'title', 'description').first()
+        if self.group is None:
+            raise Http404('Группа не найдена')
+        return self.group
+
+    def get_queryset(self):
+        return Post.objects.filter(group_id=self.get_group()['id'])
+
+    def get_extra_data(self):
+        return {'group': {
+            'slug': self.group['slug'],
+            'title': self.group['title'],
+            'description': self.group['description'],
+        }}
+
+
+class ProfileApiView(PostListApiView):
+
+    def get_etag_parts(self):
+        # Счётчики автора входят в тег вместе с ним: подписки самого
+        # автора областей его страницы не сдвигают
+        author = self.get_author()
+        return (
+            *get_generations(
+                PAGES_SCOPE, f'author:{author["id"]}', 'groups', 'comments'
+            ),
+            author,
+        )
+
+    def get_author(self):
+        if not hasattr(self, 'author'):
+            self.author = User.objects.filter(
+                username=self.kwargs['username']
+            ).values(
+                'id', 'username', 'first_name', 'last_name',
+                'stats__posts_count', 'stats__followers_count',
+                'stats__following_count',
+            ).first()
+        if self.author is None:
+            raise Http404('Пользователь не найден')
+        return self.author
+
+    def get_queryset(self):
+        return Post.objects.filter(author_id=self.get_author()['id'])
+
+    def get_extra_data(self):
+        author = self.author
+        return {'author': {
+            'username': author['username'],
+            'full_name': f'{author["first_name"]} {author["last_name"]}'
+                         .strip(),
+            'posts_count': author['stats__posts_count'] or 0,
+            'followers_count': author['stats__followers_count'] or 0,
+            'following_count': author['stats__following_count'] or 0,
+        }}
+
+
+class FollowApiView(PostListApiView):
+    """Лента подписок вошедшего пользователя"""
+
+    def get(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return self.error('Нужно войти', status=401)
+        return super().get(request, *args, **kwargs)
+
+    def get_viewer(self):
+        return self.request.user.pk
+
+    def get_etag_parts(self):
+        return get_generations(
+            PAGES_SCOPE, 'posts', 'comments',
+            f'following:{self.request.user.pk}',
+        )
+
+    def get_queryset(self):
+        return Post.objects.filter(author__following__user=self.request.user)
+
+    def get_paginator(self, queryset):
+        return ValuesFeedPaginator(
+            queryset, settings.PAGE_SIZE, user=self.request.user
+        )
+
+
+def get_comments_page(post_id, params):
+    paginator = ValuesCursorPaginator(
+        Comment.objects.filter(post_id=post_id).values(*COMMENT_FIELDS),
+        settings.COMMENTS_PAGE_SIZE,
+        date_field='created',
+    )
+    return get_page(paginator, params)
+
+
+class PostApiView(ApiView):
+    """Пост с первой страницей комментариев; следующие - в CommentsApiView
+    по курсору comments_next"""
+
+    def get_etag_parts(self):
+        # users - имена автора и комментаторов, groups - группа поста
+        return get_generations(
+            PAGES_SCOPE, f'post:{self.kwargs["post_id"]}', 'users', 'groups',
+        )
+
+    def get_data(self):
+        post = Post.objects.filter(pk=self.kwargs['post_id']).values(
+            *POST_FIELDS
+        ).first()
+        if post is None:
+            raise Http404('Пост не найден')
+        page = get_comments_page(post['id'], {})
+        return {
+            **serialize_post(post),
+            'comments': [serialize_comment(row) for row in page.object_list],
+            'comments_next': page.next_cursor,
+        }
+
+
+class CommentsApiView(ApiView):
+
+    def get_etag_parts(self):
+        return get_generations(
+            PAGES_SCOPE, f'post:{self.kwargs["post_id"]}', 'users',
+        )
+
+    def get_data(self):
+        post_id = self.kwargs['post_id']
+        page = get_comments_page(post_id, self.request.GET)
+        if not page.object_list and not Post.objects.filter(
+            pk=post_id
+        ).exists():
+            raise Http404('Пост не найден')
+        return {
+            'results': [serialize_comment(row) for row in page.object_list],
+            'next': page.next_cursor,
+            'previous': page.previous_cursor,
+        }
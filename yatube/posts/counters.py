@@ -0,0 +1,126 @@
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Comment, Follow, Post, User, UserStats
+
+# Счётчик пользователя: (модель, поле со ссылкой на пользователя)
+USER_COUNTERS = {
+    'posts_count': (Post, 'author_id'),
+    'followers_count': (Follow, 'author_id'),
+    'following_count': (Follow, 'user_id'),
+}
+
+
+def _count_by(model, field, ids):
+    """Число строк model для каждого значения field из ids"""
+    return dict(
+        model.objects.filter(**{f'{field}__in': ids})
+        .values_list(field).annotate(count=Count('pk')).order_by()
+    )
+
+
+def change_user_stats(user_id, **deltas):
+    """Атомарно сдвигает счётчики пользователя через F()-выражения.
+
+    Если строки счётчиков ещё нет, при увеличении она пересчитывается
+    с нуля. Уменьшение без строки игнорируется: так бывает при каскадном
+    удалении самого пользователя."""
+    updates = {name: F(name) + delta for name, delta in deltas.items()}
+    if UserStats.objects.filter(user_id=user_id).update(**updates):
+        return
+    if all(delta > 0 for delta in deltas.values()):
+        recount_users([user_id])
+
+
+def change_comments_count(post_id, delta):
+    """Сдвигает счётчик комментариев и отмечает время активности"""
+    Post.objects.filter(pk=post_id).update(
+        comments_count=F('comments_count') + delta,
+        # Не Now(): CURRENT_TIMESTAMP в SQLite - с точностью до секунды
+        commented_at=timezone.now(),
+    )
+
+
+def recount_users(user_ids):
+    """Пересчитывает счётчики пользователей по данным таблиц.
+
+    Возвращает число созданных или исправленных строк."""
+    user_ids = list(user_ids)
+    actual = {
+        name: _count_by(model, field, user_ids)
+        for name, (model, field) in USER_COUNTERS.items()
+    }
+    existing = UserStats.objects.in_bulk(user_ids)
+    to_create, to_update = [], []
+    for user_id in user_ids:
+        values = {name: counts.get(user_id, 0)
+                  for name, counts in actual.items()}
+        stats = existing.get(user_id)
+        if stats is None:
+            to_create.append(UserStats(user_id=user_id, **values))
+        elif any(getattr(stats, name) != value
+                 for name, value in values.items()):
+            for name, value in values.items():
+                setattr(stats, name, value)
+            to_update.append(stats)
+    UserStats.objects.bulk_create(to_create, ignore_conflicts=True)
+    UserStats.objects.bulk_update(to_update, list(USER_COUNTERS))
+    return len(to_create) + len(to_update)
+
+
+def recount_posts(post_ids):
+    """Пересчитывает число комментариев у постов и время активности
+    в комментариях: время последнего из оставшихся комментариев.
+
+    Возвращает число исправленных постов."""
+    post_ids = list(post_ids)
+    actual = _count_by(Comment, 'post_id', post_ids)
+    last_comments = dict(
+        Comment.objects.filter(post_id__in=post_ids)
+        .values_list('post_id').annotate(last=Max('created')).order_by()
+    )
+    drifted = []
+    for post in Post.objects.filter(pk__in=post_ids).only(
+        'comments_count', 'commented_at'
+    ):
+        count = actual.get(post.pk, 0)
+        commented_at = last_comments.get(post.pk)
+        if (post.comments_count, post.commented_at) != (count, commented_at):
+            post.comments_count = count
+            post.commented_at = commented_at
+            drifted.append(post)
+    Post.objects.bulk_update(drifted, ['comments_count', 'commented_at'])
+    return len(drifted)
+
+
+def _count_subquery(model, field):
+    """Число строк model, у которых field ссылается на строку внешнего
+    запроса"""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by()
+        .values(field).annotate(count=Count('pk')).values('count')
+    ), 0)
+
+
+def recount_all(using='default'):
+    """Пересчитывает все счётчики одним UPDATE на таблицу - для больших
+    загрузок через bulk_create, где проход пачками занял бы часы"""
+    missing = User.objects.using(using).filter(
+        stats__isnull=True
+    ).values_list('pk', flat=True)
+    UserStats.objects.using(using).bulk_create(
+        (UserStats(user_id=user_id) for user_id in missing.iterator()),
+        ignore_conflicts=True,
+    )
+    UserStats.objects.using(using).update(**{
+        name: _count_subquery(model, field)
+        for name, (model, field) in USER_COUNTERS.items()
+    })
+    Post.objects.using(using).update(
+        comments_count=_count_subquery(Comment, 'post_id'),
+        commented_at=Subquery(
+            Comment.objects.filter(post=OuterRef('pk')).order_by()
+            .values('post').annotate(last=Max('created')).values('last')
+        ),
+    )
@@ -0,0 +1,258 @@
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import Count
+
+from core.generations import bump, get_generations
+
+from .models import FeedItem, Follow, Post
+from .paginators import CursorPaginator, keyset_slice
+
+FEED_KEY = 'feed:{}:{}'
+# Сдвигается при массовой перестройке лент: все кешированные ленты
+# перестают находиться
+FEEDS_SCOPE = 'feeds'
+
+
+def _bulk_insert(items):
+    """Сохраняет записи лент пачками по FEED_BATCH_SIZE"""
+    items = iter(items)
+    while True:
+        batch = list(islice(items, settings.FEED_BATCH_SIZE))
+        if not batch:
+            break
+        FeedItem.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def feed_key(user_id, generation=None):
+    if generation is None:
+        generation, = get_generations(FEEDS_SCOPE)
+    return FEED_KEY.format(user_id, generation)
+
+
+def drop_cached_feed(user_id):
+    cache.delete(feed_key(user_id))
+
+
+def push_to_cached_feeds(post):
+    """Вставляет разосланный пост в закешированные ленты подписчиков.
+
+    Ленты, которых нет в кеше, не создаются: их соберёт первое чтение.
+    Посты популярных авторов сюда не попадают: их подмешивает
+    FeedPaginator при чтении."""
+    generation, = get_generations(FEEDS_SCOPE)
+    user_ids = Follow.objects.filter(author_id=post.author_id).values_list(
+        'user_id', flat=True
+    ).iterator()
+    row = (post.pub_date, post.pk)
+    while True:
+        batch = list(islice(user_ids, settings.FEED_BATCH_SIZE))
+        if not batch:
+            break
+        found = cache.get_many(
+            [feed_key(user_id, generation) for user_id in batch]
+        )
+        cache.set_many({
+            key: (
+                sorted({row, *rows}, reverse=True)[:settings.FEED_CACHE_SIZE],
+                popular,
+            )
+            for key, (rows, popular) in found.items()
+        }, settings.FEED_CACHE_TIMEOUT)
+
+
+def fan_out_post(post):
+    """Записывает новый пост в ленты подписчиков автора.
+
+    Посты авторов, у которых подписчиков больше FEED_FANOUT_LIMIT,
+    не рассылаются: они помечаются fanned_out=False и попадают в ленту
+    при чтении (см. FeedPaginator). Разосланный пост после фиксации
+    транзакции добавляется в кешированные ленты; откаченный пост
+    туда не попадёт."""
+    followers = Follow.objects.filter(author_id=post.author_id)
+    limit = settings.FEED_FANOUT_LIMIT
+    if followers[:limit + 1].count() > limit:
+        posts = Post.objects.filter(author_id=post.author_id)
+        first_unsent = not posts.filter(fanned_out=False).exists()
+        posts.filter(pk=post.pk).update(fanned_out=False)
+        post.fanned_out = False
+        if first_unsent:
+            # Автор стал популярным: кешированные ленты хранят список
+            # таких авторов и собираются заново
+            transaction.on_commit(lambda: bump(FEEDS_SCOPE))
+        return
+    _bulk_insert(
+        FeedItem(user_id=user_id, post_id=post.pk, pub_date=post.pub_date)
+        for user_id in followers.values_list('user_id', flat=True).iterator()
+    )
+    transaction.on_commit(lambda: push_to_cached_feeds(post))
+
+
+def backfill_feed(follow):
+    """Добавляет в ленту подписчика разосланные посты нового автора"""
+    posts = Post.objects.filter(
+        author_id=follow.author_id, fanned_out=True
+    ).values_list('id', 'pub_date')
+    _bulk_insert(
+        FeedItem(user_id=follow.user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in posts.iterator()
+    )
+    drop_cached_feed(follow.user_id)
+
+
+def trim_feed(follow):
+    """Убирает из ленты подписчика посты автора, от которого он отписался"""
+    FeedItem.objects.filter(
+        user_id=follow.user_id, post__author_id=follow.author_id
+    ).delete()
+    drop_cached_feed(follow.user_id)
+
+
+def fan_out_new_posts(after_pk=0, using='default'):
+    """Рассылает посты с id больше after_pk, загруженные через
+    bulk_create, как если бы каждый рассылался при публикации: посты
+    авторов с подписчиками больше FEED_FANOUT_LIMIT помечаются
+    неразосланными, остальные записываются в ленты одним
+    INSERT ... SELECT. Посты, опубликованные обычным путём во время
+    загрузки, сигнал уже разослал: их записи ленты пропускаются"""
+    popular = Follow.objects.using(using).values('author_id').annotate(
+        followers=Count('pk')
+    ).filter(followers__gt=settings.FEED_FANOUT_LIMIT).values('author_id')
+    posts = Post.objects.using(using).filter(pk__gt=after_pk)
+    with transaction.atomic(using):
+        posts.filter(fanned_out=False).exclude(
+            author_id__in=popular
+        ).update(fanned_out=True)
+        posts.filter(fanned_out=True, author_id__in=popular).update(
+            fanned_out=False
+        )
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {FeedItem._meta.db_table} '
+                f'(user_id, post_id, pub_date) '
+                f'SELECT follow.user_id, post.id, post.pub_date '
+                f'FROM {Follow._meta.db_table} follow '
+                f'JOIN {Post._meta.db_table} post '
+                f'ON post.author_id = follow.author_id '
+                f'WHERE post.fanned_out AND post.id > %s '
+                f'AND NOT EXISTS (SELECT 1 FROM {FeedItem._meta.db_table} '
+                f'item WHERE item.user_id = follow.user_id '
+                f'AND item.post_id = post.id)',
+                [after_pk],
+            )
+    bump(FEEDS_SCOPE)
+
+
+def rebuild_feeds(using='default'):
+    """Строит все ленты заново по подпискам"""
+    with transaction.atomic(using):
+        FeedItem.objects.using(using).all().delete()
+        fan_out_new_posts(using=using)
+
+
+class FeedPaginator(CursorPaginator):
+    """Лента подписок из готовых записей FeedItem.
+
+    FEED_CACHE_SIZE новых записей ленты (дата, id поста) лежат в кеше
+    вместе со списком популярных авторов, на которых подписан
+    пользователь: разосланные посты вставляются в кешированную ленту
+    при записи, подписка и отписка сбрасывают её. Неразосланные посты
+    популярных авторов подмешиваются при чтении запросом по индексу.
+    Глубже кешированной ленты страница собирается из двух коротких
+    выборок по индексам: записи ленты пользователя и неразосланные
+    посты его авторов. Старые ссылки page=<N> по-прежнему
+    обслуживаются переданным queryset."""
+
+    def __init__(self, object_list, per_page, user=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.user = user
+
+    def _feed_rows(self, position, newer, limit):
+        """Записи ленты (дата, id поста) из БД после позиции курсора"""
+        return list(keyset_slice(
+            FeedItem.objects.filter(user=self.user).values_list(
+                'pub_date', 'post_id'
+            ),
+            position, newer, limit, id_field='post_id',
+        ))
+
+    def _unsent_rows(self, position, newer, limit, author_ids=None):
+        """Неразосланные посты авторов пользователя (или author_ids)"""
+        posts = Post.objects.filter(fanned_out=False)
+        if author_ids is None:
+            posts = posts.filter(author__following__user=self.user)
+        else:
+            posts = posts.filter(author_id__in=author_ids)
+        return list(keyset_slice(
+            posts.values_list('pub_date', 'id'), position, newer, limit,
+        ))
+
+    @staticmethod
+    def _merge(rows, unsent, newer, limit):
+        return sorted(rows + unsent, reverse=not newer)[:limit]
+
+    def _rows(self, position, newer, limit):
+        return self._merge(
+            self._feed_rows(position, newer, limit),
+            self._unsent_rows(position, newer, limit),
+            newer, limit,
+        )
+
+    def _cached_feed(self):
+        """(новые записи ленты, популярные авторы пользователя)"""
+        key = feed_key(self.user.pk)
+        cached = cache.get(key)
+        if cached is None:
+            cached = (
+                self._feed_rows(None, False, settings.FEED_CACHE_SIZE),
+                list(Follow.objects.filter(
+                    user=self.user, author__posts__fanned_out=False
+                ).values_list('author_id', flat=True).distinct()),
+            )
+            cache.set(key, cached, settings.FEED_CACHE_TIMEOUT)
+        return cached
+
+    def _cached_rows(self, position, newer, limit):
+        """То же из кешированной ленты; None, если страница выходит
+        за её пределы"""
+        cached, popular = self._cached_feed()
+        # Лента короче FEED_CACHE_SIZE целиком лежит в кеше
+        complete = len(cached) < settings.FEED_CACHE_SIZE
+        if newer:
+            if not complete and (not cached or position < cached[-1]):
+                return None
+            rows = [row for row in reversed(cached) if row > position]
+        else:
+            rows = [
+                row for row in cached if position is None or row < position
+            ]
+            if len(rows) < limit and not complete:
+                return None
+        rows = rows[:limit]
+        if popular:
+            rows = self._merge(
+                rows, self._unsent_rows(position, newer, limit, popular),
+                newer, limit,
+            )
+        return rows
+
+    def _fetch(self, position, newer):
+        limit = self.per_page + 1
+        rows = self._cached_rows(position, newer, limit)
+        cached = rows is not None
+        if not cached:
+            rows = self._rows(position, newer, limit)
+        posts = self.load_posts([post_id for _, post_id in rows])
+        if cached and len(posts) < len(rows):
+            # В кеше остались удалённые посты: следующее чтение соберёт
+            # ленту заново, эта страница читается из БД
+            drop_cached_feed(self.user.pk)
+            rows = self._rows(position, newer, limit)
+            posts = self.load_posts([post_id for _, post_id in rows])
+        return [posts[post_id] for _, post_id in rows if post_id in posts]
+
+    def load_posts(self, ids):
+        """Посты страницы: {id: пост}"""
+        return Post.objects.select_related('author', 'group').in_bulk(ids)
@@ -1,5 +1,7 @@
+from django.core.files.uploadedfile import UploadedFile
 from django.forms import ModelForm
 
+from .images import ingest_image
 from .models import Comment, Post
 
 
@@ -18,6 +20,13 @@ class PostForm(ModelForm):
             'image': 'Обложка поста',
         }
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        # Уже сохранённая картинка при редактировании не пережимается
+        if isinstance(image, UploadedFile):
+            return ingest_image(image)
+        return image
+
 
 class CommentForm(ModelForm):
     class Meta:
@@ -0,0 +1,63 @@
+import io
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps
+
+# Анимацию нельзя пережать в JPEG, такие картинки сохраняются как есть
+KEEP_FORMATS = {'GIF'}
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+
+
+def ingest_image(uploaded):
+    """Проверяет загруженную картинку и пережимает её для хранения.
+
+    Размер файла и число пикселей проверяются до декодирования.
+    Картинка поворачивается по EXIF, уменьшается до POST_IMAGE_MAX_SIDE
+    и сохраняется без метаданных: непрозрачная - прогрессивным JPEG,
+    с прозрачностью - WebP."""
+    if uploaded.size > settings.POST_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            'Файл больше %(limit)d МиБ',
+            code='file_too_large',
+            params={'limit': settings.POST_IMAGE_MAX_BYTES // 2 ** 20},
+        )
+    uploaded.seek(0)
+    with Image.open(uploaded) as image:
+        width, height = image.size
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            raise ValidationError(
+                'Картинка %(width)dx%(height)d слишком большая',
+                code='image_too_large',
+                params={'width': width, 'height': height},
+            )
+        if image.format in KEEP_FORMATS:
+            uploaded.seek(0)
+            return uploaded
+
+        image = ImageOps.exif_transpose(image)
+        side = settings.POST_IMAGE_MAX_SIDE
+        image.thumbnail((side, side), Image.LANCZOS)
+        buffer = io.BytesIO()
+        if _has_alpha(image):
+            extension, content_type = 'webp', 'image/webp'
+            image.save(buffer, 'WEBP',
+                       quality=settings.POST_IMAGE_QUALITY, method=6)
+        else:
+            extension, content_type = 'jpg', 'image/jpeg'
+            image.convert('RGB').save(
+                buffer, 'JPEG', quality=settings.POST_IMAGE_QUALITY,
+                optimize=True, progressive=True,
+            )
+
+    stem = os.path.splitext(os.path.basename(uploaded.name))[0]
+    return SimpleUploadedFile(
+        f'{stem}.{extension}', buffer.getvalue(), content_type=content_type
+    )
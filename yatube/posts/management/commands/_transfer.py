@@ -0,0 +1,31 @@
+import contextlib
+import datetime as dt
+import sys
+
+
+def add_filter_arguments(parser):
+    """Фильтры, общие для export_posts и import_posts"""
+    parser.add_argument('--group', help='slug группы')
+    parser.add_argument('--author', help='username автора')
+    parser.add_argument(
+        '--since', type=dt.date.fromisoformat,
+        help='Посты с этой даты, ГГГГ-ММ-ДД, включительно',
+    )
+    parser.add_argument(
+        '--until', type=dt.date.fromisoformat,
+        help='Посты до этой даты, ГГГГ-ММ-ДД, не включительно',
+    )
+
+
+def guess_format(path, fmt):
+    return fmt or ('csv' if path.endswith('.csv') else 'jsonl')
+
+
+@contextlib.contextmanager
+def open_file(path, mode):
+    """Файл path или стандартный поток для '-'"""
+    if path == '-':
+        yield sys.stdout if mode == 'w' else sys.stdin
+        return
+    with open(path, mode, encoding='utf-8', newline='') as file:
+        yield file
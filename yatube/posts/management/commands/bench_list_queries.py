@@ -0,0 +1,172 @@
+import json
+import os
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Count
+
+from posts.feeds import rebuild_feeds
+from posts.models import Comment, FeedItem, Follow, Post
+from posts.seeding import seed_uniform
+
+ALIAS = 'bench'
+
+# Индексы из миграции 0014: с --compare запросы меряются и без них
+LIST_INDEXES = {
+    Post: ('post_date_idx', 'post_author_date_idx', 'post_group_date_idx'),
+    Comment: ('comment_post_created_idx',),
+    Follow: ('follow_author_user_idx',),
+}
+
+
+class Command(BaseCommand):
+    help = ('Записывает EXPLAIN QUERY PLAN и время выборок списков постов '
+            'на отдельной наполненной базе SQLite')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database-file',
+            default=os.path.join(settings.BASE_DIR, 'bench.sqlite3'),
+            help='Файл базы для бенчмарка; наполняется, если пуст',
+        )
+        parser.add_argument('--users', type=int, default=10_000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--comments', type=int, default=1_000_000)
+        parser.add_argument('--follows', type=int, default=200_000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument(
+            '--compare', action='store_true',
+            help='Повторить замеры без индексов списков',
+        )
+        parser.add_argument('--output', help='Сохранить результаты в JSON')
+
+    def handle(self, *args, **options):
+        connections.databases[ALIAS] = {
+            **settings.DATABASES['default'],
+            'NAME': options['database_file'],
+        }
+        call_command('migrate', database=ALIAS, verbosity=0)
+        if not Post.objects.using(ALIAS).exists():
+            self.stdout.write('Наполнение базы...')
+            start = time.perf_counter()
+            seed_uniform(
+                ALIAS, options['users'], options['groups'],
+                options['posts'], options['comments'], options['follows'],
+            )
+            self.stdout.write(
+                f'Готово за {time.perf_counter() - start:.1f} с'
+            )
+        # seed_uniform пишет без сигналов: ленты для выборки feed строим
+        # отдельно, в том числе в базе, наполненной прежней версией
+        feed_items = FeedItem.objects.using(ALIAS)
+        if (not feed_items.exists()
+                and Follow.objects.using(ALIAS).exists()):
+            self.stdout.write('Построение лент подписок...')
+            start = time.perf_counter()
+            rebuild_feeds(ALIAS)
+            self.stdout.write(
+                f'Записей лент: {feed_items.count()} за '
+                f'{time.perf_counter() - start:.1f} с'
+            )
+
+        queries = self.list_queries()
+        results = {'with_indexes': self.measure(queries, options['repeat'])}
+        if options['compare']:
+            self.drop_indexes()
+            try:
+                results['without_indexes'] = self.measure(
+                    queries, options['repeat']
+                )
+            finally:
+                self.create_indexes()
+
+        for variant, measured in results.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(variant))
+            for name, result in measured.items():
+                self.stdout.write(f'{name}: {result["median_ms"]:.3f} мс')
+                for line in result['plan']:
+                    self.stdout.write(f'    {line}')
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+
+    @staticmethod
+    def busiest(queryset, field):
+        """Значение field с наибольшим числом строк"""
+        return (
+            queryset.using(ALIAS).values_list(field)
+            .annotate(count=Count('pk')).order_by('-count')[0][0]
+        )
+
+    def list_queries(self):
+        """Выборки первой страницы, как их делают представления"""
+        author = self.busiest(Post.objects, 'author_id')
+        group = self.busiest(Post.objects.exclude(group=None), 'group_id')
+        post = self.busiest(Comment.objects, 'post_id')
+        reader = self.busiest(Follow.objects, 'user_id')
+        posts = Post.objects.using(ALIAS).select_related('author', 'group')
+        comments = Comment.objects.using(ALIAS).select_related('author')
+        feed = FeedItem.objects.using(ALIAS)
+        follows = Follow.objects.using(ALIAS)
+        by_date = ('-pub_date', '-id')
+        limit = settings.PAGE_SIZE + 1
+        return {
+            'index': posts.order_by(*by_date)[:limit],
+            'profile': posts.filter(
+                author_id=author
+            ).order_by(*by_date)[:limit],
+            'group': posts.filter(group_id=group).order_by(*by_date)[:limit],
+            'follow': posts.filter(
+                author__following__user_id=reader
+            ).order_by(*by_date)[:limit],
+            'feed': feed.filter(user_id=reader).order_by(
+                '-pub_date', '-post_id'
+            )[:limit],
+            'comments': comments.filter(post_id=post).order_by(
+                '-created', '-id'
+            )[:limit],
+            'followers': follows.filter(author_id=author).values_list(
+                'user_id', flat=True
+            )[:1000],
+        }
+
+    @staticmethod
+    def measure(queries, repeat):
+        results = {}
+        with connections[ALIAS].cursor() as cursor:
+            for name, queryset in queries.items():
+                sql, params = queryset.query.sql_with_params()
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                plan = [row[-1] for row in cursor.fetchall()]
+                timings = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    list(queryset.all())
+                    timings.append((time.perf_counter() - start) * 1000)
+                results[name] = {
+                    'median_ms': statistics.median(timings),
+                    'plan': plan,
+                }
+        return results
+
+    @staticmethod
+    def _indexes(model):
+        return [index for index in model._meta.indexes
+                if index.name in LIST_INDEXES[model]]
+
+    def drop_indexes(self):
+        with connections[ALIAS].schema_editor() as editor:
+            for model in LIST_INDEXES:
+                for index in self._indexes(model):
+                    editor.remove_index(model, index)
+
+    def create_indexes(self):
+        with connections[ALIAS].schema_editor() as editor:
+            for model in LIST_INDEXES:
+                for index in self._indexes(model):
+                    editor.add_index(model, index)
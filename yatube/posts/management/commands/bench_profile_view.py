@@ -0,0 +1,104 @@
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.shortcuts import get_object_or_404
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from posts.models import Post, User
+from posts.seeding import BATCH_SIZE, explicit_dates
+from posts.views import ProfileView
+
+
+class LegacyProfileView(ProfileView):
+    """Профиль в прежнем виде: все посты и подписчики автора
+    подгружаются заранее, счётчики считаются в шаблоне"""
+
+    def get_queryset(self):
+        self.user = get_object_or_404(
+            User.objects.prefetch_related(
+                'posts__author', 'posts__group', 'following'
+            ),
+            username=self.kwargs['username']
+        )
+        return self.user.posts.all()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Прежний profile.html: author.posts.count и author.following.count
+        self.user.posts.count()
+        self.user.following.count()
+        return context
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает прежнюю и текущую страницу профиля автора '
+            'с большим числом постов. Данные откатываются после замера, '
+            'кеш - отдельный, в памяти процесса')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, posts, repeat, **options):
+        # Замер чистит кеш перед каждым показом: общий кеш сайта не трогаем
+        try:
+            with override_settings(CACHES=settings.TEST_CACHES), \
+                    transaction.atomic():
+                author = self.create_author(posts)
+                for name, view in (('before', LegacyProfileView),
+                                   ('after', ProfileView)):
+                    self.report(name, self.measure(view, author, repeat))
+                raise Rollback
+        except Rollback:
+            pass
+
+    @staticmethod
+    def create_author(count):
+        author = User.objects.create_user(f'bench_author_{time.time_ns()}')
+        now = timezone.now()
+        with explicit_dates(Post._meta.get_field('pub_date')):
+            for start in range(0, count, BATCH_SIZE):
+                Post.objects.bulk_create([
+                    Post(text=f'Пост {i}', author=author,
+                         pub_date=now - timezone.timedelta(seconds=i))
+                    for i in range(start, min(start + BATCH_SIZE, count))
+                ])
+        return author
+
+    @staticmethod
+    def measure(view_class, author, repeat):
+        """Лучшее время, число запросов и пик памяти одного показа"""
+        request = RequestFactory().get(f'/profile/{author.username}/')
+        request.user = AnonymousUser()
+        view = view_class.as_view()
+        best = None
+        for _ in range(repeat):
+            cache.clear()
+            tracemalloc.start()
+            start = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                view(request, username=author.username).render()
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            if best is None or elapsed < best[0]:
+                best = (elapsed, len(queries), peak)
+        return best
+
+    def report(self, name, result):
+        elapsed, queries, peak = result
+        self.stdout.write(
+            f'{name}: {elapsed * 1000:.1f} мс, запросов {queries}, '
+            f'пик памяти {peak / 2 ** 20:.1f} МиБ'
+        )
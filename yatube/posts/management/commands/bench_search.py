@@ -0,0 +1,124 @@
+import json
+import os
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.debugging_tools import translify
+from posts.models import Post
+from posts.search import SearchResults, rebuild_index
+from posts.seeding import ZipfText, seed_uniform
+
+ALIAS = 'bench_search'
+
+
+class Command(BaseCommand):
+    help = ('Меряет поиск по полнотекстовому индексу на отдельной базе '
+            'SQLite с миллионами постов')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database-file',
+            default=os.path.join(settings.BASE_DIR, 'bench_search.sqlite3'),
+            help='Файл базы для бенчмарка; наполняется, если пуст',
+        )
+        parser.add_argument('--posts', type=int, default=2_000_000)
+        parser.add_argument('--vocabulary', type=int, default=50_000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument(
+            '--target-ms', type=float, default=10,
+            help='Цель: медиана страницы поиска, мс',
+        )
+        parser.add_argument(
+            '--compare', action='store_true',
+            help='Замерить и прежний поиск через LIKE (медленно)',
+        )
+        parser.add_argument('--output', help='Сохранить результаты в JSON')
+
+    def handle(self, *args, **options):
+        connections.databases[ALIAS] = {
+            **settings.DATABASES['default'],
+            'NAME': options['database_file'],
+        }
+        call_command('migrate', database=ALIAS, verbosity=0)
+        text = ZipfText(options['vocabulary'])
+        if not Post.objects.using(ALIAS).exists():
+            self.stdout.write('Наполнение базы...')
+            start = time.perf_counter()
+            seed_uniform(ALIAS, users=1000, groups=50,
+                         posts=options['posts'], comments=0, follows=0,
+                         text=text)
+            rebuild_index(ALIAS)
+            self.stdout.write(
+                f'Готово за {time.perf_counter() - start:.1f} с'
+            )
+
+        words = text.words
+        queries = {
+            'rare': words[-1],
+            'medium': words[len(words) // 100],
+            'common': words[0],
+            'two_words': f'{words[len(words) // 100]} {words[10]}',
+            'prefix': words[len(words) // 100][:3],
+            'translit': translify(words[len(words) // 100], strict=False),
+        }
+        results = {}
+        for name, query in queries.items():
+            results[name] = {
+                'query': query,
+                'matches': SearchResults(query, using=ALIAS).count(),
+                # Страница, как её строит Paginator: подсчёт и выборка
+                'page_ms': self.median(
+                    lambda: self.first_page(query), options['repeat']
+                ),
+            }
+            if options['compare']:
+                like = Post.objects.using(ALIAS).filter(
+                    text__icontains=query
+                ).order_by('-pub_date')[:settings.PAGE_SIZE]
+                results[name]['like_ms'] = self.median(
+                    lambda: list(like.all()), 3
+                )
+
+        target = options['target_ms']
+        for name, result in results.items():
+            result['within_target'] = result['page_ms'] <= target
+            line = (f'{name} ({result["query"]}, {result["matches"]} '
+                    f'кандидатов): страница {result["page_ms"]:.2f} мс')
+            if 'like_ms' in result:
+                line += f', LIKE {result["like_ms"]:.0f} мс'
+            if not result['within_target']:
+                line += ' - медленнее цели'
+            self.stdout.write(line)
+        slow = [name for name, result in results.items()
+                if not result['within_target']]
+        if slow:
+            self.stdout.write(self.style.WARNING(
+                f'Медленнее цели {target:g} мс: {", ".join(slow)}'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Все запросы укладываются в цель {target:g} мс'
+            ))
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+
+    @staticmethod
+    def first_page(query):
+        found = SearchResults(query, using=ALIAS)
+        found.count()
+        return found[:settings.PAGE_SIZE]
+
+    @staticmethod
+    def median(func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.transfer import FORMATS, export_rows, filter_posts, write_rows
+
+from ._transfer import add_filter_arguments, guess_format, open_file
+
+
+class Command(BaseCommand):
+    help = ('Выгружает посты в JSONL или CSV потоком: память не зависит '
+            'от числа постов')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл выгрузки; без него или "-" - стандартный вывод',
+        )
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        add_filter_arguments(parser)
+
+    def handle(self, *args, path, chunk_size, **options):
+        fmt = guess_format(path, options['format'])
+        posts = filter_posts(
+            Post.objects.all(), options['group'], options['author'],
+            options['since'], options['until'],
+        )
+        start = time.perf_counter()
+        with open_file(path, 'w') as file:
+            count = write_rows(export_rows(posts, chunk_size), file, fmt)
+        seconds = time.perf_counter() - start
+        # Отчёт не должен попасть в саму выгрузку на стандартном выводе
+        report = self.stderr if path == '-' else self.stdout
+        report.write(
+            f'Выгружено постов: {count} за {seconds:.1f} с '
+            f'({count / max(seconds, 1e-9):.0f} постов/с)'
+        )
@@ -0,0 +1,73 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.transfer import FORMATS, PostImporter, read_rows, row_matches
+
+from ._transfer import add_filter_arguments, guess_format, open_file
+
+
+class Command(BaseCommand):
+    help = ('Загружает посты из JSONL или CSV пачками bulk_create; автор '
+            'и группа ищутся по username и slug')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл для загрузки; без него или "-" - стандартный ввод',
+        )
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--create-authors', action='store_true',
+            help='Создавать неизвестных авторов без пароля',
+        )
+        parser.add_argument(
+            '--create-groups', action='store_true',
+            help='Создавать неизвестные группы',
+        )
+        parser.add_argument(
+            '--skip-derived', action='store_true',
+            help='Не дописывать ленты, счётчики и поисковый индекс',
+        )
+        add_filter_arguments(parser)
+
+    def handle(self, *args, path, batch_size, **options):
+        fmt = guess_format(path, options['format'])
+        filters = {
+            name: options[name]
+            for name in ('group', 'author', 'since', 'until')
+        }
+        importer = PostImporter(
+            batch_size, options['create_authors'], options['create_groups']
+        )
+        start = time.perf_counter()
+        error = None
+        with open_file(path, 'r') as file:
+            try:
+                importer.run(
+                    row for row in read_rows(file, fmt)
+                    if row_matches(row, **filters)
+                )
+            except (KeyError, ValueError) as e:
+                # Пачки до неверной строки записаны: их тоже дописываем
+                # в ленты, счётчики и поиск
+                error = e
+        seconds = time.perf_counter() - start
+        self.stdout.write(
+            f'Загружено постов: {importer.imported} за {seconds:.1f} с '
+            f'({importer.imported / max(seconds, 1e-9):.0f} постов/с), '
+            f'пропущено без автора или группы: {importer.skipped}'
+        )
+        if not options['skip_derived']:
+            start = time.perf_counter()
+            importer.finish()
+            self.stdout.write(
+                f'Ленты, счётчики и поиск: '
+                f'{time.perf_counter() - start:.1f} с'
+            )
+        if error is not None:
+            raise CommandError(
+                f'Неверная строка файла: {error}; загружены только '
+                f'посты до неё ({importer.imported})'
+            )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts.search import BATCH_SIZE, rebuild_index
+
+
+class Command(BaseCommand):
+    help = ('Заново строит полнотекстовый индекс постов, например после '
+            'загрузки данных через bulk_create')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, batch_size, database, **options):
+        indexed = rebuild_index(database, batch_size)
+        self.stdout.write(self.style.SUCCESS(f'В индексе {indexed} постов'))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import recount_posts, recount_users
+from posts.models import Post, User
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов, подписок и комментариев'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк пересчитывать за один проход',
+        )
+
+    def handle(self, *args, batch_size, **options):
+        fixed_users = self.recount(User, recount_users, batch_size)
+        fixed_posts = self.recount(Post, recount_posts, batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено счётчиков: пользователи {fixed_users}, '
+            f'посты {fixed_posts}'
+        ))
+
+    @staticmethod
+    def recount(model, recount, batch_size):
+        """Проходит таблицу по первичному ключу пачками по batch_size"""
+        fixed, last_pk = 0, 0
+        while True:
+            ids = list(
+                model.objects.filter(pk__gt=last_pk).order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                return fixed
+            fixed += recount(ids)
+            last_pk = ids[-1]
@@ -0,0 +1,112 @@
+import datetime as dt
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts.seeding import SeedPlan, fill_derived, seed_realistic
+
+
+class Command(BaseCommand):
+    help = ('Наполняет базу большим объёмом синтетических данных: '
+            'подписчики по степенному закону, горячие группы, длинные '
+            'ветки комментариев. Результат определяется --seed')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--groups', type=int, default=1_000)
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--comments', type=int, default=3_000_000)
+        parser.add_argument(
+            '--follows', type=int, default=2_000_000,
+            help='Попыток подписаться; повторы пар отбрасываются',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument(
+            '--until', type=dt.date.fromisoformat,
+            help='Дата последнего поста, ГГГГ-ММ-ДД; по умолчанию сегодня',
+        )
+        parser.add_argument(
+            '--follower-exponent', type=float, default=1.0,
+            help='Показатель закона Ципфа для числа подписчиков авторов',
+        )
+        parser.add_argument(
+            '--thread-exponent', type=float, default=1.0,
+            help='Показатель закона Ципфа для числа комментариев постов',
+        )
+        parser.add_argument(
+            '--hot-groups', type=float, default=0.05,
+            help='Доля горячих групп',
+        )
+        parser.add_argument(
+            '--hot-share', type=float, default=0.6,
+            help='Доля постов с группой, попадающих в горячие группы',
+        )
+        parser.add_argument(
+            '--ungrouped', type=float, default=0.3,
+            help='Доля постов без группы',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Процессов-генераторов; 0 - всё в текущем процессе',
+        )
+        parser.add_argument('--chunk-size', type=int, default=20_000)
+        parser.add_argument(
+            '--skip-derived', action='store_true',
+            help='Не строить счётчики, ленты и поисковый индекс',
+        )
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        until = options['until']
+        plan = SeedPlan(
+            seed=options['seed'],
+            days=options['days'],
+            until=until and timezone.make_aware(
+                dt.datetime.combine(until, dt.time())
+            ),
+            follower_exponent=options['follower_exponent'],
+            thread_exponent=options['thread_exponent'],
+            hot_groups=options['hot_groups'],
+            hot_share=options['hot_share'],
+            ungrouped=options['ungrouped'],
+        )
+        self.started = self.phase_started = time.perf_counter()
+        self.phase, self.written = None, 0
+        seed_realistic(
+            options['database'], options['users'], options['groups'],
+            options['posts'], options['comments'], options['follows'],
+            plan=plan, workers=options['workers'],
+            chunk_size=options['chunk_size'], progress=self.progress,
+        )
+        self.finish_phase()
+        if not options['skip_derived']:
+            fill_derived(options['database'], progress=self.report_step)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.perf_counter() - self.started:.1f} с'
+        ))
+
+    def progress(self, name, count):
+        if name != self.phase:
+            self.finish_phase()
+            self.phase, self.written = name, 0
+        self.written += count
+
+    def finish_phase(self):
+        """Итог записанной таблицы; следующая отсчитывается с этого
+        момента"""
+        now = time.perf_counter()
+        if not self.phase:
+            self.phase_started = now
+            return
+        seconds = now - self.phase_started
+        self.stdout.write(
+            f'{self.phase}: {self.written} строк за {seconds:.1f} с '
+            f'({self.written / max(seconds, 1e-9):.0f} строк/с)'
+        )
+        self.phase_started = now
+
+    def report_step(self, name, seconds):
+        self.stdout.write(f'{name}: {seconds:.1f} с')
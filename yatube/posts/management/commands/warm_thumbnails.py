@@ -0,0 +1,56 @@
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts.models import Post
+from posts.thumbnails import init_worker, try_generate_thumbnails
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Создаёт превью для картинок уже опубликованных постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число процессов; 0 - всё в текущем процессе',
+        )
+        parser.add_argument('--chunk-size', type=int, default=20)
+
+    def handle(self, *args, workers, chunk_size, **options):
+        names = list(
+            Post.objects.exclude(image='')
+            .values_list('image', flat=True).distinct()
+        )
+        start = time.perf_counter()
+        if workers:
+            # Дочерние процессы не должны унаследовать открытые соединения
+            connections.close_all()
+            with ProcessPoolExecutor(workers, initializer=init_worker) as pool:
+                failed = self.report_errors(names, pool.map(
+                    try_generate_thumbnails, names, chunksize=chunk_size
+                ))
+        else:
+            failed = self.report_errors(
+                names, map(try_generate_thumbnails, names)
+            )
+        self.stdout.write(
+            f'Превью готовы для {len(names) - failed} картинок '
+            f'за {time.perf_counter() - start:.1f} с'
+        )
+        if failed:
+            self.stderr.write(f'Не удалось создать превью: {failed}')
+
+    def report_errors(self, names, errors):
+        """Пишет ошибки картинок в журнал; возвращает их число"""
+        failed = 0
+        for name, error in zip(names, errors):
+            if error is not None:
+                failed += 1
+                logger.error('Не удалось создать превью %s: %s', name, error)
+        return failed
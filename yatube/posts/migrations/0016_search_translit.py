@@ -0,0 +1,206 @@
+import re
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+# Копия транслита из core.debugging_tools и posts.search на момент
+# миграции: исторические данные не должны зависеть от живого кода
+TRANSTABLE = (
+    ("'", "'"),
+    ('"', '"'),
+    ("‘", "'"),
+    ("’", "'"),
+    ("«", '"'),
+    ("»", '"'),
+    ("“", '"'),
+    ("”", '"'),
+    ("–", "-"),  # en dash
+    ("—", "-"),  # em dash
+    ("‒", "-"),  # figure dash
+    ("−", "-"),  # minus
+    ("…", "..."),
+    ("№", "#"),
+    ("Щ", "Sch"),
+    ("Щ", "SCH"),
+    ("Ё", "Yo"),
+    ("Ё", "YO"),
+    ("Ж", "Zh"),
+    ("Ж", "ZH"),
+    ("Ц", "Ts"),
+    ("Ц", "TS"),
+    ("Ч", "Ch"),
+    ("Ч", "CH"),
+    ("Ш", "Sh"),
+    ("Ш", "SH"),
+    ("Ы", "Yi"),
+    ("Ы", "YI"),
+    ("Ю", "YU"),
+    ("Ю", "Yu"),
+    ("Я", "Ya"),
+    ("Я", "YA"),
+    ("А", "A"),
+    ("Б", "B"),
+    ("В", "V"),
+    ("Г", "G"),
+    ("Д", "D"),
+    ("Е", "E"),
+    ("З", "Z"),
+    ("И", "I"),
+    ("Й", "J"),
+    ("К", "K"),
+    ("Л", "L"),
+    ("М", "M"),
+    ("Н", "N"),
+    ("О", "O"),
+    ("П", "P"),
+    ("Р", "R"),
+    ("С", "S"),
+    ("Т", "T"),
+    ("У", "U"),
+    ("Ф", "F"),
+    ("Х", "H"),
+    ("Э", "E"),
+    ("Ъ", "`"),
+    ("Ь", "'"),
+    ("щ", "sch"),
+    ("ё", "yo"),
+    ("ж", "zh"),
+    ("ц", "ts"),
+    ("ч", "ch"),
+    ("ш", "sh"),
+    ("ы", "yi"),
+    ("ю", "yu"),
+    ("я", "ya"),
+    ("а", "a"),
+    ("б", "b"),
+    ("в", "v"),
+    ("г", "g"),
+    ("д", "d"),
+    ("е", "e"),
+    ("з", "z"),
+    ("и", "i"),
+    ("й", "j"),
+    ("к", "k"),
+    ("л", "l"),
+    ("м", "m"),
+    ("н", "n"),
+    ("о", "o"),
+    ("п", "p"),
+    ("р", "r"),
+    ("с", "s"),
+    ("т", "t"),
+    ("у", "u"),
+    ("ф", "f"),
+    ("х", "h"),
+    ("э", "e"),
+    ("ъ", "`"),
+    ("ь", "'"),
+    ("c", "c"),
+    ("q", "q"),
+    ("y", "y"),
+    ("x", "x"),
+    ("w", "w"),
+    ("1", "1"),
+    ("2", "2"),
+    ("3", "3"),
+    ("4", "4"),
+    ("5", "5"),
+    ("6", "6"),
+    ("7", "7"),
+    ("8", "8"),
+    ("9", "9"),
+    ("0", "0"),
+)
+
+TOKEN_RE = re.compile(r'\w+')
+CYRILLIC_RE = re.compile('[а-яё]', re.IGNORECASE)
+LATIN_RE = re.compile('[a-z]', re.IGNORECASE)
+
+TRANSLIT_TABLE = {}
+for _cyrillic, _latin in TRANSTABLE:
+    TRANSLIT_TABLE.setdefault(ord(_cyrillic), _latin)
+FROM_LATIN = {}
+for _cyrillic, _latin in TRANSTABLE:
+    if CYRILLIC_RE.fullmatch(_cyrillic) and _cyrillic.islower():
+        FROM_LATIN.setdefault(_latin, _cyrillic)
+FROM_LATIN_RE = re.compile('|'.join(
+    re.escape(latin) for latin in sorted(FROM_LATIN, key=len, reverse=True)
+))
+
+
+def shadow(text):
+    """Слова text в другой раскладке: кириллица - транслитом,
+    латиница - обратным транслитом"""
+    cyrillic, latin = [], []
+    for word in TOKEN_RE.findall(text):
+        if CYRILLIC_RE.search(word):
+            cyrillic.append(word)
+        elif LATIN_RE.search(word):
+            latin.append(word)
+    return ' '.join(filter(None, (
+        ' '.join(cyrillic).translate(TRANSLIT_TABLE),
+        FROM_LATIN_RE.sub(
+            lambda match: FROM_LATIN[match.group()],
+            ' '.join(latin).lower(),
+        ),
+    )))
+
+
+def create_table(schema_editor, columns):
+    schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+    schema_editor.execute(
+        f'CREATE VIRTUAL TABLE posts_search USING fts5({columns}, '
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4')"
+    )
+
+
+def add_shadow(apps, schema_editor):
+    # Полнотекстовый индекс есть только у SQLite (FTS5)
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Group = apps.get_model('posts', 'Group')
+    Post = apps.get_model('posts', 'Post')
+    db_alias = schema_editor.connection.alias
+
+    create_table(schema_editor, 'text, group_title, shadow')
+    titles = dict(Group.objects.using(db_alias).values_list('pk', 'title'))
+    posts = Post.objects.using(db_alias).order_by('pk').values_list(
+        'pk', 'text', 'group_id'
+    )
+    last_pk = 0
+    with schema_editor.connection.cursor() as cursor:
+        while True:
+            batch = list(posts.filter(pk__gt=last_pk)[:BATCH_SIZE])
+            if not batch:
+                break
+            rows = []
+            for pk, text, group_id in batch:
+                title = titles.get(group_id, '')
+                rows.append((pk, text, title, shadow(f'{text} {title}')))
+            cursor.executemany(
+                'INSERT INTO posts_search(rowid, text, group_title, shadow) '
+                'VALUES (%s, %s, %s, %s)',
+                rows,
+            )
+            last_pk = batch[-1][0]
+
+
+def remove_shadow(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    create_table(schema_editor, 'text')
+    schema_editor.execute(
+        'INSERT INTO posts_search(rowid, text) SELECT id, text FROM posts_post'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_post_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_shadow, remove_shadow),
+    ]
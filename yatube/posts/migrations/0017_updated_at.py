@@ -0,0 +1,78 @@
+from django.db import migrations, models
+from django.db.models import F, Max, OuterRef, Subquery
+from django.utils import timezone
+
+BATCH_SIZE = 1000
+
+
+def batches(queryset):
+    """Пачки id строк queryset по возрастанию ключа: каждая
+    заполняется своим UPDATE, без долгой блокировки всей таблицы"""
+    ids = queryset.order_by('pk').values_list('pk', flat=True)
+    last_pk = 0
+    while True:
+        batch = list(ids.filter(pk__gt=last_pk)[:BATCH_SIZE])
+        if not batch:
+            break
+        yield batch
+        last_pk = batch[-1]
+
+
+def fill_timestamps(apps, schema_editor):
+    Group = apps.get_model('posts', 'Group')
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    db_alias = schema_editor.connection.alias
+
+    # Правки до миграции не отслеживались: версия поста - его публикация
+    posts = Post.objects.using(db_alias)
+    last_comment = Subquery(
+        Comment.objects.using(db_alias).filter(post=OuterRef('pk'))
+        .order_by().values('post').annotate(last=Max('created'))
+        .values('last')
+    )
+    for batch in batches(posts):
+        posts.filter(pk__in=batch).update(
+            updated_at=F('pub_date'), commented_at=last_comment,
+        )
+
+    now = timezone.now()
+    groups = Group.objects.using(db_alias)
+    for batch in batches(groups):
+        groups.filter(pk__in=batch).update(updated_at=now)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_search_translit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='updated_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='updated_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='commented_at',
+            field=models.DateTimeField(blank=True, help_text='Время последнего добавления или удаления комментария', null=True, verbose_name='Активность в комментариях'),
+        ),
+        migrations.RunPython(fill_timestamps, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='group',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, help_text='Время последнего сохранения группы', verbose_name='Дата изменения'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, help_text='Время последнего сохранения поста', verbose_name='Дата изменения'),
+        ),
+    ]
@@ -1,12 +1,21 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, router
 
-from core.debugging_tools import slugify
+from .slugs import allocate_slugs
 
 User = get_user_model()
 
 
+class GroupQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        """bulk_create не вызывает save: slug заполняются здесь,
+        одним запросом занятых slug на пачку"""
+        objs = list(objs)
+        allocate_slugs(objs, self.db)
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 class Group(models.Model):
     title = models.CharField(
         max_length=200, verbose_name='Название',
@@ -17,13 +26,30 @@ class Group(models.Model):
         verbose_name='Описание',
         help_text='Информация о группе'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        verbose_name='Дата изменения',
+        help_text='Время последнего сохранения группы',
+    )
+
+    objects = GroupQuerySet.as_manager()
 
     def __str__(self):
         return f'{self.title}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Название на момент загрузки: индекс постов перестраивается,
+        # только если оно изменилось
+        instance._loaded_title = instance.__dict__.get('title')
+        return instance
+
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(self.title)[:100]
+            allocate_slugs([self], kwargs.get('using')
+                           or router.db_for_write(Group, instance=self))
         super().save(*args, **kwargs)
 
     class Meta:
@@ -38,6 +64,14 @@ class Post(models.Model):
         verbose_name='Дата публикации',
         help_text='Дата публикации поста',
     )
+    # Версия поста для ключей кеша и ETag: save() и bulk_create
+    # обновляют её сами, queryset.update() - нет
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        verbose_name='Дата изменения',
+        help_text='Время последнего сохранения поста',
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -60,14 +94,55 @@ class Post(models.Model):
         blank=True,
         help_text='Картинка на странице поста',
     )
+    fanned_out = models.BooleanField(
+        default=True,
+        verbose_name='Разослан в ленты',
+        help_text='Пост записан в ленты подписчиков при публикации',
+    )
+    comments_count = models.IntegerField(
+        default=0,
+        verbose_name='Комментариев',
+        help_text='Число комментариев к посту',
+    )
+    commented_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name='Активность в комментариях',
+        help_text='Время последнего добавления или удаления комментария',
+    )
 
     def __str__(self):
         return self.text[:settings.POST_TEXT_LENGTH]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Группа на момент загрузки: при смене группы сбрасывается кеш обеих
+        instance._loaded_group_id = instance.__dict__.get('group_id')
+        return instance
+
     class Meta:
         verbose_name_plural = "Посты"
         verbose_name = "Пост"
         ordering = ['-pub_date']
+        indexes = [
+            # Индексы повторяют порядок (pub_date, id) постраничных выборок
+            models.Index(fields=['-pub_date', '-id'], name='post_date_idx'),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_date_idx',
+            ),
+            # Посты популярных авторов читаются в ленту при запросе
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='post_not_fanned_out_idx',
+                condition=models.Q(fanned_out=False),
+            ),
+        ]
 
 
 class Comment(models.Model):
@@ -104,6 +179,12 @@ class Comment(models.Model):
         verbose_name_plural = "Комментарии"
         verbose_name = "Комментарий"
         ordering = ['-created']
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created_idx',
+            ),
+        ]
 
 
 class Follow(models.Model):
@@ -126,3 +207,62 @@ class Follow(models.Model):
                 fields=['user', 'author'], name='unique_author_user_following'
             )
         ]
+        indexes = [
+            # Подписчики автора: рассылка постов и подсчёт подписчиков
+            models.Index(
+                fields=['author', 'user'], name='follow_author_user_idx'
+            ),
+        ]
+
+
+class FeedItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        related_name='feed',
+        on_delete=models.CASCADE,
+        verbose_name='Подписчик',
+    )
+    post = models.ForeignKey(
+        Post,
+        related_name='feed_items',
+        on_delete=models.CASCADE,
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации',
+        help_text='Копия даты публикации поста для сортировки ленты',
+    )
+
+    class Meta:
+        verbose_name_plural = "Записи лент"
+        verbose_name = "Запись ленты"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_feed_user_post'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feed_user_date_idx',
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        primary_key=True,
+        related_name='stats',
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+    )
+    posts_count = models.IntegerField(default=0, verbose_name='Постов')
+    followers_count = models.IntegerField(
+        default=0, verbose_name='Подписчиков'
+    )
+    following_count = models.IntegerField(default=0, verbose_name='Подписок')
+
+    class Meta:
+        verbose_name_plural = "Счётчики пользователей"
+        verbose_name = "Счётчики пользователя"
@@ -0,0 +1,154 @@
+import datetime as dt
+
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.db.models import Q
+from django.http import Http404
+from django.utils import timezone
+
+EPOCH = dt.datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = dt.timedelta(microseconds=1)
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+def encode_cursor(date, pk):
+    """Кодирует позицию (дата, id) в строку для адреса страницы"""
+    return f'{(date - EPOCH) // MICROSECOND}_{pk}'
+
+
+def decode_cursor(cursor):
+    """Разбирает строку, полученную из encode_cursor"""
+    try:
+        micros, pk = cursor.split('_')
+        return EPOCH + int(micros) * MICROSECOND, int(pk)
+    except (AttributeError, ValueError, OverflowError):
+        raise InvalidCursor('Некорректный курсор страницы')
+
+
+def keyset_slice(queryset, position, newer, limit, date_field='pub_date',
+                 id_field='id'):
+    """Срез queryset по ключу (date_field, id_field) после позиции курсора"""
+    if position is not None:
+        date, pk = position
+        direction = 'gt' if newer else 'lt'
+        queryset = queryset.filter(
+            Q(**{f'{date_field}__{direction}': date})
+            | Q(**{date_field: date, f'{id_field}__{direction}': pk})
+        )
+    if newer:
+        ordering = (date_field, id_field)
+    else:
+        ordering = (f'-{date_field}', f'-{id_field}')
+    return queryset.order_by(*ordering)[:limit]
+
+
+class CursorPaginator(Paginator):
+    """Пагинатор по ключу (дата, id) вместо LIMIT/OFFSET.
+
+    Страница выбирается условием «старше/новее курсора» по индексу,
+    поэтому глубокие страницы стоят столько же, сколько первая,
+    а COUNT(*) не выполняется. Нумерованные страницы (page) оставлены
+    для совместимости со старыми ссылками."""
+
+    date_field = 'pub_date'
+    id_field = 'id'
+
+    def __init__(self, object_list, per_page, date_field=None, id_field=None,
+                 **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.date_field = date_field or self.date_field
+        self.id_field = id_field or self.id_field
+
+    def get_cursor(self, obj):
+        return encode_cursor(
+            getattr(obj, self.date_field), getattr(obj, self.id_field)
+        )
+
+    def page(self, number):
+        page = super().page(number)
+        # Срез QuerySet не поддерживает отрицательные индексы
+        page.object_list = list(page.object_list)
+        page.next_cursor = page.previous_cursor = None
+        if page.object_list:
+            if page.has_next():
+                page.next_cursor = self.get_cursor(page.object_list[-1])
+            if page.has_previous():
+                page.previous_cursor = self.get_cursor(page.object_list[0])
+        return page
+
+    def _fetch(self, position, newer):
+        """Возвращает не более per_page + 1 объектов после позиции курсора
+        в порядке от новых к старым (для newer — от старых к новым)"""
+        return list(keyset_slice(
+            self.object_list, position, newer, self.per_page + 1,
+            self.date_field, self.id_field,
+        ))
+
+    def cursor_page(self, cursor=None, newer=False):
+        """Страница старше курсора (или новее при newer=True).
+
+        Без курсора возвращает первую страницу. У страницы есть атрибуты
+        next_cursor (более старые записи) и previous_cursor (более новые);
+        None означает, что в эту сторону записей нет."""
+        position = decode_cursor(cursor) if cursor is not None else None
+        if newer and position is None:
+            raise InvalidCursor('Для перехода назад нужен курсор')
+
+        rows = self._fetch(position, newer)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if newer:
+            if not has_more:
+                # Дошли до начала ленты: отдаём полную первую страницу,
+                # чтобы ссылки «назад» не давали обрезанных страниц.
+                return self.cursor_page()
+            rows.reverse()
+            page = Page(rows, None, self)
+            page.previous_cursor = self.get_cursor(rows[0])
+            page.next_cursor = self.get_cursor(rows[-1])
+            return page
+
+        page = Page(rows, 1 if position is None else None, self)
+        page.next_cursor = (
+            self.get_cursor(rows[-1]) if has_more else None
+        )
+        if position is None:
+            page.previous_cursor = None
+        elif rows:
+            page.previous_cursor = self.get_cursor(rows[0])
+        else:
+            # Записи за курсором закончились: назад ведёт сам курсор.
+            page.previous_cursor = cursor
+        return page
+
+
+class CursorPaginationMixin:
+    """Подключает CursorPaginator к ListView.
+
+    Параметры запроса: older=<курсор>, newer=<курсор>; старый page=<N>
+    обрабатывается как раньше."""
+
+    paginator_class = CursorPaginator
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = self.get_paginator(
+            queryset, page_size, orphans=self.get_paginate_orphans(),
+            allow_empty_first_page=self.get_allow_empty(),
+        )
+        params = self.request.GET
+        try:
+            if 'newer' in params:
+                page = paginator.cursor_page(params['newer'], newer=True)
+            elif 'older' in params:
+                page = paginator.cursor_page(params['older'])
+            elif 'page' in params:
+                page = paginator.page(params['page'])
+            else:
+                page = paginator.cursor_page()
+        except InvalidPage as e:
+            raise Http404(f'Неверная страница: {e}')
+        is_paginated = bool(page.next_cursor or page.previous_cursor)
+        return paginator, page, page.object_list, is_paginated
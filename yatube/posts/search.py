@@ -0,0 +1,242 @@
+import re
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models.expressions import RawSQL
+
+from core.debugging_tools import TRANSTABLE, translify
+
+from .models import Group, Post
+
+# Виртуальная таблица FTS5 (миграции 0015, 0016); rowid совпадает с id
+# поста, shadow - слова текста и названия группы в другой раскладке
+SEARCH_TABLE = 'posts_search'
+COLUMNS = ('text', 'group_title', 'shadow')
+BATCH_SIZE = 1000
+
+TOKEN_RE = re.compile(r'\w+')
+CYRILLIC_RE = re.compile('[а-яё]', re.IGNORECASE)
+LATIN_RE = re.compile('[a-z]', re.IGNORECASE)
+
+# Обратный транслит по TRANSTABLE: при совпадениях ('e' из 'е' и 'э')
+# берётся первая буква таблицы, длинные сочетания заменяются первыми
+FROM_LATIN = {}
+for _cyrillic, _latin in TRANSTABLE:
+    if CYRILLIC_RE.fullmatch(_cyrillic) and _cyrillic.islower():
+        FROM_LATIN.setdefault(_latin, _cyrillic)
+FROM_LATIN_RE = re.compile('|'.join(
+    re.escape(latin) for latin in sorted(FROM_LATIN, key=len, reverse=True)
+))
+
+
+def is_supported(using='default'):
+    return connections[using].vendor == 'sqlite'
+
+
+def from_latin(text):
+    return FROM_LATIN_RE.sub(
+        lambda match: FROM_LATIN[match.group()], text.lower()
+    )
+
+
+def shadow(text):
+    """Слова text в другой раскладке для поиска на любой из них:
+    кириллица - транслитом, латиница - обратным транслитом.
+
+    Считается один раз при записи в индекс, поэтому при поиске
+    транслитерировать ничего не нужно."""
+    cyrillic, latin = [], []
+    for word in TOKEN_RE.findall(text):
+        if CYRILLIC_RE.search(word):
+            cyrillic.append(word)
+        elif LATIN_RE.search(word):
+            latin.append(word)
+    return ' '.join(filter(None, (
+        translify(' '.join(cyrillic), strict=False),
+        from_latin(' '.join(latin)),
+    )))
+
+
+def build_match(query):
+    """Выражение MATCH из строки поиска: каждое слово ищется как префикс,
+    синтаксис FTS5 из ввода пользователя не интерпретируется"""
+    return ' '.join(f'"{token}"*' for token in TOKEN_RE.findall(query))
+
+
+class MatchingIds(RawSQL):
+    """Подзапрос id для pk__in. RawSQL оборачивается в скобки, и IN
+    ((SELECT ...)) в SQLite - скалярный подзапрос: он отдаёт только
+    первую строку"""
+
+    def as_sql(self, compiler, connection):
+        return self.sql, self.params
+
+
+def filter_matching(queryset, query):
+    """Посты queryset, подходящие под строку поиска"""
+    match = build_match(query)
+    if not match:
+        return queryset.none()
+    if not is_supported(queryset.db):
+        return queryset.filter(text__icontains=query)
+    return queryset.filter(pk__in=MatchingIds(
+        f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s',
+        [match],
+    ))
+
+
+def index_posts(posts, using='default', replace=True):
+    """Записывает посты в поисковый индекс; с replace прежние записи
+    этих постов удаляются. Транслит считается здесь, один раз на запись"""
+    posts = list(posts)
+    if not posts or not is_supported(using):
+        return
+    titles = dict(
+        Group.objects.using(using)
+        .filter(pk__in={post.group_id for post in posts})
+        .values_list('pk', 'title')
+    )
+    rows = []
+    for post in posts:
+        title = titles.get(post.group_id, '')
+        rows.append((
+            post.pk, post.text, title, shadow(f'{post.text} {title}')
+        ))
+    # Одна транзакция на пачку: в автокоммите FTS5 пишет сегмент индекса
+    # на каждую строку, это в десятки раз медленнее
+    with transaction.atomic(using), connections[using].cursor() as cursor:
+        if replace:
+            remove_posts([post.pk for post in posts], using)
+        cursor.executemany(
+            f'INSERT INTO {SEARCH_TABLE}(rowid, {", ".join(COLUMNS)}) '
+            f'VALUES (%s, %s, %s, %s)',
+            rows,
+        )
+
+
+def reindex_posts(ids, using='default', batch_size=BATCH_SIZE):
+    """Перестраивает записи индекса для постов ids, например после
+    переименования или удаления группы"""
+    ids = list(ids)
+    posts = Post.objects.using(using).only('text', 'group')
+    for start in range(0, len(ids), batch_size):
+        index_posts(posts.filter(pk__in=ids[start:start + batch_size]), using)
+
+
+def remove_posts(ids, using='default'):
+    if not is_supported(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s',
+            [(pk,) for pk in ids],
+        )
+
+
+def index_new_posts(after_pk=0, using='default', batch_size=BATCH_SIZE):
+    """Добавляет в индекс посты с id больше after_pk, которых в нём ещё
+    нет (например, загруженные через bulk_create), пачками по ключу.
+    Возвращает число добавленных постов"""
+    if not is_supported(using):
+        return 0
+    indexed, last_pk = 0, after_pk
+    posts = Post.objects.using(using).only('text', 'group').order_by('pk')
+    while True:
+        batch = list(posts.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return indexed
+        last_pk = batch[-1].pk
+        # Посты, опубликованные обычным путём, индексирует сигнал
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {SEARCH_TABLE} '
+                f'WHERE rowid BETWEEN %s AND %s',
+                [batch[0].pk, last_pk],
+            )
+            present = {rowid for rowid, in cursor.fetchall()}
+        batch = [post for post in batch if post.pk not in present]
+        index_posts(batch, using, replace=False)
+        indexed += len(batch)
+
+
+def rebuild_index(using='default', batch_size=BATCH_SIZE):
+    """Заново строит индекс по всем постам, пачками по первичному ключу"""
+    if not is_supported(using):
+        return 0
+    with transaction.atomic(using), connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        indexed = index_new_posts(using=using, batch_size=batch_size)
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')"
+        )
+    return indexed
+
+
+class SearchResults:
+    """Найденные посты: не больше SEARCH_CANDIDATES самых новых
+    совпадений, которые FTS5 выбирает по rowid.
+
+    Если совпадений меньше лимита, кандидаты ранжируются по rank (bm25),
+    при равенстве выше более новый пост. Для частых слов bm25 не
+    считается вовсе: статистика слова читается по всем его совпадениям
+    и стоит десятки миллисекунд, поэтому они выдаются от новых к старым.
+
+    Ведёт себя как список для Paginator: id кандидатов в порядке выдачи
+    выбираются одним запросом при подсчёте, страница с постами -
+    вторым, по id."""
+
+    def __init__(self, query, using='default'):
+        self.query = query
+        self.match = build_match(query)
+        self.using = using
+        self.posts = Post.objects.using(using).select_related(
+            'author', 'group'
+        )
+        self._ids = None
+
+    def _candidates(self):
+        limit = settings.SEARCH_CANDIDATES
+        if not is_supported(self.using):
+            # Без FTS5 - подстрока текста, новые выше
+            return list(filter_matching(self.posts, self.query).order_by(
+                '-pub_date', '-id'
+            ).values_list('pk', flat=True)[:limit])
+        matching = f'{SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s'
+        # CASE не читает rank, если совпадений не меньше лимита
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM ('
+                f'SELECT rowid, CASE WHEN (SELECT count(*) FROM ('
+                f'SELECT rowid FROM {matching} LIMIT %s)) < %s '
+                f'THEN rank END AS search_rank '
+                f'FROM {matching} ORDER BY rowid DESC LIMIT %s'
+                f') ORDER BY search_rank, rowid DESC',
+                [self.match, limit, limit, self.match, limit],
+            )
+            return [rowid for rowid, in cursor.fetchall()]
+
+    def ranked_ids(self, offset=0, limit=None):
+        """Id найденных постов по убыванию релевантности"""
+        if self._ids is None:
+            self._ids = self._candidates() if self.match else []
+        return self._ids[offset:None if limit is None else offset + limit]
+
+    def page(self, offset, limit):
+        """Посты страницы одним запросом по id, в порядке ранжирования"""
+        ids = self.ranked_ids(offset, limit)
+        posts = self.posts.in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+    def count(self):
+        return len(self.ranked_ids())
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop, step = index.indices(self.count())
+        if step != 1:
+            raise ValueError('Шаг среза не поддерживается')
+        return self.page(start, max(stop - start, 0))
@@ -0,0 +1,425 @@
+import bisect
+import collections
+import contextlib
+import datetime as dt
+import itertools
+import math
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.utils import timezone
+
+from core.page_cache import invalidate_pages
+
+from .counters import recount_all
+from .feeds import rebuild_feeds
+from .models import Comment, Follow, Group, Post, User
+from .search import rebuild_index
+
+BATCH_SIZE = 5000
+
+CONSONANTS = 'бвгджзклмнпрстфхцчшщ'
+VOWELS = 'аеиоуыэюяё'
+
+
+@contextlib.contextmanager
+def explicit_dates(*fields):
+    """Временно отключает auto_now_add, чтобы bulk_create сохранил
+    сгенерированные даты"""
+    saved = [(field, field.auto_now_add) for field in fields]
+    for field, _ in saved:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in saved:
+            field.auto_now_add = value
+
+
+def _insert(model, objs, using, **kwargs):
+    # batch_size не задаётся: бэкенд сам ограничит размер одного INSERT
+    model.objects.using(using).bulk_create(list(objs), **kwargs)
+
+
+def numbered_text(rng, number):
+    return f'Пост {number}'
+
+
+def zipf_weights(count, exponent):
+    """Накопленные веса рангов 1..count по закону Ципфа, для
+    random.choices(cum_weights=...) и bisect"""
+    return list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)
+    ))
+
+
+class ZipfText:
+    """Тексты из слов искусственного словаря с частотами по закону Ципфа:
+    в выборке есть и очень частые, и редкие слова. Слова - случайные
+    слоги, частота слова не связана с его написанием"""
+
+    def __init__(self, vocabulary, min_words=8, max_words=40, seed=0):
+        rng = random.Random(seed)
+        words = set()
+        while len(words) < vocabulary:
+            words.add(''.join(
+                rng.choice(CONSONANTS) + rng.choice(VOWELS)
+                for _ in range(rng.randint(1, 4))
+            ))
+        self.words = sorted(words)
+        rng.shuffle(self.words)
+        self.weights = zipf_weights(vocabulary, 1)
+        self.min_words = min_words
+        self.max_words = max_words
+
+    def __call__(self, rng, number):
+        count = rng.randint(self.min_words, self.max_words)
+        return ' '.join(
+            rng.choices(self.words, cum_weights=self.weights, k=count)
+        )
+
+
+def seed_uniform(using, users, groups, posts, comments, follows, seed=0,
+                 days=365, text=numbered_text):
+    """Наполняет базу using равномерно распределёнными данными.
+
+    Быстрый вариант для бенчмарков: строки пишутся через bulk_create
+    без сигналов, поэтому ленты, счётчики и поисковый индекс
+    не заполняются. text(rng, number) даёт текст поста."""
+    rng = random.Random(seed)
+    now = timezone.now()
+    span = days * 24 * 3600
+
+    def random_date():
+        return now - dt.timedelta(seconds=rng.randrange(span))
+
+    first_user = User.objects.using(using).count() + 1
+    _insert(User, (
+        User(username=f'user{first_user + i}', password='!')
+        for i in range(users)
+    ), using)
+    user_ids = list(User.objects.using(using).values_list('pk', flat=True))
+    _insert(Group, (
+        Group(title=f'Группа {i}', slug=f'group-{seed}-{i}', description='')
+        for i in range(groups)
+    ), using)
+    group_ids = list(
+        Group.objects.using(using).values_list('pk', flat=True)
+    ) or [None]
+
+    with explicit_dates(Post._meta.get_field('pub_date'),
+                        Comment._meta.get_field('created')):
+        for start in range(0, posts, BATCH_SIZE):
+            _insert(Post, [
+                Post(
+                    text=text(rng, start + i),
+                    author_id=rng.choice(user_ids),
+                    group_id=rng.choice(group_ids),
+                    pub_date=random_date(),
+                )
+                for i in range(min(BATCH_SIZE, posts - start))
+            ], using)
+        max_post = Post.objects.using(using).order_by('-pk').values_list(
+            'pk', flat=True
+        ).first()
+        # Без постов комментировать нечего
+        for start in range(0, comments if max_post else 0, BATCH_SIZE):
+            _insert(Comment, [
+                Comment(
+                    text=f'Комментарий {start + i}',
+                    post_id=rng.randint(1, max_post),
+                    author_id=rng.choice(user_ids),
+                    created=random_date(),
+                )
+                for i in range(min(BATCH_SIZE, comments - start))
+            ], using)
+
+    pairs = set()
+    while len(pairs) < min(follows, len(user_ids) * (len(user_ids) - 1)):
+        user_id, author_id = rng.sample(user_ids, 2)
+        pairs.add((user_id, author_id))
+    _insert(Follow, (
+        Follow(user_id=user, author_id=author) for user, author in pairs
+    ), using, ignore_conflicts=True)
+
+
+class SeedPlan:
+    """Параметры и распределения для seed_realistic.
+
+    Передаётся процессам-генераторам один раз при запуске пула;
+    все случайные величины выводятся из seed, номера пачки и
+    номера строки, поэтому результат не зависит от числа процессов."""
+
+    def __init__(self, seed=0, days=365, until=None, vocabulary=50_000,
+                 follower_exponent=1.0, thread_exponent=1.0,
+                 hot_groups=0.05, hot_share=0.6, ungrouped=0.3):
+        self.seed = seed
+        self.until = until or timezone.now().replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        self.span = dt.timedelta(days=days)
+        self.follower_exponent = follower_exponent
+        self.thread_exponent = thread_exponent
+        self.hot_groups = hot_groups
+        self.hot_share = hot_share
+        self.ungrouped = ungrouped
+        self.post_text = ZipfText(vocabulary, seed=seed)
+        self.comment_text = ZipfText(vocabulary, 3, 20, seed=seed)
+        self.user_ids = []
+        self.hot_group_ids = []
+        self.group_ids = []
+        self.post_ids = []
+        self.author_weights = []
+        self.thread_weights = []
+
+    def set_users(self, user_ids):
+        self.user_ids = user_ids
+        self.author_weights = zipf_weights(
+            len(user_ids), self.follower_exponent
+        )
+
+    def set_groups(self, group_ids):
+        hot = max(1, round(len(group_ids) * self.hot_groups))
+        self.hot_group_ids = group_ids[:hot]
+        self.group_ids = group_ids[hot:] or self.hot_group_ids
+
+    def set_posts(self, post_ids):
+        self.post_ids = post_ids
+        self.thread_weights = zipf_weights(
+            len(post_ids), self.thread_exponent
+        )
+
+    def rng(self, kind, chunk):
+        return random.Random(f'{self.seed}:{kind}:{chunk}')
+
+    def post_date(self, index, count):
+        """Дата поста растёт с номером: как в живой базе, новые посты
+        получают большие id"""
+        return self.until - self.span * (1 - (index + 0.5) / count)
+
+    @staticmethod
+    def scatter(rank, count):
+        """Номер строки для ранга популярности: популярные пользователи
+        и посты разбросаны по таблице, а не собраны в её начале"""
+        stride = 7919
+        while math.gcd(stride, count) != 1:
+            stride += 2
+        return rank * stride % count
+
+    def pick(self, rng, weights, ids):
+        rank = bisect.bisect(weights, rng.random() * weights[-1])
+        return ids[self.scatter(min(rank, len(ids) - 1), len(ids))]
+
+
+_plan = None
+
+
+def _use_plan(plan):
+    global _plan
+    _plan = plan
+
+
+def _init_worker(plan):
+    django.setup()
+    _use_plan(plan)
+
+
+def _post_rows(chunk):
+    """Строки постов пачки: (текст, автор, группа, дата)"""
+    number, start, stop, total = chunk
+    plan, rng = _plan, _plan.rng('posts', number)
+    rows = []
+    for index in range(start, stop):
+        roll = rng.random()
+        if roll < plan.ungrouped:
+            group_id = None
+        elif roll < plan.ungrouped + (1 - plan.ungrouped) * plan.hot_share:
+            group_id = rng.choice(plan.hot_group_ids)
+        else:
+            group_id = rng.choice(plan.group_ids)
+        rows.append((
+            plan.post_text(rng, index), rng.choice(plan.user_ids),
+            group_id, plan.post_date(index, total),
+        ))
+    return rows
+
+
+def _comment_rows(chunk):
+    """Строки комментариев пачки: (пост, автор, текст, дата). Число
+    комментариев у постов распределено по Ципфу - есть длинные ветки"""
+    number, start, stop, _ = chunk
+    plan, rng = _plan, _plan.rng('comments', number)
+    posts = len(plan.post_ids)
+    rows = []
+    for index in range(start, stop):
+        rank = bisect.bisect(
+            plan.thread_weights, rng.random() * plan.thread_weights[-1]
+        )
+        post = plan.scatter(min(rank, posts - 1), posts)
+        created = min(
+            plan.until,
+            plan.post_date(post, posts)
+            + dt.timedelta(hours=rng.expovariate(1 / 12)),
+        )
+        rows.append((
+            plan.post_ids[post], rng.choice(plan.user_ids),
+            plan.comment_text(rng, index), created,
+        ))
+    return rows
+
+
+def _follow_rows(chunk):
+    """Пары (подписчик, автор): подписчики авторов распределены по
+    степенному закону, немногие авторы собирают большую часть подписок"""
+    number, start, stop, _ = chunk
+    plan, rng = _plan, _plan.rng('follows', number)
+    pairs = set()
+    for _ in range(start, stop):
+        user_id = rng.choice(plan.user_ids)
+        author_id = plan.pick(rng, plan.author_weights, plan.user_ids)
+        if user_id != author_id:
+            pairs.add((user_id, author_id))
+    return sorted(pairs)
+
+
+def _chunks(count, chunk_size):
+    return [
+        (number, start, min(start + chunk_size, count), count)
+        for number, start in enumerate(range(0, count, chunk_size))
+    ]
+
+
+def _generate(plan, func, count, chunk_size, workers):
+    """Пачки строк func по порядку номеров. Их генерируют workers
+    процессов, пока текущий процесс пишет предыдущие пачки в базу;
+    вперёд готовится не больше двух пачек на процесс"""
+    chunks = _chunks(count, chunk_size)
+    if not workers:
+        _use_plan(plan)
+        yield from map(func, chunks)
+        return
+    with ProcessPoolExecutor(
+        workers, initializer=_init_worker, initargs=(plan,)
+    ) as pool:
+        pending = collections.deque()
+        for chunk in chunks:
+            pending.append(pool.submit(func, chunk))
+            if len(pending) > 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _new_ids(model, using, last_pk):
+    return list(
+        model.objects.using(using).filter(pk__gt=last_pk)
+        .order_by('pk').values_list('pk', flat=True)
+    )
+
+
+def _last_pk(model, using):
+    last = model.objects.using(using).order_by('-pk').first()
+    return last.pk if last else 0
+
+
+def seed_realistic(using, users, groups, posts, comments, follows,
+                   plan=None, workers=0, chunk_size=20_000, progress=None):
+    """Наполняет базу using данными с реалистичными распределениями:
+    подписчики по степенному закону, горячие группы, длинные ветки
+    комментариев.
+
+    Строки генерируют workers процессов (0 - текущий процесс), в базу
+    они пишутся пачками через bulk_create без сигналов: ленты, счётчики
+    и поисковый индекс заполняет потом fill_derived. progress(name,
+    count) вызывается в начале каждой таблицы и после каждой
+    записанной пачки."""
+    plan = plan or SeedPlan()
+    progress = progress or (lambda name, count: None)
+    rng = plan.rng('users', 0)
+
+    progress('users', 0)
+    last_user = _last_pk(User, using)
+    _insert(User, (
+        User(username=f'user{last_user + i + 1}', password='!')
+        for i in range(users)
+    ), using)
+    plan.set_users(
+        _new_ids(User, using, last_user)
+        or list(User.objects.using(using).values_list('pk', flat=True))
+    )
+    progress('users', users)
+
+    progress('groups', 0)
+    last_group = _last_pk(Group, using)
+    _insert(Group, (
+        Group(title=f'Группа {last_group + i + 1}', description='')
+        for i in range(groups)
+    ), using)
+    group_ids = _new_ids(Group, using, last_group) or list(
+        Group.objects.using(using).values_list('pk', flat=True)
+    )
+    rng.shuffle(group_ids)
+    plan.set_groups(group_ids or [None])
+    progress('groups', groups)
+
+    progress('posts', 0)
+    last_post = _last_pk(Post, using)
+    with explicit_dates(Post._meta.get_field('pub_date'),
+                        Comment._meta.get_field('created')):
+        for rows in _generate(plan, _post_rows, posts, chunk_size, workers):
+            _insert(Post, (
+                Post(text=text, author_id=author_id, group_id=group_id,
+                     pub_date=pub_date)
+                for text, author_id, group_id, pub_date in rows
+            ), using)
+            progress('posts', len(rows))
+        plan.set_posts(_new_ids(Post, using, last_post))
+
+        progress('comments', 0)
+        if plan.post_ids:
+            for rows in _generate(plan, _comment_rows, comments, chunk_size,
+                                  workers):
+                _insert(Comment, (
+                    Comment(post_id=post_id, author_id=author_id, text=text,
+                            created=created)
+                    for post_id, author_id, text, created in rows
+                ), using)
+                progress('comments', len(rows))
+
+    progress('follows', 0)
+    if len(plan.user_ids) > 1:
+        # Повторы пар из разных пачек и прежних запусков отбрасывает
+        # ignore_conflicts: в progress идёт число добавленных строк
+        existing = Follow.objects.using(using).count()
+        for rows in _generate(plan, _follow_rows, follows, chunk_size,
+                              workers):
+            _insert(Follow, (
+                Follow(user_id=user_id, author_id=author_id)
+                for user_id, author_id in rows
+            ), using, ignore_conflicts=True)
+            inserted = Follow.objects.using(using).count()
+            progress('follows', inserted - existing)
+            existing = inserted
+    return plan
+
+
+# Данные, которые в обычной работе ведут сигналы: после bulk_create
+# их нужно построить отдельно
+DERIVED_STEPS = (
+    ('counters', recount_all),
+    ('feeds', rebuild_feeds),
+    ('search', rebuild_index),
+)
+
+
+def fill_derived(using, progress=None):
+    """Счётчики, ленты подписок и поисковый индекс по данным базы.
+    progress(name, seconds) вызывается после каждого шага"""
+    for name, step in DERIVED_STEPS:
+        start = time.perf_counter()
+        step(using)
+        if progress:
+            progress(name, time.perf_counter() - start)
+    invalidate_pages()
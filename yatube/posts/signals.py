@@ -0,0 +1,132 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from core import generations
+
+from . import counters, feeds, search
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+def post_scopes(post):
+    """Области кеша, которые затрагивает изменение поста"""
+    scopes = {'posts', f'post:{post.pk}', f'author:{post.author_id}'}
+    for group_id in (post.group_id, getattr(post, '_loaded_group_id', None)):
+        if group_id:
+            scopes.add(f'group:{group_id}')
+    return scopes
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def handle_new_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_user_stats(instance.author_id, posts_count=1)
+        feeds.fan_out_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def handle_deleted_post(sender, instance, **kwargs):
+    counters.change_user_stats(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, update_fields=None, **kwargs):
+    indexed_fields = {'text', 'group', 'group_id'}
+    if update_fields and not indexed_fields & set(update_fields):
+        return
+    search.index_posts([instance])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.remove_posts([instance.pk])
+
+
+@receiver(post_save, sender=Group)
+def reindex_group_posts(sender, instance, created, update_fields=None,
+                        **kwargs):
+    # Название группы хранится в поисковом индексе вместе с постами
+    if created or (update_fields and 'title' not in update_fields):
+        return
+    loaded_title = getattr(instance, '_loaded_title', None)
+    if loaded_title == instance.title:
+        return
+    search.reindex_posts(instance.posts.values_list('pk', flat=True))
+    instance._loaded_title = instance.title
+
+
+@receiver(pre_delete, sender=Group)
+def remember_group_posts(sender, instance, **kwargs):
+    instance._post_ids = list(instance.posts.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Group)
+def reindex_ungrouped_posts(sender, instance, **kwargs):
+    search.reindex_posts(getattr(instance, '_post_ids', ()))
+
+
+@receiver(post_save, sender=Comment)
+def handle_new_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_comments_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def handle_deleted_comment(sender, instance, **kwargs):
+    counters.change_comments_count(instance.post_id, -1)
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def invalidate_comment_pages(sender, instance, **kwargs):
+    # comments - числа комментариев в списках постов API
+    generations.bump(f'post:{instance.post_id}', 'comments')
+
+
+@receiver(post_save, sender=Follow)
+def handle_new_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_user_stats(instance.author_id, followers_count=1)
+        counters.change_user_stats(instance.user_id, following_count=1)
+        feeds.backfill_feed(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def handle_deleted_follow(sender, instance, **kwargs):
+    counters.change_user_stats(instance.author_id, followers_count=-1)
+    counters.change_user_stats(instance.user_id, following_count=-1)
+    feeds.trim_feed(instance)
+
+
+@receiver([post_save, post_delete], sender=Post)
+def invalidate_post_fragments(sender, instance, **kwargs):
+    generations.bump(*post_scopes(instance))
+
+
+@receiver([post_save, post_delete], sender=Group)
+def invalidate_group_fragments(sender, instance, **kwargs):
+    generations.bump('posts', 'groups', f'group:{instance.pk}')
+
+
+@receiver([post_save, post_delete], sender=Follow)
+def invalidate_follow_pages(sender, instance, **kwargs):
+    # Число подписчиков на странице автора; following - лента подписчика
+    generations.bump(
+        f'follows:{instance.author_id}', f'following:{instance.user_id}'
+    )
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user_fragments(sender, instance, update_fields=None,
+                              **kwargs):
+    if kwargs.get('created'):
+        # Нового пользователя ещё нет ни на одной странице
+        return
+    if update_fields and set(update_fields) == {'last_login'}:
+        # Вход пользователя не меняет ничего из показанного на страницах
+        return
+    generations.bump('posts', 'users', f'author:{instance.pk}')
@@ -0,0 +1,67 @@
+import operator
+from functools import reduce
+
+from django.db.models import Q
+
+from core.debugging_tools import slugify_many
+
+# Запас длины под суффикс '-N': занятые slug выбираются по основе без
+# этого запаса, так что в выборку попадают и все варианты с суффиксом
+SUFFIX_RESERVE = 8
+# Основ в одном запросе: столько условий OR SQLite разбирает, не упираясь
+# в предел глубины выражения и числа параметров
+STEMS_PER_QUERY = 200
+# slug для названий, от которых после slugify ничего не осталось
+DEFAULT_SLUG = 'group'
+# Больше любого символа, допустимого в SlugField
+SLUG_UPPER_BOUND = '\x7f'
+
+
+def taken_slugs(queryset, stems):
+    """Занятые slug из queryset, начинающиеся с любой из stems.
+
+    Каждая основа - диапазон [stem, stem + SLUG_UPPER_BOUND) по
+    уникальному индексу slug, один запрос на STEMS_PER_QUERY основ."""
+    stems = sorted(set(stems))
+    taken = set()
+    for start in range(0, len(stems), STEMS_PER_QUERY):
+        condition = reduce(operator.or_, (
+            Q(slug__gte=stem, slug__lt=stem + SLUG_UPPER_BOUND)
+            for stem in stems[start:start + STEMS_PER_QUERY]
+        ))
+        taken.update(queryset.filter(condition).values_list('slug', flat=True))
+    return taken
+
+
+def allocate_slugs(groups, using='default'):
+    """Заполняет пустые slug групп по названиям, не повторяя ни занятые
+    slug, ни друг друга: при совпадении добавляется суффикс '-2', '-3'...
+
+    Занятые slug выбираются заранее одним запросом на пачку, подбор
+    суффикса идёт в памяти. От гонки двух одновременных сохранений
+    по-прежнему защищает уникальный индекс."""
+    groups = [group for group in groups if not group.slug]
+    if not groups:
+        return
+    model = type(groups[0])
+    max_length = model._meta.get_field('slug').max_length
+    bases = [
+        base[:max_length] or DEFAULT_SLUG
+        for base in slugify_many(group.title for group in groups)
+    ]
+    taken = taken_slugs(
+        model._default_manager.using(using),
+        (base[:max_length - SUFFIX_RESERVE] for base in bases),
+    )
+    # Последний выданный номер для основы: пачка одинаковых названий
+    # не перебирает заново уже выданные суффиксы
+    numbers = {}
+    for group, base in zip(groups, bases):
+        slug, number = base, numbers.get(base, 1)
+        while slug in taken:
+            number += 1
+            suffix = f'-{number}'
+            slug = base[:max_length - len(suffix)] + suffix
+        numbers[base] = number
+        taken.add(slug)
+        group.slug = slug
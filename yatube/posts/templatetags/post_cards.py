@@ -0,0 +1,54 @@
+import hashlib
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from core.generations import record_lookup
+
+register = template.Library()
+
+CARD_TEMPLATE = 'includes/single_post.html'
+CARD_KEY = 'post_card:{}:{}:{}'
+
+
+def card_key(post, group_page=False):
+    """Ключ карточки: id и версия поста (updated_at), отпечаток имени
+    автора и версии группы.
+
+    Сохранение поста или группы и смена имени автора дают новый ключ,
+    поэтому сбрасывать карточки не нужно: старые версии вытесняются
+    по TTL. На странице группы ссылка на группу не выводится и группа
+    не читается из БД, поэтому в отпечаток не входит."""
+    author = post.author
+    parts = [author.username, author.get_full_name(), group_page]
+    if not group_page and post.group_id:
+        parts.append(post.group.updated_at)
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return CARD_KEY.format(post.pk, post.updated_at.timestamp(), digest)
+
+
+@register.simple_tag
+def post_cards(posts, group_page=False):
+    """Отрисованные карточки постов списка, в порядке posts.
+
+    Готовые карточки читаются из кеша одним get_many, шаблон
+    single_post.html рендерится только для промахов: карточка поста
+    одинакова на главной, в профиле, в ленте подписок и в поиске."""
+    posts = list(posts)
+    keys = [card_key(post, group_page) for post in posts]
+    cards = cache.get_many(keys)
+    rendered = {}
+    for key, post in zip(keys, posts):
+        if key not in cards:
+            rendered[key] = render_to_string(CARD_TEMPLATE, {
+                'post': post, 'group_page': group_page,
+            })
+    if rendered:
+        cache.set_many(rendered, settings.POST_CARD_CACHE_TIMEOUT)
+        cards.update(rendered)
+    record_lookup('post_card', hit=True, count=len(posts) - len(rendered))
+    record_lookup('post_card', hit=False, count=len(rendered))
+    return [mark_safe(cards[key]) for key in keys]
@@ -0,0 +1,28 @@
+import logging
+
+from django import template
+from sorl.thumbnail import get_thumbnail
+
+from posts.thumbnails import THUMBNAIL_GEOMETRIES
+
+logger = logging.getLogger(__name__)
+
+register = template.Library()
+
+
+@register.simple_tag
+def image_srcset(image):
+    """Значение srcset из вариантов превью картинки поста.
+
+    Превью создаются заранее (posts.thumbnails), поэтому здесь
+    обычно только чтение из хранилища ключей sorl."""
+    sources = []
+    for geometry, options in THUMBNAIL_GEOMETRIES:
+        try:
+            thumbnail = get_thumbnail(image, geometry, **options)
+        except Exception:
+            # Как и тег thumbnail, не роняем страницу из-за картинки
+            logger.exception('Не удалось получить превью %s', geometry)
+            continue
+        sources.append(f'{thumbnail.url} {thumbnail.width}w')
+    return ', '.join(sources)
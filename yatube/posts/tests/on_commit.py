@@ -0,0 +1,25 @@
+import contextlib
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+@contextlib.contextmanager
+def capture_on_commit_callbacks(using=DEFAULT_DB_ALIAS, execute=False):
+    """Функции transaction.on_commit, отложенные внутри блока.
+
+    TestCase не фиксирует транзакцию, и on_commit в нём не срабатывает;
+    с execute=True функции выполняются при выходе из блока, как после
+    фиксации (аналог captureOnCommitCallbacks из Django 3.2)."""
+    callbacks = []
+    connection = connections[using]
+    start = len(connection.run_on_commit)
+    try:
+        yield callbacks
+    finally:
+        callbacks.extend(
+            func for _, func in connection.run_on_commit[start:]
+        )
+        del connection.run_on_commit[start:]
+        if execute:
+            for callback in callbacks:
+                callback()
@@ -0,0 +1,47 @@
+from core.debugging_tools import QueryBudget
+
+# Наибольшее число запросов к БД для страницы из posts.urls при холодном
+# кеше: для анонима, а у страниц, требующих входа, - для вошедшего
+# пользователя. Число не должно зависеть от числа постов и комментариев
+# на странице: рост бюджета - повод искать N+1, а не поднимать его
+QUERY_BUDGETS = {
+    # Один из запросов - последний пост для ETag (core.conditional)
+    'posts:index': 2,
+    'posts:group_list': 2,
+    'posts:profile': 2,
+    'posts:post_detail': 2,
+    'posts:comments': 2,
+    'posts:search': 2,
+    'posts:post_create': 3,
+    'posts:post_edit': 4,
+    'posts:follow_index': 5,
+    'posts:add_comment': 5,
+    'posts:profile_follow': 10,
+    'posts:profile_unfollow': 8,
+    'posts:api_index': 1,
+    'posts:api_group': 2,
+    'posts:api_profile': 2,
+    'posts:api_follow': 5,
+    'posts:api_post': 2,
+    'posts:api_comments': 1,
+}
+# Сессия и пользователь: добавляются к бюджету открытой страницы,
+# если её запрашивает вошедший пользователь
+SESSION_QUERIES = 2
+# Хранилище превью sorl: записи кешируются навсегда и на тёплом кеше
+# запросов не дают
+EXCLUDED_TABLES = ('thumbnail_kvstore',)
+LOGIN_REQUIRED = {
+    'posts:post_create', 'posts:post_edit', 'posts:follow_index',
+    'posts:add_comment', 'posts:profile_follow', 'posts:profile_unfollow',
+    'posts:api_follow',
+}
+
+
+def query_budget(view_name, authenticated=False):
+    """Бюджет запросов страницы view_name: with query_budget(...)
+    или декоратор теста"""
+    budget = QUERY_BUDGETS[view_name]
+    if authenticated and view_name not in LOGIN_REQUIRED:
+        budget += SESSION_QUERIES
+    return QueryBudget(budget, view_name, exclude=EXCLUDED_TABLES)
@@ -1,13 +1,24 @@
+import io
+import os
 import shutil
 import tempfile
+from unittest import mock, skipUnless
 
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
 
+from posts.forms import PostForm
 from posts.models import Comment, Group, Post, User
+from posts.thumbnails import generate_thumbnails
+
+from .on_commit import capture_on_commit_callbacks
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -35,6 +46,22 @@ def get_small_gif(filename: str = 'filename') -> SimpleUploadedFile:
     return uploaded
 
 
+def get_photo(filename: str = 'photo', size=(400, 200),
+              mode: str = 'RGB') -> SimpleUploadedFile:
+    """Снимок как с телефона: PNG или JPEG с EXIF-поворотом"""
+    image = Image.new(mode, size, 'red')
+    buffer = io.BytesIO()
+    if mode == 'RGBA':
+        image.save(buffer, 'PNG')
+        return SimpleUploadedFile(f'{filename}.png', buffer.getvalue(),
+                                  content_type='image/png')
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: повернуть на 90°
+    image.save(buffer, 'JPEG', exif=exif.tobytes())
+    return SimpleUploadedFile(f'{filename}.jpeg', buffer.getvalue(),
+                              content_type='image/jpeg')
+
+
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostFormTests(TestCase):
     @classmethod
@@ -129,6 +156,129 @@ class PostFormTests(TestCase):
         print(Post.objects.filter(
             image='posts/edit_post_image.gif').first().image)
 
+    def test_thumbnails_queued_after_commit(self):
+        """Создание и правка поста с картинкой ставят превью в очередь
+        только после фиксации транзакции."""
+        with mock.patch('posts.thumbnails.generate_thumbnails') as generate:
+            with capture_on_commit_callbacks(execute=True):
+                self.authorized_client.post(
+                    get_url('posts:post_create'),
+                    {'text': 'Пост с картинкой',
+                     'image': get_small_gif('queued_image')},
+                )
+                generate.assert_not_called()
+        generate.assert_called_once_with('posts/queued_image.gif')
+
+        post = Post.objects.get(text='Пост с картинкой')
+        with override_settings(THUMBNAIL_WORKERS=2), \
+                mock.patch('posts.thumbnails.get_executor') as get_executor:
+            with capture_on_commit_callbacks(execute=True):
+                self.authorized_client.post(
+                    get_url('posts:post_edit', post_id=post.pk),
+                    {'text': 'Новая картинка',
+                     'image': get_small_gif('edited_image')},
+                )
+                get_executor.assert_not_called()
+        get_executor.return_value.submit.assert_called_once_with(
+            generate_thumbnails, 'posts/edited_image.gif'
+        )
+
+        with mock.patch('posts.thumbnails.generate_thumbnails') as generate:
+            with capture_on_commit_callbacks(execute=True):
+                self.authorized_client.post(
+                    get_url('posts:post_edit', post_id=post.pk),
+                    {'text': 'Картинка прежняя'},
+                )
+        generate.assert_not_called()
+
+    @skipUnless(hasattr(Image, 'ANTIALIAS'),
+                'sorl-thumbnail 12.7 работает с Pillow из requirements.txt')
+    def test_warm_thumbnails_creates_known_geometries(self):
+        """Команда warm_thumbnails заранее создаёт превью картинок."""
+        post = Post.objects.create(
+            text='Пост с картинкой',
+            author=PostFormTests.user,
+            image=get_small_gif('warm_image'),
+        )
+        image = ImageFile(post.image)
+        self.assertIsNone(default.kvstore.get(image))
+
+        with open(os.devnull, 'w') as devnull:
+            call_command('warm_thumbnails', workers=0, stdout=devnull)
+
+        self.assertIsNotNone(default.kvstore.get(image))
+
+    def test_warm_thumbnails_continues_after_broken_image(self):
+        """Битая картинка не прерывает warm_thumbnails: остальные
+        обрабатываются, число ошибок выводится в конце."""
+        names = ['posts/broken.gif', 'posts/good.gif']
+        for name in names:
+            Post.objects.create(
+                text=name, author=PostFormTests.user, image=name
+            )
+
+        def generate(image_name):
+            if image_name == names[0]:
+                raise OSError('cannot identify image file')
+            return image_name
+
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with mock.patch('posts.thumbnails.generate_thumbnails',
+                        side_effect=generate) as generate_thumbnails, \
+                self.assertLogs('posts', 'ERROR') as logs:
+            call_command('warm_thumbnails', workers=0,
+                         stdout=stdout, stderr=stderr)
+
+        called = {args[0] for args, _ in generate_thumbnails.call_args_list}
+        self.assertLessEqual(set(names), called)
+        self.assertIn('Не удалось создать превью: 1', stderr.getvalue())
+        self.assertIn(names[0], logs.output[0])
+
+
+@override_settings(POST_IMAGE_MAX_SIDE=100)
+class PostImageIngestionTests(TestCase):
+    def get_image(self, upload):
+        form = PostForm(data={'text': 'Пост'}, files={'image': upload})
+        self.assertTrue(form.is_valid(), form.errors)
+        return form.cleaned_data['image']
+
+    def test_photo_reencoded_without_exif(self):
+        """Фото поворачивается по EXIF, уменьшается и сохраняется
+        прогрессивным JPEG без метаданных."""
+        stored = self.get_image(get_photo('phone'))
+
+        self.assertEqual(stored.name, 'phone.jpg')
+        with Image.open(stored) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (50, 100))
+            self.assertTrue(image.info.get('progressive'))
+            self.assertNotIn('exif', image.info)
+
+    def test_transparent_image_saved_as_webp(self):
+        """Картинка с прозрачностью сохраняется в WebP."""
+        stored = self.get_image(get_photo('logo', mode='RGBA'))
+
+        self.assertEqual(stored.name, 'logo.webp')
+        with Image.open(stored) as image:
+            self.assertEqual(image.format, 'WEBP')
+
+    def test_gif_kept_as_is(self):
+        """GIF сохраняется без пережатия."""
+        stored = self.get_image(get_small_gif('animation'))
+
+        self.assertEqual(stored.name, 'animation.gif')
+
+    def test_limits_reject_upload(self):
+        """Слишком тяжёлый файл или слишком большая картинка
+        не проходят проверку формы."""
+        for limits in ({'POST_IMAGE_MAX_BYTES': 10},
+                       {'POST_IMAGE_MAX_PIXELS': 100}):
+            with self.subTest(limits=limits), override_settings(**limits):
+                form = PostForm(data={'text': 'Пост'},
+                                files={'image': get_photo()})
+                self.assertFalse(form.is_valid())
+                self.assertIn('image', form.errors)
+
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class CommentFormTests(TestCase):
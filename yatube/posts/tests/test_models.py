@@ -1,6 +1,19 @@
-from django.test import TestCase
+import datetime as dt
+import os
+import tempfile
+from io import StringIO
 
-from posts.models import Group, Post, User
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from posts.counters import recount_all
+from posts.models import (Comment, FeedItem, Follow, Group, Post, User,
+                          UserStats)
+from posts.search import SearchResults
+from posts.seeding import SeedPlan, _generate, _post_rows, seed_uniform
+from posts.slugs import allocate_slugs
+from posts.transfer import PostImporter, read_rows
 
 
 class ModelsTest(TestCase):
@@ -28,3 +41,352 @@ class ModelsTest(TestCase):
         """Метод __str__ возвращает название группы."""
         group = ModelsTest.group
         self.assertEqual(str(group), 'Спорт')
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.author = User.objects.create_user('Ivanov34')
+        cls.reader = User.objects.create_user('Smirnov61')
+
+    def assertStats(self, user, posts, followers, following):
+        stats = UserStats.objects.get(user=user)
+        self.assertEqual(
+            (stats.posts_count, stats.followers_count, stats.following_count),
+            (posts, followers, following),
+        )
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются при создании и удалении постов, подписок
+        и комментариев."""
+        post = Post.objects.create(text='Пост', author=CountersTest.author)
+        Post.objects.create(text='Ещё пост', author=CountersTest.author)
+        follow = Follow.objects.create(
+            author=CountersTest.author, user=CountersTest.reader
+        )
+        comment = Comment.objects.create(
+            post=post, author=CountersTest.reader, text='Комментарий'
+        )
+        self.assertStats(CountersTest.author, 2, 1, 0)
+        self.assertStats(CountersTest.reader, 0, 0, 1)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+        comment.delete()
+        follow.delete()
+        post.delete()
+        self.assertStats(CountersTest.author, 1, 0, 0)
+        self.assertStats(CountersTest.reader, 0, 0, 0)
+
+    def test_recount_command_fixes_drift(self):
+        """Команда recount_counters восстанавливает разошедшиеся счётчики."""
+        post = Post.objects.create(text='Пост', author=CountersTest.author)
+        Comment.objects.create(
+            post=post, author=CountersTest.reader, text='Комментарий'
+        )
+        UserStats.objects.filter(user=CountersTest.author).update(
+            posts_count=10
+        )
+        UserStats.objects.filter(user=CountersTest.reader).delete()
+        Post.objects.filter(pk=post.pk).update(comments_count=0)
+        removed = Post.objects.create(text='Пост', author=CountersTest.author)
+        Comment.objects.create(
+            post=removed, author=CountersTest.reader, text='Комментарий'
+        ).delete()
+
+        call_command('recount_counters', batch_size=1, stdout=StringIO())
+
+        self.assertStats(CountersTest.author, 2, 0, 0)
+        self.assertStats(CountersTest.reader, 0, 0, 0)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(post.commented_at, post.comments.get().created)
+        removed.refresh_from_db()
+        self.assertIsNone(removed.commented_at)
+
+
+class TimestampsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.author = User.objects.create_user('Ivanov34')
+        cls.group = Group.objects.create(title='Спорт', description='')
+
+    def test_updated_at_follows_saves(self):
+        """updated_at поста и группы сдвигается при каждом сохранении
+        и заполняется при bulk_create."""
+        post = Post.objects.create(text='Пост', author=TimestampsTest.author)
+        created = post.updated_at
+        self.assertIsNotNone(created)
+        post.text = 'Исправленный пост'
+        post.save()
+        self.assertGreater(post.updated_at, created)
+
+        group = TimestampsTest.group
+        created = group.updated_at
+        group.title = 'Футбол'
+        group.save()
+        self.assertGreater(group.updated_at, created)
+
+        loaded, = Post.objects.bulk_create([
+            Post(text='Загруженный пост', author=TimestampsTest.author)
+        ])
+        self.assertIsNotNone(loaded.updated_at)
+
+    def test_commented_at_follows_comments(self):
+        """commented_at отмечает добавление и удаление комментариев,
+        recount_all восстанавливает его по таблице комментариев."""
+        post = Post.objects.create(text='Пост', author=TimestampsTest.author)
+        self.assertIsNone(post.commented_at)
+        comment = Comment.objects.create(
+            post=post, author=TimestampsTest.author, text='Комментарий'
+        )
+        post.refresh_from_db()
+        commented = post.commented_at
+        self.assertIsNotNone(commented)
+        updated = post.updated_at
+
+        comment.delete()
+        post.refresh_from_db()
+        self.assertGreater(post.commented_at, commented)
+        # Комментарии не меняют версию самого поста
+        self.assertEqual(post.updated_at, updated)
+
+        comment = Comment.objects.create(
+            post=post, author=TimestampsTest.author, text='Комментарий'
+        )
+        Post.objects.filter(pk=post.pk).update(commented_at=None)
+        recount_all()
+        post.refresh_from_db()
+        self.assertEqual(post.commented_at, comment.created)
+
+
+class GroupSlugTest(TestCase):
+    def test_same_titles_get_distinct_slugs(self):
+        """Группы с одинаковым транслитом названия получают разные slug."""
+        first = Group.objects.create(title='Спорт', description='')
+        second = Group.objects.create(title='спорт!', description='')
+        explicit = Group.objects.create(
+            title='Спорт', slug='sport-news', description=''
+        )
+        self.assertEqual(
+            [first.slug, second.slug, explicit.slug],
+            ['sport', 'sport-2', 'sport-news'],
+        )
+
+    def test_bulk_create_allocates_slugs_in_one_query(self):
+        """bulk_create заполняет slug, занятые выбираются одним запросом."""
+        Group.objects.create(title='Спорт', description='')
+        groups = [
+            Group(title=title, description='')
+            for title in ['Спорт', 'Спорт', 'Кино', '???', 'Я' * 200]
+        ]
+        with self.assertNumQueries(1):
+            allocate_slugs(groups)
+        Group.objects.bulk_create(groups)
+
+        slugs = [group.slug for group in groups]
+        self.assertEqual(slugs[:4], ['sport-2', 'sport-3', 'kino', 'group'])
+        self.assertEqual(slugs[4], 'ya' * 25)
+        self.assertEqual(
+            sorted(Group.objects.values_list('slug', flat=True)),
+            sorted(['sport'] + slugs),
+        )
+
+    def test_long_slug_suffix_fits_max_length(self):
+        """Суффикс длинного slug укладывается в длину поля."""
+        slugs = [
+            Group.objects.create(title='Я' * 200, description='').slug
+            for _ in range(2)
+        ]
+        self.assertEqual(slugs[1], 'ya' * 24 + '-2')
+
+
+class SeedCommandTest(TestCase):
+    @override_settings(FEED_FANOUT_LIMIT=10)
+    def test_seed_fills_tables_and_derived_data(self):
+        """seed наполняет таблицы и строит счётчики и ленты; в отчёт
+        попадают подписки без отброшенных повторов."""
+        stdout = StringIO()
+        call_command(
+            'seed', users=50, groups=5, posts=300, comments=600,
+            follows=400, workers=0, chunk_size=100, stdout=stdout,
+        )
+        self.assertEqual(User.objects.count(), 50)
+        self.assertEqual(Group.objects.count(), 5)
+        self.assertEqual(Post.objects.count(), 300)
+        self.assertEqual(Comment.objects.count(), 600)
+        self.assertGreater(Follow.objects.count(), 200)
+        self.assertIn(
+            f'follows: {Follow.objects.count()} строк', stdout.getvalue()
+        )
+
+        # Степенной закон: у самого популярного автора подписчиков больше
+        # FEED_FANOUT_LIMIT, его посты читаются в ленту при запросе
+        top = UserStats.objects.order_by('-followers_count').first()
+        self.assertGreater(top.followers_count, 10)
+        self.assertFalse(
+            Post.objects.filter(author_id=top.pk, fanned_out=True).exists()
+        )
+        self.assertTrue(FeedItem.objects.exists())
+        for stats in UserStats.objects.all()[:10]:
+            self.assertEqual(
+                stats.followers_count,
+                Follow.objects.filter(author_id=stats.pk).count(),
+            )
+        post = Post.objects.order_by('-comments_count').first()
+        self.assertEqual(post.comments_count, post.comments.count())
+
+    def test_uniform_seed_without_posts(self):
+        """Равномерное наполнение без постов не создаёт комментариев."""
+        seed_uniform('default', users=2, groups=1, posts=0, comments=5,
+                     follows=1)
+        self.assertEqual(User.objects.count(), 2)
+        self.assertFalse(Post.objects.exists())
+        self.assertFalse(Comment.objects.exists())
+
+    def test_rows_do_not_depend_on_workers(self):
+        """Сгенерированные строки зависят от seed, а не от числа процессов."""
+        plan = SeedPlan(seed=1, vocabulary=1000)
+        plan.set_users(list(range(1, 101)))
+        plan.set_groups(list(range(1, 11)))
+
+        def rows(workers):
+            return [
+                row for chunk in _generate(plan, _post_rows, 250, 40, workers)
+                for row in chunk
+            ]
+
+        first = rows(0)
+        self.assertEqual(rows(2), first)
+        plan.seed = 2
+        self.assertNotEqual(rows(0), first)
+
+
+class TransferCommandsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.author = User.objects.create_user('author')
+        cls.reader = User.objects.create_user('reader')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.group = Group.objects.create(title='Спорт', description='')
+        cls.other_group = Group.objects.create(title='Кино', description='')
+        for day, group in ((1, cls.group), (2, cls.group),
+                           (3, cls.other_group), (4, None)):
+            Post.objects.filter(pk=Post.objects.create(
+                text=f'Пост {day} про хоккей', author=cls.author, group=group
+            ).pk).update(pub_date=timezone.make_aware(
+                dt.datetime(2023, 1, day, 12)
+            ))
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def export(self, name, **options):
+        path = os.path.join(self.directory, name)
+        call_command('export_posts', path, stdout=StringIO(), **options)
+        return path
+
+    def test_round_trip_restores_posts_and_derived_data(self):
+        """Выгруженные посты загружаются обратно со всеми полями,
+        попадают в ленты, счётчики и поиск."""
+        for name in ('posts.jsonl', 'posts.csv'):
+            with self.subTest(name=name):
+                path = self.export(
+                    name, group='sport', until=dt.date(2023, 1, 2)
+                )
+                exported = list(Post.objects.filter(
+                    group=TransferCommandsTest.group,
+                    pub_date__date__lt=dt.date(2023, 1, 2),
+                ).values_list('text', 'pub_date', 'author', 'group'))
+                self.assertEqual(len(exported), 1)
+                Post.objects.filter(text=exported[0][0]).delete()
+
+                call_command('import_posts', path, stdout=StringIO())
+
+                restored = Post.objects.filter(text=exported[0][0])
+                self.assertEqual(list(restored.values_list(
+                    'text', 'pub_date', 'author', 'group'
+                )), exported)
+                post = Post.objects.get(text=exported[0][0])
+                self.assertTrue(FeedItem.objects.filter(
+                    user=TransferCommandsTest.reader, post=post
+                ).exists())
+                self.assertEqual(
+                    UserStats.objects.get(user=TransferCommandsTest.author)
+                    .posts_count, 4,
+                )
+                self.assertIn(post.pk, SearchResults('хоккей').ranked_ids())
+
+    def test_import_skips_posts_published_meanwhile(self):
+        """Посты, опубликованные во время загрузки, уже разосланы
+        сигналом: finish не падает на повторной записи ленты."""
+        path = self.export('posts.jsonl', since=dt.date(2023, 1, 4))
+        importer = PostImporter()
+        with open(path) as file:
+            importer.run(read_rows(file, 'jsonl'))
+        published = Post.objects.create(
+            text='Пост во время загрузки', author=TransferCommandsTest.author
+        )
+
+        importer.finish()
+
+        reader_feed = FeedItem.objects.filter(user=TransferCommandsTest.reader)
+        self.assertEqual(reader_feed.filter(post=published).count(), 1)
+        self.assertEqual(
+            reader_feed.count(),
+            Post.objects.filter(author=TransferCommandsTest.author).count(),
+        )
+
+    def test_import_error_keeps_derived_data_of_saved_batches(self):
+        """Неверная строка во второй пачке: первая пачка уже записана,
+        и для неё дописаны ленты, счётчики и поиск."""
+        path = self.export('posts.jsonl', since=dt.date(2023, 1, 3))
+        with open(path, 'a') as file:
+            file.write('{"text": "Без даты", "pub_date": "вчера", '
+                       '"author": "author"}\n')
+        Post.objects.filter(pub_date__date__gte=dt.date(2023, 1, 3)).delete()
+
+        with self.assertRaisesMessage(CommandError, 'вчера'):
+            call_command('import_posts', path, batch_size=2,
+                         stdout=StringIO())
+
+        imported = Post.objects.filter(pub_date__date__gte=dt.date(2023, 1, 3))
+        self.assertEqual(imported.count(), 2)
+        self.assertEqual(FeedItem.objects.filter(
+            user=TransferCommandsTest.reader, post__in=imported
+        ).count(), 2)
+        self.assertEqual(
+            UserStats.objects.get(user=TransferCommandsTest.author)
+            .posts_count, 4,
+        )
+        self.assertEqual(
+            len(SearchResults('хоккей').ranked_ids()), 4
+        )
+
+    def test_import_filters_and_unknown_authors(self):
+        """Загрузка фильтрует строки; неизвестные авторы пропускаются
+        или создаются с --create-authors."""
+        path = self.export('posts.jsonl', since=dt.date(2023, 1, 3))
+        User.objects.filter(pk=TransferCommandsTest.author.pk).update(
+            username='renamed'
+        )
+
+        call_command('import_posts', path, stdout=StringIO())
+        self.assertFalse(User.objects.filter(username='author').exists())
+        self.assertEqual(Post.objects.count(), 4)
+
+        call_command('import_posts', path, group='kino',
+                     create_authors=True, stdout=StringIO())
+        imported = Post.objects.filter(author__username='author')
+        self.assertEqual(
+            list(imported.values_list('text', flat=True)),
+            ['Пост 3 про хоккей'],
+        )
@@ -1,13 +1,24 @@
 import shutil
 import tempfile
+import tracemalloc
+from unittest import mock
 
 from django.conf import settings
 from django.core.cache import cache
+from django.db import connection, transaction
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
+from core.generations import fragment_stats
+from posts.feeds import feed_key
 from posts.forms import CommentForm, PostForm
-from posts.models import Follow, Group, Post, User
+from posts.models import Comment, FeedItem, Follow, Group, Post, User
+from posts.search import SearchResults, index_new_posts
+from posts.transfer import PostImporter
 
+from .on_commit import capture_on_commit_callbacks
+from .query_budgets import SESSION_QUERIES, query_budget
 from .test_forms import get_small_gif, get_url
 
 
@@ -138,7 +149,8 @@ class PostsPagesTests(TestCase):
         response = self.authorized_client.get(
             get_url('posts:post_detail', post_id=PostsPagesTests.post.id),
         )
-
+        comments = response.context['comments_page'].object_list
+        self.assertEqual(comments[0].text, 'Новый комментарий')
 
     def test_post_create_url_contains_post_form(self):
         """Страница post_create содержит форму создания поста (PostForm)."""
@@ -167,11 +179,364 @@ class PostsPagesTests(TestCase):
         )
         response = self.authorized_client.get(get_url('posts:index'))
         posts = response.content
-        new_post.delete()
+        # update() не шлёт сигналов, поэтому поколение кеша не меняется
+        Post.objects.filter(pk=new_post.pk).update(text='Изменённый текст')
         response = self.authorized_client.get(get_url('posts:index'))
         cached_posts = response.content
 
         self.assertEqual(posts, cached_posts)
+        self.assertEqual(
+            fragment_stats()['index_page'],
+            {'hits': 1, 'misses': 1, 'hit_rate': 0.5},
+        )
+
+    def test_cached_pages_invalidated_on_write(self):
+        """Закешированные главная, группа и профиль обновляются сразу
+        после изменения их постов."""
+        urls = (
+            get_url('posts:index'),
+            get_url('posts:group_list', slug=PostsPagesTests.group.slug),
+            get_url('posts:profile', username=PostsPagesTests.user.username),
+        )
+        for url in urls:
+            self.authorized_client.get(url)
+        new_post = Post.objects.create(
+            text='Пост после кеширования',
+            author=PostsPagesTests.user,
+            group=PostsPagesTests.group,
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertContains(response, new_post.text)
+
+        new_post.delete()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertNotContains(response, new_post.text)
+
+
+class ConditionalGetTest(TestCase):
+    """Страницы постов отвечают 304, пока их данные не изменились"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.author = User.objects.create_user('author')
+        cls.reader = User.objects.create_user('reader')
+        cls.group = Group.objects.create(title='Спорт', description='')
+        cls.post = Post.objects.create(
+            text='Пост про спорт', author=cls.author, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(ConditionalGetTest.reader)
+        # Первый ответ ставит CSRF-cookie, от неё ETag тоже зависит;
+        # гостям страницы отдаёт кеш страниц, его проверяет PageCacheTest
+        self.reader_client.get(self.urls()['post_detail'])
+
+    def urls(self):
+        return {
+            'index': get_url('posts:index'),
+            'group_list': get_url(
+                'posts:group_list', slug=ConditionalGetTest.group.slug
+            ),
+            'profile': get_url(
+                'posts:profile', username=ConditionalGetTest.author.username
+            ),
+            'post_detail': get_url(
+                'posts:post_detail', post_id=ConditionalGetTest.post.pk
+            ),
+        }
+
+    def etags(self, client=None):
+        client = client or self.reader_client
+        return {name: client.get(url)['ETag']
+                for name, url in self.urls().items()}
+
+    def changed(self, before, client=None):
+        after = self.etags(client)
+        return {name for name in before if before[name] != after[name]}
+
+    def test_not_modified_before_list_query(self):
+        """На If-None-Match с текущим ETag страница не рендерится,
+        и список постов не выбирается."""
+        page_limits = {
+            f'LIMIT {settings.PAGE_SIZE + 1}',
+            f'LIMIT {settings.COMMENTS_PAGE_SIZE + 1}',
+        }
+        for name, url in self.urls().items():
+            with self.subTest(page=name):
+                etag = self.reader_client.get(url)['ETag']
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.reader_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag
+                    )
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+                self.assertIsNone(response.context)
+                self.assertFalse([
+                    query for query in queries.captured_queries
+                    if any(limit in query['sql'] for limit in page_limits)
+                ])
+
+    def test_etag_follows_writes(self):
+        """ETag меняется у тех страниц, чьи данные изменились."""
+        all_pages = set(self.urls())
+        before = self.etags()
+        Post.objects.create(
+            text='Ещё пост', author=ConditionalGetTest.author,
+            group=ConditionalGetTest.group,
+        )
+        # На странице поста - число постов автора
+        self.assertEqual(self.changed(before), all_pages)
+
+        before = self.etags()
+        post = ConditionalGetTest.post
+        post.text = 'Исправленный пост'
+        post.save()
+        self.assertEqual(self.changed(before), all_pages)
+
+        before = self.etags()
+        Comment.objects.create(
+            post=post, author=ConditionalGetTest.reader, text='Комментарий'
+        )
+        self.assertEqual(self.changed(before), {'post_detail'})
+
+        before = self.etags()
+        Post.objects.bulk_create([
+            Post(text='Загруженный пост', author=ConditionalGetTest.author)
+        ])
+        self.assertEqual(self.changed(before), {'index', 'profile'})
+
+        # Правка без сигналов видна главной по индексу updated_at
+        before = self.etags()
+        Post.objects.filter(pk=post.pk).update(updated_at=timezone.now())
+        self.assertEqual(
+            self.changed(before), {'index', 'post_detail'}
+        )
+
+    def test_etag_depends_on_viewer(self):
+        """У гостя и вошедшего пользователя разные ETag, подписка
+        меняет ETag профиля."""
+        guest = self.etags(self.guest_client)
+        reader = self.etags()
+        self.assertTrue(all(guest[name] != reader[name] for name in guest))
+
+        Follow.objects.create(
+            user=ConditionalGetTest.reader, author=ConditionalGetTest.author
+        )
+        self.assertEqual(self.changed(reader), {'profile'})
+
+
+class PageCacheTest(TestCase):
+    """Гостям страницы отдаются из кеша, пока их данные не изменились"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.author = User.objects.create_user('author')
+        cls.reader = User.objects.create_user('reader')
+        cls.group = Group.objects.create(title='Спорт', description='')
+        cls.post = Post.objects.create(
+            text='Пост про спорт', author=cls.author, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def urls(self):
+        return {
+            'index': get_url('posts:index'),
+            'group_list': get_url(
+                'posts:group_list', slug=PageCacheTest.group.slug
+            ),
+            'profile': get_url(
+                'posts:profile', username=PageCacheTest.author.username
+            ),
+            'post_detail': get_url(
+                'posts:post_detail', post_id=PageCacheTest.post.pk
+            ),
+        }
+
+    def warm(self):
+        for url in self.urls().values():
+            self.guest_client.get(url)
+
+    def misses(self):
+        """Страницы, которые пришлось собирать заново"""
+        missed = set()
+        for name, url in self.urls().items():
+            with CaptureQueriesContext(connection) as queries:
+                self.guest_client.get(url)
+            if queries:
+                missed.add(name)
+        return missed
+
+    def test_cached_page_served_without_queries(self):
+        """Повторный запрос гостя не обращается к БД и отдаёт ту же
+        страницу, с ETag и 304."""
+        for name, url in self.urls().items():
+            with self.subTest(page=name):
+                first = self.guest_client.get(url)
+                with CaptureQueriesContext(connection) as queries:
+                    second = self.guest_client.get(url)
+                self.assertEqual(len(queries), 0)
+                self.assertEqual(second.content, first.content)
+                self.assertEqual(second['ETag'], first['ETag'])
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=first['ETag']
+                )
+                self.assertEqual(response.status_code, 304)
+
+    def test_writes_invalidate_dependent_pages(self):
+        """Запись сбрасывает только зависящие от неё страницы."""
+        post = PageCacheTest.post
+        author = PageCacheTest.author
+        reader = PageCacheTest.reader
+        group = PageCacheTest.group
+        writes = (
+            ('comment', lambda: Comment.objects.create(
+                post=post, author=reader, text='Комментарий'
+            ), {'post_detail'}),
+            ('follow', lambda: Follow.objects.create(
+                user=reader, author=author
+            ), {'profile'}),
+            ('signup', lambda: User.objects.create_user('newcomer'), set()),
+            ('group', group.save, {
+                'index', 'group_list', 'profile', 'post_detail'
+            }),
+            ('post', lambda: Post.objects.create(
+                text='Ещё пост', author=reader
+            ), {'index'}),
+            ('edit', post.save, {
+                'index', 'group_list', 'profile', 'post_detail'
+            }),
+        )
+        for name, write, expected in writes:
+            with self.subTest(write=name):
+                self.warm()
+                write()
+                self.assertEqual(self.misses(), expected)
+
+    def test_new_page_content_after_write(self):
+        """После записи гость видит новые данные."""
+        url = self.urls()['post_detail']
+        self.guest_client.get(url)
+        Comment.objects.create(
+            post=PageCacheTest.post, author=PageCacheTest.reader,
+            text='Свежий комментарий',
+        )
+        self.assertContains(self.guest_client.get(url), 'Свежий комментарий')
+
+    def test_bulk_import_invalidates_pages(self):
+        """Загрузка постов без сигналов сбрасывает все страницы."""
+        self.warm()
+        PostImporter().run([{
+            'text': 'Загруженный пост', 'pub_date': timezone.now(),
+            'author': PageCacheTest.author.username, 'group': '',
+            'group_title': '', 'image': '',
+        }])
+        self.assertEqual(self.misses(), set(self.urls()))
+
+    def test_not_cached(self):
+        """Вошедшим пользователям и адресам с посторонними параметрами
+        страницы не кешируются."""
+        client = Client()
+        client.force_login(PageCacheTest.reader)
+        url = self.urls()['index']
+        for client, url in ((client, url), (self.guest_client, url + '?x=1')):
+            with self.subTest(url=url):
+                client.get(url)
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(url)
+                self.assertTrue(queries)
+                self.assertIsNotNone(response.context)
+
+
+class PostCardCacheTest(TestCase):
+    """Карточки постов в списках рендерятся один раз и берутся из кеша"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.author = User.objects.create_user('author')
+        cls.reader = User.objects.create_user('reader')
+        cls.group = Group.objects.create(
+            title='Спорт', slug='sport', description=''
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.author, group=cls.group
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(PostCardCacheTest.reader)
+
+    def card_stats(self):
+        stats = fragment_stats().get('post_card', {})
+        return stats.get('hits', 0), stats.get('misses', 0)
+
+    def test_cards_shared_between_pages(self):
+        """Карточка, отрисованная на главной, берётся из кеша в профиле"""
+        self.reader_client.get(get_url('posts:index'))
+        self.assertEqual(self.card_stats(), (0, 3))
+        self.reader_client.get(get_url(
+            'posts:profile', username=PostCardCacheTest.author.username
+        ))
+        self.assertEqual(self.card_stats(), (3, 3))
+
+    def test_cards_separated(self):
+        """Между карточками ровно один <hr>, после последней - нет"""
+        for url in (
+            get_url('posts:index'),
+            get_url('posts:group_list', slug=PostCardCacheTest.group.slug),
+        ):
+            with self.subTest(url=url):
+                content = self.reader_client.get(url).content.decode()
+                self.assertEqual(content.count('<hr>'), 2)
+                self.assertNotIn('<hr>', content.split('Пост 0', 1)[1])
+
+    def test_only_changed_cards_rendered(self):
+        """Правка поста, автора или группы перерисовывает только
+        затронутые карточки и видна на странице"""
+        url = get_url('posts:index')
+        self.reader_client.get(url)
+
+        post = PostCardCacheTest.posts[0]
+        post.text = 'Изменённый пост'
+        post.save()
+        response = self.reader_client.get(url)
+        self.assertContains(response, 'Изменённый пост')
+        self.assertEqual(self.card_stats(), (2, 4))
+
+        group = PostCardCacheTest.group
+        group.slug = 'football'
+        group.save()
+        response = self.reader_client.get(url)
+        self.assertContains(response, get_url(
+            'posts:group_list', slug='football'
+        ))
+        self.assertEqual(self.card_stats(), (2, 7))
+
+        author = PostCardCacheTest.author
+        author.first_name = 'Лев'
+        author.save()
+        response = self.reader_client.get(url)
+        self.assertContains(response, 'Лев')
+        self.assertEqual(self.card_stats(), (2, 10))
 
 
 class PaginatorViewsTest(TestCase):
@@ -235,6 +600,61 @@ class PaginatorViewsTest(TestCase):
                 self.assertEqual(len(response.context['posts']),
                                  page_posts_count)
 
+    def test_numbered_page_links_to_neighbours(self):
+        """Старая ссылка на страницу, за которой есть следующая, отдаёт
+        курсор, продолжающий ленту с места, где страница кончилась."""
+        urls = (
+            get_url('posts:index') + '?page=2',
+            get_url('posts:group_list',
+                    slug=PaginatorViewsTest.group1.slug) + '?page=1',
+            get_url('posts:profile',
+                    username=PaginatorViewsTest.user1.username) + '?page=1',
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, 200)
+                page = response.context['page_obj']
+                self.assertIsNotNone(page.next_cursor)
+                self.assertEqual(
+                    page.previous_cursor is not None, page.has_previous()
+                )
+                older = self.guest_client.get(
+                    url.split('?')[0], {'older': page.next_cursor}
+                ).context['page_obj']
+                last, first = page.object_list[-1], older.object_list[0]
+                self.assertGreater(
+                    (last.pub_date, last.pk), (first.pub_date, first.pk)
+                )
+
+    def test_cursor_pages_walk_whole_feed(self):
+        """Ссылки «старее/новее» обходят ленту без пропусков и повторов."""
+        url = get_url('posts:index')
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+
+        seen, pages, query = [], [], ''
+        while True:
+            page = self.guest_client.get(url + query).context['page_obj']
+            pages.append(page)
+            seen.extend(page.object_list)
+            if page.next_cursor is None:
+                break
+            query = f'?older={page.next_cursor}'
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(pages), 4)
+
+        previous = self.guest_client.get(
+            url + f'?newer={pages[2].previous_cursor}'
+        ).context['page_obj']
+        self.assertEqual(previous.object_list, pages[1].object_list)
+
+    def test_invalid_cursor_not_found(self):
+        """Испорченный курсор даёт 404, а не ошибку сервера."""
+        response = self.guest_client.get(
+            get_url('posts:index') + '?older=bad'
+        )
+        self.assertEqual(response.status_code, 404)
+
 
 class NewPostTest(TestCase):
     @classmethod
@@ -273,6 +693,16 @@ class NewPostTest(TestCase):
                 post = response.context['posts'][0]
                 self.assertEqual(post, NewPostTest.post)
 
+    def test_profile_reads_one_page_and_stored_counters(self):
+        """Профиль читает автора со счётчиками и одну страницу постов."""
+        url = get_url(
+            'posts:profile', username=NewPostTest.user.username
+        )
+        with self.assertNumQueries(2):
+            response = Client().get(url)
+        self.assertContains(response, 'Всего постов: 1')
+        self.assertContains(response, 'Всего подписчиков: 0')
+
     def test_new_post_not_in_different_group(self):
         """Новый пост не отображается в чужой группе."""
         response = self.guest_client.get(
@@ -311,7 +741,7 @@ class FollowModuleTest(TestCase):
         response = self.follower_client.get(get_url('posts:follow_index'))
         follower_posts = response.context['posts']
 
-        response = self.follower_client.get(get_url('posts:follow_index'))
+        response = self.unfollower_client.get(get_url('posts:follow_index'))
         unfollower_posts = response.context['posts']
 
         self.assertNotEqual(follower_posts, unfollower_posts)
@@ -343,3 +773,757 @@ class FollowModuleTest(TestCase):
                 user=FollowModuleTest.follower
             ).exists()
         )
+
+    def test_feed_backfilled_on_follow_and_trimmed_on_unfollow(self):
+        """При подписке старые посты автора попадают в ленту, при отписке
+        убираются из неё."""
+        post = Post.objects.create(
+            text='Пост до подписки',
+            author=FollowModuleTest.author,
+        )
+        self.unfollower_client.get(
+            get_url(
+                'posts:profile_follow',
+                username=FollowModuleTest.author.username
+            ),
+        )
+        response = self.unfollower_client.get(get_url('posts:follow_index'))
+        self.assertEqual(list(response.context['posts']), [post])
+
+        self.unfollower_client.get(
+            get_url(
+                'posts:profile_unfollow',
+                username=FollowModuleTest.author.username
+            ),
+        )
+        response = self.unfollower_client.get(get_url('posts:follow_index'))
+        self.assertEqual(list(response.context['posts']), [])
+        self.assertFalse(
+            FeedItem.objects.filter(user=FollowModuleTest.unfollower).exists()
+        )
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_popular_author_posts_read_on_request(self):
+        """Посты авторов с множеством подписчиков не рассылаются по лентам,
+        а подмешиваются в ленту при чтении."""
+        regular_author = User.objects.create_user('Petrov12')
+        old_post = Post.objects.create(
+            text='Пост обычного автора',
+            author=regular_author,
+        )
+        Follow.objects.create(
+            author=regular_author, user=FollowModuleTest.follower
+        )
+        new_post = Post.objects.create(
+            text='Пост популярного автора',
+            author=FollowModuleTest.author,
+        )
+        new_post.refresh_from_db()
+
+        self.assertFalse(new_post.fanned_out)
+        self.assertFalse(new_post.feed_items.exists())
+        response = self.follower_client.get(get_url('posts:follow_index'))
+        self.assertEqual(list(response.context['posts']), [new_post, old_post])
+
+    def feed_queries(self, params=None):
+        """(посты страницы ленты подписчика, число запросов к БД)"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.follower_client.get(
+                get_url('posts:follow_index'), params or {}
+            )
+        return list(response.context['posts']), len(queries)
+
+    def test_cached_feed_page_is_one_query(self):
+        """Повторная страница ленты - один запрос постов; разосланные
+        посты вставляются в кешированную ленту после фиксации,
+        удалённые из неё пропадают."""
+        first = Post.objects.create(
+            text='Первый пост', author=FollowModuleTest.author
+        )
+        self.feed_queries()
+        self.assertEqual(self.feed_queries(), ([first], SESSION_QUERIES + 1))
+
+        with capture_on_commit_callbacks(execute=True):
+            second = Post.objects.create(
+                text='Второй пост', author=FollowModuleTest.author
+            )
+        self.assertEqual(
+            self.feed_queries(), ([second, first], SESSION_QUERIES + 1)
+        )
+
+        # Откаченный пост в кешированную ленту не попадает
+        with capture_on_commit_callbacks(execute=True):
+            with self.assertRaises(ZeroDivisionError):
+                with transaction.atomic():
+                    Post.objects.create(
+                        text='Откаченный пост', author=FollowModuleTest.author
+                    )
+                    1 / 0
+        rows, _ = cache.get(feed_key(FollowModuleTest.follower.pk))
+        self.assertEqual(
+            [post_id for _, post_id in rows], [second.pk, first.pk]
+        )
+
+        second.delete()
+        self.assertEqual(self.feed_queries()[0], [first])
+
+    def test_popular_posts_not_pushed_to_cached_feeds(self):
+        """Посты популярного автора не рассылаются и по кешированным
+        лентам: они подмешиваются при чтении одним запросом."""
+        first = Post.objects.create(
+            text='Первый пост', author=FollowModuleTest.author
+        )
+        self.feed_queries()
+        with override_settings(FEED_FANOUT_LIMIT=0):
+            with capture_on_commit_callbacks(execute=True):
+                popular = Post.objects.create(
+                    text='Пост популярного автора',
+                    author=FollowModuleTest.author,
+                )
+            self.assertEqual(
+                self.feed_queries()[0], [popular, first]
+            )
+            with capture_on_commit_callbacks() as callbacks:
+                newest = Post.objects.create(
+                    text='Ещё пост популярного автора',
+                    author=FollowModuleTest.author,
+                )
+        self.assertEqual(callbacks, [])
+        self.assertEqual(
+            self.feed_queries(),
+            ([newest, popular, first], SESSION_QUERIES + 2),
+        )
+
+    @override_settings(FEED_CACHE_SIZE=3)
+    def test_feed_pages_beyond_cache(self):
+        """Страницы глубже кешированной ленты читаются из БД."""
+        posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=FollowModuleTest.author
+            )
+            for i in range(settings.PAGE_SIZE * 2 + 1)
+        ]
+        seen, params = [], {}
+        while True:
+            response = self.follower_client.get(
+                get_url('posts:follow_index'), params
+            )
+            seen.extend(response.context['posts'])
+            cursor = response.context['page_obj'].next_cursor
+            if cursor is None:
+                break
+            params = {'older': cursor}
+        self.assertEqual(seen, posts[::-1])
+
+        response = self.follower_client.get(
+            get_url('posts:follow_index'),
+            {'newer': response.context['page_obj'].previous_cursor},
+        )
+        self.assertEqual(
+            list(response.context['posts']),
+            posts[::-1][settings.PAGE_SIZE:settings.PAGE_SIZE * 2],
+        )
+
+
+class GroupPageScalingTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.author = User.objects.create_user('Ivanov34')
+        cls.group = Group.objects.create(
+            title='Спорт',
+            description='Группа о спорте',
+        )
+
+    def add_posts(self, count):
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=GroupPageScalingTest.author,
+                 group=GroupPageScalingTest.group)
+            for i in range(count)
+        )
+
+    def measure_group_page(self):
+        """Число запросов и пик памяти при показе страницы группы"""
+        cache.clear()
+        url = get_url('posts:group_list', slug=GroupPageScalingTest.group.slug)
+        tracemalloc.start()
+        with CaptureQueriesContext(connection) as queries:
+            response = Client().get(url)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self.assertEqual(len(response.context['posts']), settings.PAGE_SIZE)
+        return queries, peak
+
+    def test_group_page_cost_does_not_grow_with_group(self):
+        """Страница группы читает одну страницу постов: число запросов
+        и память не зависят от размера группы."""
+        self.add_posts(10)
+        small_queries, small_peak = self.measure_group_page()
+        self.add_posts(1000)
+        large_queries, large_peak = self.measure_group_page()
+
+        self.assertEqual(len(large_queries), len(small_queries))
+        self.assertLess(large_peak, small_peak * 1.5)
+        for query in large_queries:
+            if 'posts_post' in query['sql']:
+                self.assertIn('LIMIT', query['sql'])
+
+
+@override_settings(COMMENTS_PAGE_SIZE=2)
+class CommentsPagesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.user = User.objects.create_user('Ivanov34')
+        cls.post = Post.objects.create(text='Пост', author=cls.user)
+        for i in range(5):
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Комментарий {i}'
+            )
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def comment_texts(self, comments):
+        return [comment.text for comment in comments]
+
+    def test_post_detail_shows_first_comments_page(self):
+        """Страница поста показывает только первую страницу комментариев
+        и ссылку на следующую."""
+        response = self.guest_client.get(
+            get_url('posts:post_detail', post_id=CommentsPagesTest.post.id)
+        )
+        page = response.context['comments_page']
+        self.assertEqual(
+            self.comment_texts(page.object_list),
+            ['Комментарий 4', 'Комментарий 3'],
+        )
+        self.assertContains(response, f'?older={page.next_cursor}')
+
+    def test_comments_fragment_and_json_pages(self):
+        """Следующие страницы комментариев отдаются фрагментом и JSON."""
+        url = get_url('posts:comments', post_id=CommentsPagesTest.post.id)
+        response = self.guest_client.get(url)
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        cursor = response.context['comments_page'].next_cursor
+
+        response = self.guest_client.get(
+            url, {'older': cursor, 'format': 'json'}
+        )
+        data = response.json()
+        self.assertEqual(
+            [comment['text'] for comment in data['comments']],
+            ['Комментарий 2', 'Комментарий 1'],
+        )
+
+        response = self.guest_client.get(
+            url, {'older': data['next_cursor'], 'format': 'json'}
+        )
+        data = response.json()
+        self.assertEqual(len(data['comments']), 1)
+        self.assertIsNone(data['next_cursor'])
+
+    def test_comments_of_missing_post_not_found(self):
+        """Комментарии несуществующего поста дают 404."""
+        response = self.guest_client.get(
+            get_url('posts:comments', post_id=CommentsPagesTest.post.id + 1)
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class SearchPagesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.user = User.objects.create_user('Ivanov35')
+        cls.admin = User.objects.create_superuser(
+            'admin35', 'admin@example.com', 'password'
+        )
+        cls.exact = Post.objects.create(
+            text='Кошка и кошка: всё про кошек', author=cls.user
+        )
+        cls.once = Post.objects.create(
+            text='Собака встретила кошку во дворе', author=cls.user
+        )
+        cls.other = Post.objects.create(text='Про собак', author=cls.user)
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def found(self, query):
+        response = self.guest_client.get(get_url('posts:search'), {'q': query})
+        return [post.id for post in response.context['posts']]
+
+    def test_search_ranked_by_relevance(self):
+        """Поиск находит посты по префиксам слов, более подходящие выше."""
+        self.assertEqual(
+            self.found('КОШ'),
+            [SearchPagesTest.exact.id, SearchPagesTest.once.id],
+        )
+        self.assertEqual(self.found('собак кош'), [SearchPagesTest.once.id])
+        self.assertEqual(self.found('"*:)'), [])
+
+    def test_relevant_old_post_not_lost(self):
+        """Ранжируются все кандидаты: старый точный пост выше сотен
+        новых, пока совпадений не больше SEARCH_CANDIDATES."""
+        exact = Post.objects.create(
+            text='Жираф жираф жираф', author=SearchPagesTest.user
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i} о разном, упомянут жираф',
+                 author=SearchPagesTest.user)
+            for i in range(250)
+        )
+        index_new_posts(exact.pk)
+
+        results = SearchResults('жираф')
+        self.assertEqual(results.count(), 251)
+        self.assertEqual(results.ranked_ids(limit=1), [exact.pk])
+        response = self.guest_client.get(
+            get_url('posts:search'), {'q': 'жираф', 'page': 26}
+        )
+        self.assertEqual(len(response.context['posts']), 1)
+
+    def test_common_query_returns_newest_matches(self):
+        """Если совпадений не меньше SEARCH_CANDIDATES, выдаются столько
+        самых новых, от новых к старым, без ранжирования."""
+        exact = Post.objects.create(
+            text='Жираф жираф жираф', author=SearchPagesTest.user
+        )
+        posts = [
+            Post.objects.create(
+                text=f'Пост {i}, упомянут жираф', author=SearchPagesTest.user
+            )
+            for i in range(14)
+        ]
+        newest = [post.pk for post in reversed(posts[-12:])]
+        with override_settings(SEARCH_CANDIDATES=12):
+            results = SearchResults('жираф')
+            self.assertEqual(results.count(), 12)
+            self.assertEqual(results.ranked_ids(), newest)
+            self.assertNotIn(exact.pk, results.ranked_ids())
+            response = self.guest_client.get(
+                get_url('posts:search'), {'q': 'жираф', 'page': 2}
+            )
+        self.assertEqual(len(response.context['posts']), 2)
+
+    def test_search_index_follows_writes(self):
+        """Правка и удаление поста сразу видны в поиске."""
+        post = SearchPagesTest.other
+        post.text = 'Теперь про попугаев'
+        post.save()
+        self.assertEqual(self.found('попуга'), [post.id])
+        self.assertEqual(self.found('собак'), [SearchPagesTest.once.id])
+
+        post.delete()
+        self.assertEqual(self.found('попуга'), [])
+
+    def test_group_rename_reindexes_its_posts(self):
+        """Новое название группы находится поиском; правка описания
+        индекс не перестраивает."""
+        group = Group.objects.create(title='Зоопарк', description='')
+        post = Post.objects.create(
+            text='Пост в группе', author=SearchPagesTest.user, group=group
+        )
+        group = Group.objects.get(pk=group.pk)
+        with mock.patch('posts.search.reindex_posts') as reindex_posts:
+            group.description = 'Новое описание'
+            group.save()
+        reindex_posts.assert_not_called()
+
+        group.title = 'Террариум'
+        group.save()
+        self.assertEqual(self.found('террариум'), [post.id])
+        self.assertEqual(self.found('зоопарк'), [])
+
+    def test_search_across_scripts(self):
+        """Латинский запрос находит кириллицу и наоборот, в том числе
+        по названию группы."""
+        group = Group.objects.create(
+            title='Спорт', slug='sport', description='Про спорт'
+        )
+        latin = Post.objects.create(
+            text='Privet iz Moskvy', author=SearchPagesTest.user, group=group
+        )
+        self.assertEqual(
+            self.found('koshk'),
+            [SearchPagesTest.exact.id, SearchPagesTest.once.id],
+        )
+        self.assertEqual(self.found('привет'), [latin.id])
+        self.assertEqual(self.found('sport'), [latin.id])
+
+        group.title = 'Футбол'
+        group.save()
+        self.assertEqual(self.found('sport'), [])
+        self.assertEqual(self.found('futbol'), [latin.id])
+
+        group.delete()
+        self.assertEqual(self.found('футбол'), [])
+
+    def test_search_paginated(self):
+        """Результаты поиска разбиты на страницы."""
+        for i in range(settings.PAGE_SIZE):
+            Post.objects.create(text=f'Кошка {i}', author=SearchPagesTest.user)
+        response = self.guest_client.get(
+            get_url('posts:search'), {'q': 'кошка', 'page': 2}
+        )
+        self.assertEqual(response.context['page_obj'].paginator.count,
+                         settings.PAGE_SIZE + 1)
+        self.assertEqual(len(response.context['posts']), 1)
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт через полнотекстовый индекс."""
+        client = Client()
+        client.force_login(SearchPagesTest.admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/admin/posts/post/', {'q': 'собака'})
+        self.assertEqual(
+            [post.id for post in response.context['cl'].result_list],
+            [SearchPagesTest.once.id],
+        )
+        self.assertTrue(any('MATCH' in query['sql']
+                            for query in queries.captured_queries))
+        self.assertFalse(any('LIKE' in query['sql']
+                             for query in queries.captured_queries))
+        response = client.get('/admin/posts/post/', {'q': 'кошк'})
+        self.assertEqual(
+            {post.id for post in response.context['cl'].result_list},
+            {SearchPagesTest.exact.id, SearchPagesTest.once.id},
+        )
+
+
+class ApiViewsTest(TestCase):
+    """JSON-ленты для мобильного клиента"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.author = User.objects.create_user('author')
+        cls.reader = User.objects.create_user('reader')
+        cls.group = Group.objects.create(title='Спорт', description='Бег')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.author,
+                group=cls.group if i % 2 else None,
+            )
+            for i in range(settings.PAGE_SIZE + 3)
+        ]
+        cls.post = cls.posts[-1]
+        for i in range(settings.COMMENTS_PAGE_SIZE + 1):
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text=f'Комментарий {i}'
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(ApiViewsTest.reader)
+
+    def walk(self, client, url):
+        """id постов всех страниц ленты по курсорам next"""
+        ids, cursor = [], None
+        while True:
+            params = {'older': cursor} if cursor else {}
+            data = client.get(url, params).json()
+            ids.extend(post['id'] for post in data['results'])
+            cursor = data['next']
+            if cursor is None:
+                return ids
+
+    def test_feeds_match_html_pages(self):
+        """Ленты отдают те же посты в том же порядке, что и HTML."""
+        newest_first = [post.id for post in reversed(ApiViewsTest.posts)]
+        in_group = [post.id for post in reversed(ApiViewsTest.posts)
+                    if post.group_id]
+        feeds = (
+            (self.guest_client, get_url('posts:api_index'), newest_first),
+            (self.guest_client, get_url(
+                'posts:api_group', slug=ApiViewsTest.group.slug
+            ), in_group),
+            (self.guest_client, get_url(
+                'posts:api_profile', username=ApiViewsTest.author.username
+            ), newest_first),
+            (self.reader_client, get_url('posts:api_follow'), newest_first),
+        )
+        for client, url, expected in feeds:
+            with self.subTest(url=url):
+                self.assertEqual(self.walk(client, url), expected)
+
+    def test_post_serialized(self):
+        """Пост отдаётся с автором, группой и комментариями."""
+        post = ApiViewsTest.post
+        response = self.guest_client.get(get_url('posts:api_index'))
+        self.assertEqual(response['Content-Type'], 'application/json')
+        group = {
+            'slug': ApiViewsTest.group.slug, 'title': ApiViewsTest.group.title
+        }
+        for row in response.json()['results']:
+            expected = Post.objects.get(pk=row['id'])
+            with self.subTest(post=expected.id):
+                self.assertEqual(row['text'], expected.text)
+                self.assertEqual(row['author'], ApiViewsTest.author.username)
+                self.assertEqual(
+                    row['group'], group if expected.group_id else None
+                )
+                self.assertIsNone(row['image'])
+
+        data = self.guest_client.get(
+            get_url('posts:api_post', post_id=post.id)
+        ).json()
+        self.assertEqual(data['comments_count'], post.comments.count())
+        self.assertEqual(len(data['comments']), settings.COMMENTS_PAGE_SIZE)
+        rest = self.guest_client.get(
+            get_url('posts:api_comments', post_id=post.id),
+            {'older': data['comments_next']},
+        ).json()
+        self.assertEqual(
+            [comment['text'] for comment in rest['results']],
+            ['Комментарий 0'],
+        )
+        self.assertIsNone(rest['next'])
+
+    def test_newer_cursor_returns_previous_page(self):
+        """Курсор previous ведёт на предыдущую страницу."""
+        url = get_url('posts:api_index')
+        first = self.guest_client.get(url).json()
+        second = self.guest_client.get(url, {'older': first['next']}).json()
+        back = self.guest_client.get(
+            url, {'newer': second['previous']}
+        ).json()
+        self.assertEqual(back['results'], first['results'])
+
+    def api_urls(self):
+        """Адреса API, клиент и число запросов ответа 304: группа
+        и автор читаются для ETag, у ленты подписок - сессия"""
+        post_id = ApiViewsTest.post.id
+        return (
+            (get_url('posts:api_index'), self.guest_client, 0),
+            (get_url(
+                'posts:api_group', slug=ApiViewsTest.group.slug
+            ), self.guest_client, 1),
+            (get_url(
+                'posts:api_profile', username=ApiViewsTest.author.username
+            ), self.guest_client, 1),
+            (get_url('posts:api_follow'), self.reader_client,
+             SESSION_QUERIES),
+            (get_url('posts:api_post', post_id=post_id), self.guest_client, 0),
+            (get_url(
+                'posts:api_comments', post_id=post_id
+            ), self.guest_client, 0),
+        )
+
+    def test_etag_not_modified(self):
+        """На If-None-Match с текущим ETag отдаётся 304 без выборки
+        постов и комментариев, после изменения ленты - новая страница."""
+        for url, client, queries in self.api_urls():
+            with self.subTest(url=url):
+                etag = client.get(url)['ETag']
+                with self.assertNumQueries(queries):
+                    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+
+        url = get_url('posts:api_index')
+        etag = self.guest_client.get(url)['ETag']
+        Post.objects.create(text='Новый пост', author=ApiViewsTest.author)
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_follows_writes(self):
+        """ETag меняется у ответов, данные которых изменились."""
+        author = User.objects.get(pk=ApiViewsTest.author.pk)
+        group = Group.objects.get(pk=ApiViewsTest.group.pk)
+        comments = get_url('posts:api_comments', post_id=ApiViewsTest.post.id)
+
+        def add_comment():
+            Comment.objects.create(
+                post=ApiViewsTest.post, author=ApiViewsTest.reader, text='Ещё'
+            )
+
+        def rename_author():
+            author.first_name = 'Лев'
+            author.save()
+
+        def unfollow():
+            Follow.objects.filter(user=ApiViewsTest.reader).delete()
+
+        writes = (
+            (add_comment, set()),
+            (rename_author, set()),
+            (group.save, {comments}),
+            (unfollow, None),
+        )
+        for write, unchanged in writes:
+            before = {url: client.get(url)['ETag']
+                      for url, client, queries in self.api_urls()}
+            write()
+            for url, client, queries in self.api_urls():
+                if unchanged is None and url != get_url('posts:api_follow'):
+                    continue
+                with self.subTest(write=write.__name__, url=url):
+                    self.assertEqual(
+                        client.get(url)['ETag'] == before[url],
+                        url in (unchanged or ()),
+                    )
+
+    def test_errors_are_json(self):
+        """Ошибки отдаются JSON: 404 для несуществующих объектов
+        и курсоров, 401 для ленты подписок без входа."""
+        urls = (
+            get_url('posts:api_group', slug='missing'),
+            get_url('posts:api_profile', username='missing'),
+            get_url('posts:api_post', post_id=0),
+            get_url('posts:api_comments', post_id=0),
+            get_url('posts:api_index') + '?older=bad',
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, 404)
+                self.assertIn('detail', response.json())
+        response = self.guest_client.get(get_url('posts:api_follow'))
+        self.assertEqual(response.status_code, 401)
+
+
+class QueryBudgetTest(TestCase):
+    """Страницы posts.urls укладываются в бюджет запросов, и он не
+    растёт с числом постов и комментариев на странице"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.author = User.objects.create_user('author')
+        cls.reader = User.objects.create_user('reader')
+        cls.other = User.objects.create_user('other')
+        cls.group = Group.objects.create(title='Спорт', description='')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = cls.add_posts(1)[0]
+
+    @classmethod
+    def add_posts(cls, count):
+        posts = [
+            Post.objects.create(
+                text=f'Пост про спорт {i}', author=cls.author, group=cls.group
+            )
+            for i in range(count)
+        ]
+        for post in posts:
+            Comment.objects.create(
+                post=post, author=cls.reader, text='Комментарий'
+            )
+        return posts
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(QueryBudgetTest.reader)
+        self.author_client = Client()
+        self.author_client.force_login(QueryBudgetTest.author)
+
+    def pages(self):
+        """(имя страницы, клиент, метод, url) для всех страниц posts.urls"""
+        post_id = QueryBudgetTest.post.pk
+        other = QueryBudgetTest.other.username
+        return [
+            ('posts:index', Client(), 'get', get_url('posts:index')),
+            ('posts:group_list', Client(), 'get', get_url(
+                'posts:group_list', slug=QueryBudgetTest.group.slug
+            )),
+            ('posts:profile', Client(), 'get', get_url(
+                'posts:profile', username=QueryBudgetTest.author.username
+            )),
+            ('posts:post_detail', Client(), 'get', get_url(
+                'posts:post_detail', post_id=post_id
+            )),
+            ('posts:comments', Client(), 'get', get_url(
+                'posts:comments', post_id=post_id
+            )),
+            ('posts:search', Client(), 'get',
+             get_url('posts:search') + '?q=спорт'),
+            ('posts:post_create', self.reader_client, 'get',
+             get_url('posts:post_create')),
+            ('posts:post_edit', self.author_client, 'get', get_url(
+                'posts:post_edit', post_id=post_id
+            )),
+            ('posts:follow_index', self.reader_client, 'get',
+             get_url('posts:follow_index')),
+            ('posts:add_comment', self.reader_client, 'post', get_url(
+                'posts:add_comment', post_id=post_id
+            )),
+            ('posts:profile_follow', self.reader_client, 'get', get_url(
+                'posts:profile_follow', username=other
+            )),
+            ('posts:profile_unfollow', self.reader_client, 'get', get_url(
+                'posts:profile_unfollow', username=other
+            )),
+            ('posts:api_index', Client(), 'get', get_url('posts:api_index')),
+            ('posts:api_group', Client(), 'get', get_url(
+                'posts:api_group', slug=QueryBudgetTest.group.slug
+            )),
+            ('posts:api_profile', Client(), 'get', get_url(
+                'posts:api_profile', username=QueryBudgetTest.author.username
+            )),
+            ('posts:api_follow', self.reader_client, 'get',
+             get_url('posts:api_follow')),
+            ('posts:api_post', Client(), 'get', get_url(
+                'posts:api_post', post_id=post_id
+            )),
+            ('posts:api_comments', Client(), 'get', get_url(
+                'posts:api_comments', post_id=post_id
+            )),
+        ]
+
+    def request(self, client, method, url):
+        cache.clear()
+        if method == 'post':
+            return client.post(url, {'text': 'Ещё комментарий'})
+        return client.get(url)
+
+    def test_pages_fit_query_budget(self):
+        """Каждая страница posts.urls укладывается в свой бюджет."""
+        for view_name, client, method, url in self.pages():
+            with self.subTest(view_name=view_name):
+                with query_budget(view_name):
+                    response = self.request(client, method, url)
+                self.assertLess(response.status_code, 400)
+
+    @query_budget('posts:index')
+    def test_index_budget_as_decorator(self):
+        """Бюджет можно повесить на тест декоратором."""
+        self.client.get(get_url('posts:index'))
+
+    def test_query_count_does_not_grow_with_page(self):
+        """Число запросов не зависит от того, сколько постов
+        и комментариев на странице."""
+        list_pages = {
+            'posts:index', 'posts:group_list', 'posts:profile',
+            'posts:post_detail', 'posts:comments', 'posts:search',
+            'posts:follow_index', 'posts:api_index', 'posts:api_group',
+            'posts:api_profile', 'posts:api_follow', 'posts:api_post',
+            'posts:api_comments',
+        }
+        pages = [page for page in self.pages() if page[0] in list_pages]
+        counts = {}
+        for view_name, client, method, url in pages:
+            with CaptureQueriesContext(connection) as queries:
+                self.request(client, method, url)
+            counts[view_name] = len(queries)
+        self.add_posts(settings.PAGE_SIZE)
+        for post in Post.objects.all():
+            Comment.objects.create(
+                post=post, author=QueryBudgetTest.author, text='Ответ'
+            )
+        for view_name, client, method, url in pages:
+            with self.subTest(view_name=view_name):
+                with CaptureQueriesContext(connection) as queries:
+                    self.request(client, method, url)
+                self.assertEqual(len(queries), counts[view_name])
@@ -0,0 +1,89 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from sorl.thumbnail import get_thumbnail
+
+logger = logging.getLogger(__name__)
+
+# Пропорции карточки поста в single_post.html и post_detail.html
+CARD_SIZE = (960, 339)
+
+# Превью, которые запрашивают шаблоны: основное и варианты для srcset
+THUMBNAIL_GEOMETRIES = tuple(
+    (f'{width}x{width * CARD_SIZE[1] // CARD_SIZE[0]}',
+     {'crop': 'center', 'upscale': True})
+    for width in sorted({CARD_SIZE[0], *settings.POST_IMAGE_WIDTHS})
+)
+
+_executor = None
+
+
+def init_worker():
+    """Готовит процесс пула: Django настроен, соединения с базой свои"""
+    django.setup()
+    connections.close_all()
+
+
+def generate_thumbnails(image_name):
+    """Создаёт все известные превью картинки и возвращает её имя"""
+    # sorl сам пишет в журнал и пропускает отсутствующий файл
+    if not default_storage.exists(image_name):
+        raise FileNotFoundError(f'Нет файла картинки {image_name}')
+    for geometry, options in THUMBNAIL_GEOMETRIES:
+        get_thumbnail(image_name, geometry, **options)
+    return image_name
+
+
+def try_generate_thumbnails(image_name):
+    """generate_thumbnails для массового создания превью: ошибка одной
+    картинки не прерывает остальные. Возвращает текст ошибки или None"""
+    try:
+        generate_thumbnails(image_name)
+    except Exception as error:
+        return f'{type(error).__name__}: {error}'
+    return None
+
+
+def _log_failure(future):
+    if future.exception() is not None:
+        logger.error('Не удалось создать превью',
+                     exc_info=future.exception())
+
+
+def get_executor():
+    """Пул процессов для превью, свой в каждом процессе веб-сервера.
+
+    Создаётся при первой загрузке картинки: процессы пула запускаются
+    из воркера и живут до его завершения. Включается THUMBNAIL_WORKERS
+    там, где менеджер процессов это допускает; иначе превью создаются
+    в самом запросе."""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS, initializer=init_worker
+        )
+    return _executor
+
+
+def queue_thumbnails(image_name):
+    """Ставит создание превью в очередь после фиксации транзакции.
+
+    При THUMBNAIL_WORKERS = 0 превью создаются сразу в текущем процессе."""
+    def submit():
+        if not settings.THUMBNAIL_WORKERS:
+            try:
+                generate_thumbnails(image_name)
+            except Exception:
+                # Пост уже сохранён: как и в пуле, ошибка только в журнал
+                logger.exception('Не удалось создать превью')
+            return
+        get_executor().submit(
+            generate_thumbnails, image_name
+        ).add_done_callback(_log_failure)
+
+    if image_name:
+        transaction.on_commit(submit)
@@ -0,0 +1,210 @@
+import csv
+import datetime as dt
+import json
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.page_cache import invalidate_pages
+
+from .counters import recount_users
+from .feeds import fan_out_new_posts
+from .models import Group, Post, User
+from .search import index_new_posts
+from .seeding import explicit_dates
+
+# Поля выгрузки: автор и группа - по username и slug, чтобы файл можно
+# было загрузить в другую базу
+FIELDS = ('text', 'pub_date', 'author', 'group', 'group_title', 'image')
+FORMATS = ('jsonl', 'csv')
+
+
+def day_start(date):
+    return timezone.make_aware(dt.datetime.combine(date, dt.time()))
+
+
+def filter_posts(queryset, group=None, author=None, since=None, until=None):
+    """Посты группы group, автора author с даты since включительно
+    до даты until не включительно"""
+    if group:
+        queryset = queryset.filter(group__slug=group)
+    if author:
+        queryset = queryset.filter(author__username=author)
+    if since:
+        queryset = queryset.filter(pub_date__gte=day_start(since))
+    if until:
+        queryset = queryset.filter(pub_date__lt=day_start(until))
+    return queryset
+
+
+def row_matches(row, group=None, author=None, since=None, until=None):
+    """Тот же фильтр, что filter_posts, для строки файла"""
+    return (
+        (not group or row['group'] == group)
+        and (not author or row['author'] == author)
+        and (not since or row['pub_date'] >= day_start(since))
+        and (not until or row['pub_date'] < day_start(until))
+    )
+
+
+def export_rows(queryset, chunk_size):
+    """Строки постов queryset словарями FIELDS. Посты читаются курсором
+    пачками по chunk_size, память не растёт с размером выгрузки"""
+    rows = queryset.order_by('pk').values_list(
+        'text', 'pub_date', 'author__username', 'group__slug',
+        'group__title', 'image',
+    ).iterator(chunk_size=chunk_size)
+    for text, pub_date, author, group, group_title, image in rows:
+        yield {
+            'text': text,
+            'pub_date': pub_date.isoformat(),
+            'author': author,
+            'group': group or '',
+            'group_title': group_title or '',
+            'image': image or '',
+        }
+
+
+def write_rows(rows, file, fmt):
+    """Пишет строки в file построчно; возвращает их число"""
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(file, FIELDS)
+        writer.writeheader()
+        for count, row in enumerate(rows, 1):
+            writer.writerow(row)
+        return count
+    for count, row in enumerate(rows, 1):
+        file.write(json.dumps(row, ensure_ascii=False))
+        file.write('\n')
+    return count
+
+
+def read_rows(file, fmt):
+    """Строки файла словарями FIELDS с датой публикации datetime"""
+    if fmt == 'csv':
+        rows = csv.DictReader(file)
+    else:
+        rows = (json.loads(line) for line in file if line.strip())
+    for row in rows:
+        pub_date = parse_datetime(row['pub_date'])
+        if pub_date is None:
+            raise ValueError(f'Неверная дата публикации: {row["pub_date"]}')
+        if timezone.is_naive(pub_date):
+            pub_date = timezone.make_aware(pub_date)
+        yield {
+            **{field: row.get(field) or '' for field in FIELDS},
+            'pub_date': pub_date,
+        }
+
+
+class PostImporter:
+    """Загружает посты пачками: каждая пачка - один bulk_create в своей
+    транзакции. Авторы и группы ищутся по словарям в памяти; в базу
+    идёт один запрос на пачку за ещё не встреченными именами.
+
+    bulk_create не вызывает сигналы, поэтому после загрузки finish
+    дописывает ленты, счётчики авторов и поисковый индекс для новых
+    постов. Его нужно вызвать и после ошибки в run: пачки до неё уже
+    записаны."""
+
+    def __init__(self, batch_size=1000, create_authors=False,
+                 create_groups=False):
+        self.batch_size = batch_size
+        self.create_authors = create_authors
+        self.create_groups = create_groups
+        self.authors = {}
+        self.groups = {}
+        self.imported = 0
+        self.skipped = 0
+        last = Post.objects.order_by('-pk').values_list('pk', flat=True)
+        self.last_pk = last.first() or 0
+
+    def resolve_authors(self, rows):
+        names = {row['author'] for row in rows} - self.authors.keys()
+        if not names:
+            return
+        self.authors.update(
+            User.objects.filter(username__in=names)
+            .values_list('username', 'pk')
+        )
+        missing = names - self.authors.keys()
+        if missing and self.create_authors:
+            User.objects.bulk_create(
+                User(username=name, password='!') for name in missing
+            )
+            self.authors.update(
+                User.objects.filter(username__in=missing)
+                .values_list('username', 'pk')
+            )
+
+    def resolve_groups(self, rows):
+        slugs = {
+            row['group']: row['group_title'] or row['group']
+            for row in rows if row['group']
+        }
+        for slug in self.groups.keys() & slugs.keys():
+            del slugs[slug]
+        if not slugs:
+            return
+        self.groups.update(
+            Group.objects.filter(slug__in=slugs).values_list('slug', 'pk')
+        )
+        missing = slugs.keys() - self.groups.keys()
+        if missing and self.create_groups:
+            Group.objects.bulk_create(
+                Group(slug=slug, title=slugs[slug], description='')
+                for slug in missing
+            )
+            self.groups.update(
+                Group.objects.filter(slug__in=missing)
+                .values_list('slug', 'pk')
+            )
+
+    def import_batch(self, rows):
+        self.resolve_authors(rows)
+        self.resolve_groups(rows)
+        posts = []
+        for row in rows:
+            author_id = self.authors.get(row['author'])
+            group_id = self.groups.get(row['group'])
+            if author_id is None or (row['group'] and group_id is None):
+                self.skipped += 1
+                continue
+            posts.append(Post(
+                text=row['text'], pub_date=row['pub_date'],
+                author_id=author_id, group_id=group_id, image=row['image'],
+            ))
+        with transaction.atomic():
+            Post.objects.bulk_create(posts)
+        self.imported += len(posts)
+
+    def run(self, rows):
+        """Загружает строки rows; возвращает число загруженных постов"""
+        rows = iter(rows)
+        try:
+            with explicit_dates(Post._meta.get_field('pub_date')):
+                while True:
+                    batch = list(islice(rows, self.batch_size))
+                    if not batch:
+                        break
+                    self.import_batch(batch)
+        finally:
+            # bulk_create не вызывает сигналов, сбрасывающих страницы;
+            # пачки до ошибки в строках уже записаны
+            invalidate_pages()
+        return self.imported
+
+    def finish(self):
+        """Ленты подписчиков, счётчики авторов и поисковый индекс для
+        загруженных постов"""
+        new_posts = Post.objects.filter(pk__gt=self.last_pk)
+        fan_out_new_posts(self.last_pk)
+        author_ids = sorted(set(
+            new_posts.values_list('author_id', flat=True).iterator()
+        ))
+        for start in range(0, len(author_ids), self.batch_size):
+            recount_users(author_ids[start:start + self.batch_size])
+        index_new_posts(self.last_pk, batch_size=self.batch_size)
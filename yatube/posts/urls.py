@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 app_name = 'posts'
 
@@ -32,6 +32,12 @@ urlpatterns = [
         views.AddCommentView.as_view(),
         name='add_comment'
     ),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.CommentsView.as_view(),
+        name='comments'
+    ),
+    path('search/', views.SearchView.as_view(), name='search'),
     path('follow/', views.FollowIndexView.as_view(), name='follow_index'),
     path(
         'profile/<str:username>/follow/',
@@ -43,4 +49,26 @@ urlpatterns = [
         views.ProfileUnfollowView.as_view(),
         name='profile_unfollow'
     ),
+    path('api/posts/', api.IndexApiView.as_view(), name='api_index'),
+    path(
+        'api/group/<slug:slug>/',
+        api.GroupApiView.as_view(),
+        name='api_group'
+    ),
+    path(
+        'api/profile/<str:username>/',
+        api.ProfileApiView.as_view(),
+        name='api_profile'
+    ),
+    path('api/follow/', api.FollowApiView.as_view(), name='api_follow'),
+    path(
+        'api/posts/<int:post_id>/',
+        api.PostApiView.as_view(),
+        name='api_post'
+    ),
+    path(
+        'api/posts/<int:post_id>/comments/',
+        api.CommentsApiView.as_view(),
+        name='api_comments'
+    ),
 ]
@@ -1,88 +1,181 @@
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.shortcuts import get_object_or_404, redirect
+from django.core.paginator import InvalidPage
+from django.db.models import OuterRef, Subquery
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy
 from django.utils.decorators import method_decorator
 from django.views.generic import (CreateView, FormView, UpdateView, View,
                                   ListView, DetailView, RedirectView)
 
+from core.conditional import ConditionalGetMixin
+from core.generations import get_generations
+from core.page_cache import AnonymousPageCacheMixin
+
+from . import search
+from .feeds import FeedPaginator
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .models import Comment, Follow, Group, Post, User
+from .paginators import CursorPaginationMixin, CursorPaginator
+from .thumbnails import queue_thumbnails
+
+
+def latest_id(queryset):
+    """Подзапрос: id последней записи queryset (поиск по индексу)"""
+    return Subquery(queryset.values('pk')[:1])
+
+
+def get_comments_page(post_id, cursor=None):
+    """Страница комментариев поста старше курсора"""
+    paginator = CursorPaginator(
+        Comment.objects.filter(post_id=post_id).select_related('author'),
+        settings.COMMENTS_PAGE_SIZE,
+        date_field='created',
+    )
+    try:
+        return paginator.cursor_page(cursor)
+    except InvalidPage as e:
+        raise Http404(f'Неверная страница: {e}')
 
 
-class IndexView(ListView):
+class IndexView(AnonymousPageCacheMixin, ConditionalGetMixin,
+                CursorPaginationMixin, ListView):
     template_name = 'posts/index.html'
     model = Post
     paginate_by = settings.PAGE_SIZE
     context_object_name = 'posts'
+    extra_context = {'cache_scopes': ('posts',)}
+    page_scopes = ('posts',)
+
+    def get_etag_parts(self):
+        # Последнее изменение постов (по индексу updated_at) - для постов,
+        # загруженных без сигналов
+        return (
+            *get_generations(*self.get_page_scopes()),
+            Post.objects.order_by('-updated_at').values_list(
+                'updated_at', flat=True
+            ).first(),
+        )
 
     def get_queryset(self):
         return Post.objects.select_related('author', 'group')
 
 
-class GroupPostsView(ListView):
+class GroupPostsView(AnonymousPageCacheMixin, ConditionalGetMixin,
+                     CursorPaginationMixin, ListView):
     template_name = 'posts/group_list.html'
     model = Post
     paginate_by = settings.PAGE_SIZE
     context_object_name = 'posts'
 
-    def get_queryset(self):
-        self.group = get_object_or_404(
-            Group.objects.prefetch_related('posts__author'),
-            slug=self.kwargs['slug']
+    def get_page_scopes(self):
+        if not hasattr(self, 'group'):
+            self.group = get_object_or_404(
+                Group.objects.annotate(latest_post_id=latest_id(
+                    Post.objects.filter(group=OuterRef('pk'))
+                )),
+                slug=self.kwargs['slug'],
+            )
+        return (f'group:{self.group.pk}', 'users')
+
+    def get_etag_parts(self):
+        return (
+            *get_generations(*self.get_page_scopes()),
+            self.group.updated_at,
+            self.group.latest_post_id,
         )
-        return self.group.posts.all()
+
+    def get_queryset(self):
+        return self.group.posts.select_related('author')
 
     def get_context_data(self, **kwargs):
         context = super(GroupPostsView, self).get_context_data(**kwargs)
-        context['group'] = self.group
+        context.update({
+            'group': self.group,
+            'cache_scopes': (f'group:{self.group.pk}', 'users'),
+        })
         return context
 
 
-class ProfileView(ListView):
+class ProfileView(AnonymousPageCacheMixin, ConditionalGetMixin,
+                  CursorPaginationMixin, ListView):
     template_name = 'posts/profile.html'
     model = Post
     paginate_by = settings.PAGE_SIZE
     context_object_name = 'posts'
 
-    def get_queryset(self):
-        self.user = get_object_or_404(
-            User.objects.prefetch_related('posts__author',
-                                          'posts__group',
-                                          'following'),
-            username=self.kwargs['username']
+    def get_page_scopes(self):
+        if not hasattr(self, 'user'):
+            self.user = get_object_or_404(
+                User.objects.select_related('stats').annotate(
+                    latest_post_id=latest_id(
+                        Post.objects.filter(author=OuterRef('pk'))
+                    )
+                ),
+                username=self.kwargs['username']
+            )
+        return (
+            f'author:{self.user.pk}', f'follows:{self.user.pk}', 'groups',
         )
-        return self.user.posts.all()
-
-    def get_context_data(self, **kwargs):
-        context = super(ProfileView, self).get_context_data(**kwargs)
 
-        following = None
+    def get_etag_parts(self):
+        scopes = self.get_page_scopes()
+        self.following = None
         if self.request.user.is_authenticated:
-            following = Follow.objects.filter(
+            self.following = Follow.objects.filter(
                 user=self.request.user, author=self.user,
             ).exists()
+        stats = getattr(self.user, 'stats', None)
+        return (
+            *get_generations(*scopes),
+            self.user.latest_post_id,
+            stats and (stats.posts_count, stats.followers_count),
+            self.following,
+        )
+
+    def get_queryset(self):
+        return self.user.posts.select_related('author', 'group')
 
+    def get_context_data(self, **kwargs):
+        context = super(ProfileView, self).get_context_data(**kwargs)
         context.update({
             'author': self.user,
-            'following': following,
+            'following': self.following,
+            'cache_scopes': (f'author:{self.user.pk}', 'groups'),
         })
         return context
 
 
-class PostDetailView(DetailView):
+class PostDetailView(AnonymousPageCacheMixin, ConditionalGetMixin,
+                     DetailView):
     template_name = 'posts/post_detail.html'
     model = Post
     context_object_name = 'post'
 
-    def get_object(self, queryset=None):
-        self.post = get_object_or_404(
-            Post.objects.select_related(
-                'author', 'group'
-            ).prefetch_related('comments__author'),
-            pk=self.kwargs['post_id']
+    def get_page_scopes(self):
+        if not hasattr(self, 'post'):
+            self.post = get_object_or_404(
+                Post.objects.select_related('author__stats', 'group'),
+                pk=self.kwargs['post_id']
+            )
+        # users - имена авторов комментариев
+        scopes = [
+            f'post:{self.post.pk}', f'author:{self.post.author_id}', 'users',
+        ]
+        if self.post.group_id:
+            scopes.append(f'group:{self.post.group_id}')
+        return scopes
+
+    def get_etag_parts(self):
+        return (
+            *get_generations(*self.get_page_scopes()),
+            self.post.updated_at,
+            self.post.commented_at,
         )
+
+    def get_object(self, queryset=None):
         return self.post
 
     def get_context_data(self, **kwargs):
@@ -92,10 +185,40 @@ class PostDetailView(DetailView):
         context.update({
             'title': title,
             'comment_form': CommentForm(),
+            'comments_page': get_comments_page(
+                self.post.pk, self.request.GET.get('older')
+            ),
         })
         return context
 
 
+class CommentsView(View):
+    """Следующая страница комментариев для кнопки «Показать ещё»:
+    HTML-фрагмент или JSON при ?format=json"""
+
+    def get(self, request, post_id):
+        if not Post.objects.filter(pk=post_id).exists():
+            raise Http404('Пост не найден')
+        page = get_comments_page(post_id, request.GET.get('older'))
+        if request.GET.get('format') == 'json':
+            return JsonResponse({
+                'comments': [
+                    {
+                        'id': comment.id,
+                        'author': comment.author.username,
+                        'text': comment.text,
+                        'created': comment.created,
+                    }
+                    for comment in page.object_list
+                ],
+                'next_cursor': page.next_cursor,
+            })
+        return render(request, 'posts/includes/comments.html', {
+            'comments_page': page,
+            'post_id': post_id,
+        })
+
+
 class PostCreateView(LoginRequiredMixin, CreateView):
     template_name = 'posts/create_post.html'
     form_class = PostForm
@@ -104,6 +227,7 @@ class PostCreateView(LoginRequiredMixin, CreateView):
         post = form.save(commit=False)
         post.author = self.request.user
         post.save()
+        queue_thumbnails(post.image.name)
         return redirect(self.get_success_url())
 
     def get_success_url(self):
@@ -119,10 +243,18 @@ class PostEditView(UpdateView):
     model = Post
 
     def get_object(self, queryset=None):
-        obj = Post.objects.select_related('group').get(
-            id=self.kwargs['post_id']
-        )
-        return obj
+        # Пост нужен и в dispatch, и в get/post: читаем его один раз
+        if not hasattr(self, '_post'):
+            self._post = Post.objects.select_related('group').get(
+                id=self.kwargs['post_id']
+            )
+        return self._post
+
+    def form_valid(self, form):
+        response = super(PostEditView, self).form_valid(form)
+        if 'image' in form.changed_data:
+            queue_thumbnails(self.object.image.name)
+        return response
 
     def get_context_data(self, **kwargs):
         context = super(PostEditView, self).get_context_data(**kwargs)
@@ -131,7 +263,7 @@ class PostEditView(UpdateView):
 
     @method_decorator(login_required)
     def dispatch(self, request, *args, **kwargs):
-        if self.get_object().author != self.request.user:
+        if self.get_object().author_id != self.request.user.pk:
             return redirect(self.get_success_url())
         return super(PostEditView, self).dispatch(request, *args, **kwargs)
 
@@ -159,15 +291,34 @@ class AddCommentView(LoginRequiredMixin, FormView):
         )
 
 
-class FollowIndexView(LoginRequiredMixin, ListView):
+class SearchView(ListView):
+    template_name = 'posts/search.html'
+    paginate_by = settings.PAGE_SIZE
+    context_object_name = 'posts'
+
+    def get_queryset(self):
+        self.query = self.request.GET.get('q', '').strip()
+        return search.SearchResults(self.query)
+
+    def get_context_data(self, **kwargs):
+        context = super(SearchView, self).get_context_data(**kwargs)
+        context['query'] = self.query
+        return context
+
+
+class FollowIndexView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     template_name = 'posts/follow.html'
     model = Post
     paginate_by = settings.PAGE_SIZE
     context_object_name = 'posts'
+    paginator_class = FeedPaginator
 
     def get_queryset(self):
         return Post.objects.filter(author__following__user=self.request.user)
 
+    def get_paginator(self, *args, **kwargs):
+        return super().get_paginator(*args, user=self.request.user, **kwargs)
+
 
 class ProfileFollowView(LoginRequiredMixin, RedirectView):
     pattern_name = 'posts:profile'
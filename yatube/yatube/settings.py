@@ -31,6 +31,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Снаружи сессий и аутентификации: их запросы тоже попадают в профиль
+    'core.middleware.QueryProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -84,11 +86,23 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Общий для всех воркеров кеш в файле SQLite (WAL): поколения фрагментов
+# и страниц сдвигаются сразу во всех процессах
 CACHES = {
+    'default': {
+        'BACKEND': 'core.cache_backends.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {'MAX_ENTRIES': 50_000},
+    }
+}
+# Тесты и бенчмарки не должны чистить и читать общий кеш
+# (core.test_runner, bench_profile_view)
+TEST_CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+TEST_RUNNER = 'core.test_runner.TestRunner'
 
 LANGUAGE_CODE = 'RU-ru'
 TIME_ZONE = 'Europe/Moscow'
@@ -111,8 +125,41 @@ LOGIN_REDIRECT_URL = 'posts:index'
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 # Общие константы
-...
+# Фрагменты с generation_cache живут до изменения их данных
+FRAGMENT_CACHE_TIMEOUT = None
+# Так же и страницы для гостей (core.page_cache)
+PAGE_CACHE_TIMEOUT = None
+# Ключ карточки поста меняется вместе с её данными; TTL только убирает
+# из кеша устаревшие версии
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+# Доля HTTP-запросов, для которых собирается профиль запросов к БД
+QUERY_PROFILING_SAMPLE_RATE = 0.1
+# Столько одинаковых запросов за HTTP-запрос считаются повтором (N+1)
+QUERY_PROFILING_DUPLICATES = 3
 
 # Константы для приложения posts
 PAGE_SIZE = 10
+COMMENTS_PAGE_SIZE = 20
 POST_TEXT_LENGTH = 15
+# Посты авторов с большим числом подписчиков читаются в ленту при запросе
+FEED_FANOUT_LIMIT = 5000
+FEED_BATCH_SIZE = 1000
+# Столько новых постов ленты держится в кеше для каждого пользователя;
+# TTL ограничивает устаревание при гонках одновременных записей
+FEED_CACHE_SIZE = 200
+FEED_CACHE_TIMEOUT = 60 * 10
+# Поиск выдаёт не больше стольких самых новых совпадений; если их меньше,
+# они ранжируются по bm25, иначе идут от новых к старым (posts.search)
+SEARCH_CANDIDATES = 1000
+# Загрузка картинок постов: ограничения и параметры пережатия
+POST_IMAGE_MAX_BYTES = 10 * 2 ** 20
+POST_IMAGE_MAX_PIXELS = 40_000_000
+POST_IMAGE_MAX_SIDE = 2560
+POST_IMAGE_QUALITY = 82
+# Ширины превью для srcset карточки поста
+POST_IMAGE_WIDTHS = (480, 960)
+# Процессы, создающие превью картинок; 0 - создавать в самом запросе.
+# Пул запускается внутри каждого воркера веб-сервера (posts.thumbnails),
+# поэтому включается явно
+THUMBNAIL_WORKERS = 0
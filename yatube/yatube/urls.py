@@ -3,11 +3,18 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from core.views import fragment_cache_stats
+
 urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
     path('about/', include('about.urls', namespace='about')),
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
+    path(
+        'admin/cache-stats/',
+        fragment_cache_stats,
+        name='fragment_cache_stats'
+    ),
     path('admin/', admin.site.urls, name='admin'),
 ]
 